@@ -1,5 +1,5 @@
 import os
-from fastapi import FastAPI, Depends, HTTPException, status, Request
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Response
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
@@ -19,25 +19,54 @@ JWT_SECRET = os.getenv("JWT_SECRET", "supersecretjwt")
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRE_MINUTES = 60
 
-from backend.utils.path_utils import SCAN_ROOT, is_safe_path
+from backend.utils.path_utils import SCAN_ROOT, is_safe_path, is_public_path
 
-app = FastAPI()
+from backend.utils.http_utils import FastJSONResponse
+from backend.utils.metrics import MetricsMiddleware
+from backend.utils.timing import ServerTimingMiddleware, phase
+from backend.services.leader_service import start_leader_election
+from backend.services.worker_service import start_worker_state, stop_worker_state
+
+app = FastAPI(default_response_class=FastJSONResponse)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ServerTimingMiddleware)
 
 # Automatischer Start-Scan bei Backend-Startup
-import threading
 
 def run_startup_scan():
     from backend.services.dirscan_service import invalidate_cache
-    from backend.services.scan_service import start_background_scan
-    print("Invalidating cache for SCAN_ROOT...")
-    invalidate_cache(SCAN_ROOT)
-    print("Starte automatischen Hintergrund-Scan von SCAN_ROOT...")
-    start_background_scan(SCAN_ROOT)
+    from backend.services.scan_service import (
+        request_scan, run_scan_requests, can_warm_start, verify_tree, WARM_START,
+    )
+    from backend.services.hash_service import HASHING_ENABLED
+    from backend.services.content_index_service import CONTENT_INDEX_ENABLED
+    from backend.services.trash_service import start_trash_purger
+    start_trash_purger()
+    if WARM_START and can_warm_start():
+        # Cache und Index vom letzten Lauf bedienen sofort, geprüft wird im Hintergrund
+        verify_tree(SCAN_ROOT)
+        if CONTENT_INDEX_ENABLED:
+            request_scan(SCAN_ROOT, kind="content")
+        if HASHING_ENABLED:
+            request_scan(SCAN_ROOT, kind="hash")
+    else:
+        print("Invalidating cache for SCAN_ROOT...")
+        invalidate_cache(SCAN_ROOT)
+        print("Starte automatischen Hintergrund-Scan von SCAN_ROOT...")
+        request_scan(SCAN_ROOT)
+    run_scan_requests()
 
 @app.on_event("startup")
 def startup_event():
-    t = threading.Thread(target=run_startup_scan, daemon=True)
-    t.start()
+    # Bei mehreren uvicorn-Workern scannt nur der Leader; die anderen lesen
+    # Status, Index und Cache aus den gemeinsamen Dateien
+    start_leader_election(on_elected=run_startup_scan)
+    # Streams und Metriken aller Worker über STATE_DIR abgleichen
+    start_worker_state()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    stop_worker_state()
 
 # CORS für Frontend-Entwicklung
 app.add_middleware(
@@ -84,44 +113,129 @@ from fastapi.security import OAuth2PasswordBearer
 from backend.routes.auth import router as auth_router
 from backend.routes.share import router as share_router
 from backend.routes.users import router as users_router
+from backend.routes.archive import router as archive_router
+from backend.routes.upload import router as upload_router
+from backend.routes.thumb import router as thumb_router
+from backend.routes.admin import router as admin_router
+from backend.routes.metrics import router as metrics_router
+from backend.routes.duplicates import router as duplicates_router
+from backend.routes.folder_stream import router as folder_stream_router
+from backend.routes.files import router as files_router
+from backend.routes.jobs import router as jobs_router
+from backend.routes.trash import router as trash_router
 from backend.services.auth_service import get_user, verify_password, create_access_token, get_current_user, require_permission
 
 app.include_router(auth_router)
 app.include_router(share_router)
 app.include_router(users_router)
+app.include_router(archive_router)
+app.include_router(upload_router)
+app.include_router(thumb_router)
+app.include_router(admin_router)
+app.include_router(metrics_router)
+app.include_router(duplicates_router)
+app.include_router(folder_stream_router)
+app.include_router(files_router)
+app.include_router(jobs_router)
+app.include_router(trash_router)
 
 @app.get("/api/ping")
 def ping():
     return {"status": "ok"}
 
 from fastapi import Query, Form
-from backend.services.dirscan_service import scan_or_cache, invalidate_cache
-from backend.services.search_service import search_files
-from backend.services.scan_service import start_background_scan, load_status
+from backend.services.dirscan_service import (
+    invalidate_cache, read_listing, listing_count, encode_cursor, decode_cursor,
+)
+from backend.services.search_service import search_files, suggest_files, register_suggest, Superseded, INDEX_FILE
+from backend.services.content_index_service import content_search
+from backend.services.scan_service import request_scan, load_status, get_scan_generation
+from backend.utils.executors import run_io
+from backend.utils.http_utils import (
+    make_etag, conditional_json, encode_json, compact_rows, LISTING_COLUMNS, SEARCH_COLUMNS,
+    CONTENT_SEARCH_COLUMNS,
+)
 
 
 MAX_ENTRIES = 200
 
 @app.get("/api/folder")
-def list_folder(
+async def list_folder(
+    request: Request,
     path: str = Query(default=None),
     offset: int = Query(default=0, ge=0),
     limit: int = Query(default=MAX_ENTRIES, le=MAX_ENTRIES),
+    cursor: str = Query(default=None),
+    format: str = Query(default=None, pattern="^compact$"),
     user=Depends(get_current_user)
 ):
+    return await run_io(folder_response, request, path, offset, limit, format, cursor)
+
+def folder_response(request, path, offset, limit, format, cursor=None):
     # Root oder Unterordner
     if path in (None, "", "/"):
         rel_path = ""
     else:
         rel_path = path.lstrip("/")
     abs_path = os.path.join(SCAN_ROOT, rel_path)
-    if not is_safe_path(SCAN_ROOT, abs_path):
+    if not is_public_path(SCAN_ROOT, abs_path):
         raise HTTPException(status_code=403, detail="Pfad nicht erlaubt")
-    data = scan_or_cache(abs_path)
-    if "error" in data:
-        raise HTTPException(status_code=400, detail=data["error"])
-    entries = data["entries"][offset : offset + limit]
+    try:
+        mtime = os.stat(abs_path).st_mtime
+    except OSError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    page = read_folder_page(abs_path, offset, limit, cursor)
+    # has_children hängt an den Unterordnern, deren mtimes gehören mit ins ETag
+    etag = make_etag("folder", abs_path, mtime, offset, limit, cursor, format, get_scan_generation(),
+                     _child_mtimes(abs_path, page[1]))
+
+    def build():
+        listing = build_folder_listing(abs_path, rel_path, offset, limit, cursor, page)
+        if format == "compact":
+            return compact_rows(listing, "entries", LISTING_COLUMNS)
+        return listing
+
+    return conditional_json(request, etag, build)
+
+def read_folder_page(abs_path, offset, limit, cursor=None):
+    # Mit cursor wird direkt nach dem letzten Eintrag der vorigen Seite
+    # weitergelesen, offset wird dann ignoriert
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    header, entries, start = read_listing(abs_path, offset, limit, after)
+    if "error" in header:
+        raise HTTPException(status_code=400, detail=header["error"])
+    return header, entries, start
+
+def _child_mtimes(abs_path, entries):
+    mtimes = []
+    for entry in entries:
+        if entry["is_dir"]:
+            try:
+                mtimes.append(os.stat(os.path.join(abs_path, entry["name"])).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+    return mtimes
+
+def build_folder_listing(abs_path, rel_path, offset, limit, cursor=None, page=None):
+    header, entries, start = page or read_folder_page(abs_path, offset, limit, cursor)
     # has_children für Ordner
+    with phase("has_children"):
+        _add_has_children(entries, rel_path)
+    has_more = start + len(entries) < header["count"]
+    return {
+        "path": rel_path,
+        "entries": entries,
+        "total": header["count"],
+        "offset": start,
+        "limit": limit,
+        "has_more": has_more,
+        "next_cursor": encode_cursor(entries[-1]) if has_more and entries else None,
+    }
+
+def _add_has_children(entries, rel_path):
     for entry in entries:
         if entry["is_dir"]:
             sub_rel_path = os.path.join(rel_path, entry["name"]) if rel_path else entry["name"]
@@ -129,18 +243,9 @@ def list_folder(
             if not is_safe_path(SCAN_ROOT, sub_abs_path):
                 entry["has_children"] = False
             else:
-                sub = scan_or_cache(sub_abs_path)
-                entry["has_children"] = bool(sub.get("entries"))
+                entry["has_children"] = listing_count(sub_abs_path) > 0
         else:
             entry["has_children"] = False
-    return {
-        "path": rel_path,
-        "entries": entries,
-        "total": len(data["entries"]),
-        "offset": offset,
-        "limit": limit,
-        "has_more": offset + limit < len(data["entries"]),
-    }
 
 @app.post("/api/scan")
 def rescan_folder(
@@ -152,8 +257,9 @@ def rescan_folder(
     folder_path = path or SCAN_ROOT
     if not is_safe_path(SCAN_ROOT, folder_path):
         raise HTTPException(status_code=403, detail="Pfad nicht erlaubt")
-    # Immer im Hintergrund-Thread scannen, blockiere nie den Hauptthread!
-    start_background_scan(folder_path)
+    # Immer im Hintergrund scannen, blockiere nie den Hauptthread!
+    # Der Leader-Worker arbeitet die Aufträge nacheinander ab
+    request_scan(folder_path)
     return {"status": "scan started", "async": True, "path": folder_path}
 
 def count_from_cache(folder_path):
@@ -204,52 +310,90 @@ def scan_status():
 
 
 @app.get("/api/search")
-def search_endpoint(
-    q: str = Query(..., min_length=2),
+async def search_endpoint(
+    request: Request,
+    q: str = Query(default=None, min_length=2),
+    content: str = Query(default=None, min_length=2),
     path: str = Query(default=None),
     limit: int = Query(default=100, le=500),
+    format: str = Query(default=None, pattern="^compact$"),
+    user=Depends(get_current_user)
+):
+    """Search by name (q), by file content (content), or both: content hits whose name contains q"""
+    if not q and not content:
+        raise HTTPException(status_code=422, detail="q or content is required")
+    root = path or SCAN_ROOT
+    if not is_public_path(SCAN_ROOT, root):
+        raise HTTPException(status_code=403, detail="Pfad nicht erlaubt")
+    with phase("search"):
+        if content:
+            results = await run_io(content_search, root, content, name_query=q, max_results=limit)
+        else:
+            results = await run_io(search_files, root, q, max_results=limit)
+    if format == "compact":
+        columns = CONTENT_SEARCH_COLUMNS if content else SEARCH_COLUMNS
+        return encode_json(request, compact_rows({"results": results}, "results", columns))
+    return encode_json(request, {"results": results})
+
+@app.get("/api/search/suggest")
+async def search_suggest_endpoint(
+    request: Request,
+    q: str = Query(..., min_length=1),
+    path: str = Query(default=None),
+    limit: int = Query(default=10, ge=1, le=50),
+    client: str = Query(default="", max_length=64),
     user=Depends(get_current_user)
 ):
+    """
+    Name-prefix suggestions while typing. A newer request with the same client
+    id (per user) cancels this one, which then answers 204 No Content.
+    """
     root = path or SCAN_ROOT
-    if not is_safe_path(SCAN_ROOT, root):
+    if not is_public_path(SCAN_ROOT, root):
         raise HTTPException(status_code=403, detail="Pfad nicht erlaubt")
-    results = search_files(root, q, max_results=limit)
-    return {"results": results}
+    if not os.path.exists(INDEX_FILE):
+        return encode_json(request, {"results": []})
+    client_key = f"{user.get('username')}:{client}"
+    seq = register_suggest(client_key)
+    try:
+        with phase("suggest"):
+            results = await run_io(suggest_files, root, q, limit, client_key, seq)
+    except Superseded:
+        return Response(status_code=204)
+    return encode_json(request, {"results": results})
 
 @app.delete("/api/file")
 def delete_file(
     path: str = Query(...),
+    permanent: bool = Query(default=False),
     user=Depends(require_permission("delete"))
 ):
-    """Delete a file or directory"""
-    if not path or path in ("", "/"):
-        raise HTTPException(status_code=400, detail="Invalid path")
-    
-    # Prevent directory traversal and absolute paths
-    if os.path.isabs(path) or ".." in path.split(os.path.sep):
-        raise HTTPException(status_code=400, detail="Invalid path: directory traversal or absolute paths are not allowed")
-    
-    rel_path = path.lstrip("/")
-    abs_path = os.path.join(SCAN_ROOT, rel_path)
-    
-    if not is_safe_path(SCAN_ROOT, abs_path):
-        raise HTTPException(status_code=403, detail="Path not allowed")
+    """
+    Delete a file or directory: moved to the trash (one rename, answered right
+    away), or with permanent=true (or TRASH_ENABLED=false) removed for good in a
+    background job.
+    """
+    from backend.services.fileops_service import batch_service, Changes, _resolve
+    from backend.services.trash_service import move_to_trash, TRASH_ENABLED
+    # Also rejects traversal, absolute paths and the trash/upload folders themselves
+    abs_path = _resolve(path)
+    rel_path = path.strip("/")
     
-    if not os.path.exists(abs_path):
+    if not os.path.lexists(abs_path):
         raise HTTPException(status_code=404, detail="File or directory not found")
     
+    if permanent or not TRASH_ENABLED:
+        job = batch_service([{"op": "delete", "path": rel_path, "permanent": True}], user)
+        return JSONResponse({"status": "deleting", "path": path, "job": job}, status_code=202)
+
     try:
-        import shutil
-        if os.path.isdir(abs_path):
-            shutil.rmtree(abs_path)
-        else:
-            os.remove(abs_path)
-        
-        # Invalidate cache for parent directory
-        parent_dir = os.path.dirname(abs_path)
-        invalidate_cache(parent_dir)
-        
-        return {"status": "deleted", "path": path}
+        # Listing-Cache und Suchindex sofort aktualisieren
+        changes = Changes()
+        changes.before(abs_path)
+        item = move_to_trash(abs_path, user.get("username"))
+        changes.removed(abs_path)
+        changes.apply()
+        return {"status": "trashed", "path": path, "trash_id": item["id"]}
     except Exception as e:
         import logging
         logging.error(f"Error while deleting file: {str(e)}")
@@ -262,18 +406,12 @@ def rename_file(
     user=Depends(require_permission("rename"))
 ):
     """Rename a file or directory"""
-    if not old_path or old_path in ("", "/"):
-        raise HTTPException(status_code=400, detail="Invalid path")
+    from backend.services.fileops_service import _resolve, _valid_name
+    abs_old_path = _resolve(old_path)
     
-    if not new_name or "/" in new_name or "\\" in new_name:
+    if not _valid_name(new_name):
         raise HTTPException(status_code=400, detail="Invalid new name")
     
-    rel_path = old_path.lstrip("/")
-    abs_old_path = os.path.join(SCAN_ROOT, rel_path)
-    
-    if not is_safe_path(SCAN_ROOT, abs_old_path):
-        raise HTTPException(status_code=403, detail="Path not allowed")
-    
     if not os.path.exists(abs_old_path):
         raise HTTPException(status_code=404, detail="File or directory not found")
     
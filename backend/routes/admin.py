@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from backend.services.auth_service import require_permission
+from backend.services.bandwidth_service import list_streams
+from backend.utils.executors import run_io
+from backend.utils.profiler import sample, to_collapsed, to_speedscope, PROFILE_MAX_SECONDS
+
+router = APIRouter()
+
+@router.get("/api/admin/streams")
+def active_streams(user=Depends(require_permission("monitor"))):
+    """Running downloads with their current throughput and applicable limits"""
+    return list_streams()
+
+@router.get("/api/admin/profile")
+async def profile(
+    seconds: float = Query(default=5, gt=0, le=PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(default=10, ge=1, le=1000),
+    format: str = Query(default="collapsed", pattern="^(collapsed|speedscope)$"),
+    user=Depends(require_permission("monitor")),
+):
+    """Sample the stacks of all threads of the live process for the given duration"""
+    interval = interval_ms / 1000
+    samples = await run_io(sample, seconds, interval)
+    if samples is None:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    if format == "speedscope":
+        return to_speedscope(samples, interval)
+    return PlainTextResponse(to_collapsed(samples))
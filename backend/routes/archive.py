@@ -0,0 +1,35 @@
+import os
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Form
+from backend.services.auth_service import require_permission
+from backend.services.archive_service import archive_response
+from backend.utils.path_utils import SCAN_ROOT, is_public_path
+from backend.utils.executors import run_io
+
+router = APIRouter()
+
+@router.post("/api/archive")
+async def download_archive(
+    paths: List[str] = Form(...),
+    format: str = Form(default="zip"),
+    name: str = Form(default="download"),
+    user=Depends(require_permission("download"))
+):
+    """Stream several files/folders (relative to SCAN_ROOT) as one ZIP or TAR archive"""
+    return await run_io(archive_selection, paths, format, name, user)
+
+def archive_selection(paths, format, name, user=None):
+    if not paths:
+        raise HTTPException(status_code=400, detail="No paths selected")
+    sources = []
+    for path in paths:
+        rel_path = path.lstrip("/")
+        if not rel_path:
+            raise HTTPException(status_code=400, detail="Invalid path")
+        abs_path = os.path.join(SCAN_ROOT, rel_path)
+        if not is_public_path(SCAN_ROOT, abs_path):
+            raise HTTPException(status_code=403, detail="Path not allowed")
+        if not os.path.exists(abs_path):
+            raise HTTPException(status_code=404, detail=f"Path not found: {path}")
+        sources.append((abs_path, os.path.basename(rel_path.rstrip("/"))))
+    return archive_response(sources, name, format, user=user)
@@ -1,13 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from backend.services.auth_service import get_user, verify_password, create_access_token
+from backend.services.password_service import run_password, attempts, client_ip
+from backend.utils.executors import run_io
+from backend.utils.timing import phase
 
 router = APIRouter()
 
 @router.post("/api/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = get_user(form_data.username)
-    if not user or not verify_password(form_data.password, user):
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    # Only per client: a per-account counter would let anyone lock out any user
+    keys = (("ip", client_ip(request)),)
+    attempts.check(*keys)
+    with phase("user_lookup"):
+        user = await run_io(get_user, form_data.username)
+    if not user or not await run_password(verify_password, form_data.password, user):
+        attempts.failed(*keys)
         raise HTTPException(status_code=401, detail="Incorrect username or password")
     access_token = create_access_token(data={
         "sub": user["username"], 
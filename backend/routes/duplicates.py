@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends, Query
+from backend.services.auth_service import require_permission
+from backend.services.hash_service import duplicates_service
+from backend.services.scan_service import request_scan
+from backend.utils.path_utils import SCAN_ROOT
+from backend.utils.executors import run_io
+
+router = APIRouter()
+
+@router.get("/api/duplicates")
+async def list_duplicates(
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=50, ge=1, le=500),
+    min_size: int = Query(default=0, ge=0),
+    user=Depends(require_permission("browse"))
+):
+    """Duplicate file groups, sorted by reclaimable bytes"""
+    return await run_io(duplicates_service, offset, limit, min_size)
+
+@router.post("/api/duplicates/refresh")
+def refresh_duplicates(user=Depends(require_permission("monitor"))):
+    """Queue a hashing run for the scan leader"""
+    request_scan(SCAN_ROOT, kind="hash")
+    return {"status": "queued"}
@@ -0,0 +1,42 @@
+from typing import List, Dict, Any
+from fastapi import APIRouter, Body, Depends, Query
+from backend.services.auth_service import get_current_user
+from backend.services.fileops_service import batch_service
+from backend.utils.executors import run_io
+
+router = APIRouter()
+
+@router.post("/api/files/batch", status_code=202)
+async def batch_operations(
+    operations: List[Dict[str, Any]] = Body(..., embed=True),
+    user=Depends(get_current_user)
+):
+    """
+    Run many file operations as one background job. Each operation is one of
+    {"op": "delete", "path", optional "permanent"}, {"op": "rename", "path", "new_name"},
+    {"op": "move" or "copy", "path", "dest", optional "new_name"} or
+    {"op": "mkdir", "path"}.
+    """
+    return await run_io(batch_service, operations, user)
+
+@router.post("/api/file/copy", status_code=202)
+async def copy_file(
+    path: str = Query(...),
+    dest: str = Query(default=""),
+    new_name: str = Query(default=None),
+    user=Depends(get_current_user)
+):
+    """Copy a file or folder into the folder dest, as a background job"""
+    operation = {"op": "copy", "path": path, "dest": dest, "new_name": new_name}
+    return await run_io(batch_service, [operation], user)
+
+@router.post("/api/file/move", status_code=202)
+async def move_file(
+    path: str = Query(...),
+    dest: str = Query(default=""),
+    new_name: str = Query(default=None),
+    user=Depends(get_current_user)
+):
+    """Move a file or folder into the folder dest, as a background job"""
+    operation = {"op": "move", "path": path, "dest": dest, "new_name": new_name}
+    return await run_io(batch_service, [operation], user)
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Depends, Query
+from backend.services.auth_service import get_current_user
+from backend.services.stream_service import stream_folder_service
+from backend.utils.executors import run_io
+
+router = APIRouter()
+
+@router.get("/api/folder/stream")
+async def stream_folder(
+    path: str = Query(default=None),
+    recursive: bool = Query(default=False),
+    max_depth: int = Query(default=None, ge=1),
+    user=Depends(get_current_user)
+):
+    """All entries of a folder as NDJSON, one object per line"""
+    return await run_io(stream_folder_service, path, recursive, max_depth)
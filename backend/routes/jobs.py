@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends
+from backend.services.auth_service import get_current_user
+from backend.services.job_service import list_jobs_service, load_job, cancel_job_service
+
+router = APIRouter()
+
+@router.get("/api/jobs")
+def list_jobs(user=Depends(get_current_user)):
+    return list_jobs_service(user)
+
+@router.get("/api/jobs/{job_id}")
+def job_status(job_id: str, user=Depends(get_current_user)):
+    """Progress (done/total, bytes_done/bytes_total), errors and result of a job"""
+    return load_job(job_id, user)
+
+@router.delete("/api/jobs/{job_id}")
+def cancel_job(job_id: str, user=Depends(get_current_user)):
+    return cancel_job_service(job_id, user)
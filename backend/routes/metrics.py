@@ -0,0 +1,22 @@
+import os
+import secrets
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from backend.utils.metrics import snapshot, render_snapshots
+from backend.services.worker_service import WORKER_ID, other_workers
+
+# Optional bearer token for the scraper; without it /metrics is public
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+router = APIRouter()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics(request: Request):
+    if METRICS_TOKEN:
+        auth = request.headers.get("authorization", "")
+        if not secrets.compare_digest(auth, f"Bearer {METRICS_TOKEN}"):
+            raise HTTPException(status_code=401, detail="Invalid metrics token")
+    # All workers, each with its own worker label; the others as of their last publish
+    snapshots = [(WORKER_ID, snapshot())]
+    snapshots.extend((state["worker"], state["metrics"]) for state in other_workers() if "metrics" in state)
+    return PlainTextResponse(render_snapshots(snapshots), media_type="text/plain; version=0.0.4")
@@ -1,3 +1,4 @@
+from typing import List
 from fastapi import APIRouter, Depends, HTTPException, Query, Form, Request
 from backend.services.share_service import (
     list_shares_service,
@@ -5,8 +6,11 @@ from backend.services.share_service import (
     delete_share_service,
     access_share_service,
     download_share_service,
+    authorize_share,
 )
 from backend.services.auth_service import get_current_user, require_permission
+from backend.utils.executors import run_io
+from backend.services.thumbnail_service import THUMB_DEFAULT_SIZE, THUMB_MAX_SIZE
 
 router = APIRouter()
 
@@ -19,42 +23,84 @@ def create_share(
     path: str = Query(...),
     password: str = Query(default=None),
     expires_in: int = Query(default=3600),
+    bandwidth_limit: int = Query(default=None, ge=0),
     user=Depends(require_permission("share"))
 ):
-    return create_share_service(path, password, expires_in, user)
+    return create_share_service(path, password, expires_in, user, bandwidth_limit)
 
 @router.delete("/api/share/{token}")
 def delete_share(token: str, user=Depends(get_current_user)):
     return delete_share_service(token, user)
 
 @router.post("/api/share/{token}")
-def access_share(token: str, password: str = Form(default=None)):
-    return access_share_service(token, password)
+async def access_share(
+    token: str,
+    request: Request,
+    password: str = Form(default=None),
+    format: str = Form(default=None, pattern="^compact$"),
+    cursor: str = Form(default=None),
+    limit: int = Form(default=None, ge=1),
+):
+    share = await authorize_share(token, password, request)
+    return await run_io(access_share_service, share, request, format, cursor, limit)
 
 @router.get("/api/share/{token}/download")
-def download_share(
+async def download_share(
     token: str,
     password: str = Query(default=None),
     file: str = Query(default=None),
     request: Request = None,
 ):
-    return download_share_service(token, password, file, request)
+    share = await authorize_share(token, password, request)
+    return await run_io(download_share_service, share, file, request)
 
 @router.post("/api/share/{token}/browse")
-def browse_share_folder(
+async def browse_share_folder(
     token: str,
+    request: Request,
     path: str = Form(default=""),
-    password: str = Form(default=None)
+    password: str = Form(default=None),
+    format: str = Form(default=None, pattern="^compact$"),
+    cursor: str = Form(default=None),
+    limit: int = Form(default=None, ge=1),
 ):
     from backend.services.share_service import browse_share_service
-    return browse_share_service(token, password, path)
+    share = await authorize_share(token, password, request)
+    return await run_io(browse_share_service, share, path, request, format, cursor, limit)
 
 @router.get("/api/share/{token}/download-folder")
-def download_share_folder(
+async def download_share_folder(
     token: str,
+    request: Request,
     password: str = Query(default=None),
     path: str = Query(default=""),
-    request: Request = None,
 ):
     from backend.services.share_service import download_folder_service
-    return download_folder_service(token, password, path, request)
+    share = await authorize_share(token, password, request)
+    return await run_io(download_folder_service, share, path)
+
+@router.post("/api/share/{token}/archive")
+async def download_share_selection(
+    token: str,
+    request: Request,
+    paths: List[str] = Form(...),
+    format: str = Form(default="zip"),
+    name: str = Form(default=None),
+    password: str = Form(default=None),
+):
+    from backend.services.share_service import download_selection_service
+    share = await authorize_share(token, password, request)
+    return await run_io(download_selection_service, share, paths, format, name)
+
+@router.get("/api/share/{token}/thumb")
+async def share_thumb(
+    token: str,
+    request: Request,
+    file: str = Query(default=None),
+    password: str = Query(default=None),
+    w: int = Query(default=THUMB_DEFAULT_SIZE, ge=16, le=THUMB_MAX_SIZE),
+    h: int = Query(default=THUMB_DEFAULT_SIZE, ge=16, le=THUMB_MAX_SIZE),
+):
+    from backend.services.share_service import thumb_share_service
+    share = await authorize_share(token, password, request)
+    return await run_io(thumb_share_service, share, file, w, h)
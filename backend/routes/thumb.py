@@ -0,0 +1,49 @@
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query
+from backend.services.auth_service import get_current_user, require_permission
+from backend.services.thumbnail_service import (
+    thumbnail_response,
+    schedule_pregenerate,
+    THUMB_DEFAULT_SIZE,
+    THUMB_MAX_SIZE,
+)
+from backend.utils.path_utils import SCAN_ROOT, is_public_path
+from backend.utils.executors import run_io
+
+router = APIRouter()
+
+def resolve_path(path):
+    rel_path = (path or "").lstrip("/")
+    abs_path = os.path.join(SCAN_ROOT, rel_path)
+    if not is_public_path(SCAN_ROOT, abs_path):
+        raise HTTPException(status_code=403, detail="Pfad nicht erlaubt")
+    return abs_path
+
+@router.get("/api/thumb")
+async def get_thumb(
+    path: str = Query(...),
+    w: int = Query(default=THUMB_DEFAULT_SIZE, ge=16, le=THUMB_MAX_SIZE),
+    h: int = Query(default=THUMB_DEFAULT_SIZE, ge=16, le=THUMB_MAX_SIZE),
+    user=Depends(get_current_user)
+):
+    """JPEG thumbnail of an image (or video frame) below SCAN_ROOT"""
+    return await run_io(thumb_file, path, w, h)
+
+def thumb_file(path, w, h):
+    abs_path = resolve_path(path)
+    if not os.path.isfile(abs_path):
+        raise HTTPException(status_code=404, detail="File not found")
+    return thumbnail_response(abs_path, w, h)
+
+@router.post("/api/thumb/pregenerate")
+def pregenerate_thumbs(
+    path: str = Query(default=None),
+    user=Depends(require_permission("browse"))
+):
+    """Queue thumbnail generation for all media files in a folder"""
+    abs_path = resolve_path(path)
+    if not os.path.isdir(abs_path):
+        raise HTTPException(status_code=404, detail="Folder not found")
+    if not schedule_pregenerate(abs_path):
+        raise HTTPException(status_code=503, detail="Thumbnail generation unavailable or queue full")
+    return {"status": "queued", "path": path or ""}
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, Query
+from backend.services.auth_service import require_permission
+from backend.services.trash_service import (
+    list_trash_service,
+    restore_service,
+    delete_item_service,
+    empty_trash_service,
+)
+from backend.utils.executors import run_io
+
+router = APIRouter()
+
+@router.get("/api/trash")
+async def list_trash(user=Depends(require_permission("delete"))):
+    """Deleted items with their original path and when they will be purged"""
+    return await run_io(list_trash_service, user)
+
+@router.post("/api/trash/{item_id}/restore")
+async def restore_item(
+    item_id: str,
+    new_name: str = Query(default=None),
+    user=Depends(require_permission("delete"))
+):
+    return await run_io(restore_service, item_id, user, new_name)
+
+@router.delete("/api/trash/{item_id}", status_code=202)
+async def delete_item(item_id: str, user=Depends(require_permission("delete"))):
+    return await run_io(delete_item_service, item_id, user)
+
+@router.delete("/api/trash", status_code=202)
+async def empty_trash(user=Depends(require_permission("delete"))):
+    return await run_io(empty_trash_service, user)
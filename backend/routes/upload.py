@@ -0,0 +1,64 @@
+from fastapi import APIRouter, Depends, Form, HTTPException, Request
+from backend.services.upload_service import (
+    create_upload_service,
+    upload_status_service,
+    expected_chunk_length,
+    write_chunk_service,
+    finalize_upload_service,
+    abort_upload_service,
+)
+from backend.services.auth_service import require_permission
+from backend.utils.executors import run_io, run_cpu
+
+router = APIRouter()
+
+@router.post("/api/upload")
+def create_upload(
+    path: str = Form(default=""),
+    filename: str = Form(...),
+    size: int = Form(...),
+    chunk_size: int = Form(default=None),
+    overwrite: bool = Form(default=False),
+    user=Depends(require_permission("upload"))
+):
+    """Start a resumable upload into the folder path (relative to SCAN_ROOT)"""
+    return create_upload_service(path, filename, size, chunk_size, overwrite, user)
+
+@router.get("/api/upload/{upload_id}")
+def upload_status(upload_id: str, user=Depends(require_permission("upload"))):
+    """Progress of an upload, including the missing chunk indices for resuming"""
+    return upload_status_service(upload_id, user)
+
+@router.put("/api/upload/{upload_id}/chunks/{index}")
+async def upload_chunk(
+    upload_id: str,
+    index: int,
+    request: Request,
+    user=Depends(require_permission("upload"))
+):
+    """Raw request body is written at offset index * chunk_size"""
+    expected = await run_io(expected_chunk_length, upload_id, index, user)
+    too_large = HTTPException(status_code=413, detail=f"Chunk {index} must be {expected} bytes")
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > expected:
+        raise too_large
+    # Never buffer more than one chunk, whatever the client sends
+    data = bytearray()
+    async for part in request.stream():
+        data += part
+        if len(data) > expected:
+            raise too_large
+    return await run_io(write_chunk_service, upload_id, index, data, user)
+
+@router.post("/api/upload/{upload_id}/finalize")
+async def finalize_upload(
+    upload_id: str,
+    checksum: str = Form(default=None),
+    user=Depends(require_permission("upload"))
+):
+    # Hashing the whole file for the checksum is CPU work
+    return await run_cpu(finalize_upload_service, upload_id, checksum, user)
+
+@router.delete("/api/upload/{upload_id}")
+def abort_upload(upload_id: str, user=Depends(require_permission("upload"))):
+    return abort_upload_service(upload_id, user)
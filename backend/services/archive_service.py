@@ -0,0 +1,286 @@
+import os
+import hashlib
+import tarfile
+import zipfile
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from backend.utils.path_utils import is_internal_name
+from backend.utils.disk_cache import DiskLRUCache
+from backend.utils.executors import iterate_in, aiter_file, io_executor, cpu_executor
+from backend.services.bandwidth_service import shaped
+
+ARCHIVE_CACHE_DIR = os.getenv(
+    "ARCHIVE_CACHE_DIR", os.path.join(os.path.dirname(__file__), "archive_cache")
+)
+# Byte budget for cached archives, 0 disables the cache
+ARCHIVE_CACHE_MAX_BYTES = int(os.getenv("ARCHIVE_CACHE_MAX_BYTES", 0))
+ZIP_COMPRESSLEVEL = int(os.getenv("ZIP_COMPRESSLEVEL", 6))
+CHUNK_SIZE = 1024 * 1024  # 1MB chunks
+
+ARCHIVE_FORMATS = {
+    "zip": "application/zip",
+    "tar": "application/x-tar",
+}
+
+archive_cache = DiskLRUCache(ARCHIVE_CACHE_DIR, ARCHIVE_CACHE_MAX_BYTES, suffix=".zip")
+
+
+def subtree_fingerprint(target_path: str, compresslevel: int = ZIP_COMPRESSLEVEL) -> str:
+    """
+    Hash over (archive name, size, mtime) of every member of the archive of
+    target_path, plus the compression settings. Taken from a stat of each
+    member, not from the listing cache: a file rewritten in place leaves its
+    folder's mtime, and with it the cached listing, unchanged.
+    """
+    h = hashlib.sha256(f"zip:{compresslevel}".encode("utf-8"))
+    for abs_path, arcname, is_dir in iter_archive_members([(target_path, "")]):
+        try:
+            # Follows symlinks like the archive itself, which stores their targets
+            st = os.stat(abs_path)
+        except OSError:
+            h.update(f"{arcname}\0error\n".encode("utf-8", "surrogateescape"))
+            continue
+        if is_dir:
+            h.update(f"{arcname}/\0{st.st_mtime_ns}\n".encode("utf-8", "surrogateescape"))
+        else:
+            h.update(f"{arcname}\0{st.st_size}\0{st.st_mtime_ns}\n".encode("utf-8", "surrogateescape"))
+    return h.hexdigest()
+
+
+def _unique_arcname(arcname: str, used: set) -> str:
+    if arcname not in used:
+        return arcname
+    base, ext = os.path.splitext(arcname)
+    n = 1
+    while f"{base} ({n}){ext}" in used:
+        n += 1
+    return f"{base} ({n}){ext}"
+
+
+def iter_archive_members(sources):
+    """
+    Expand (abs_path, arcname) pairs into (abs_path, arcname, is_dir) members.
+
+    An empty arcname puts the contents of a directory at the archive root.
+    Files reachable through several selected paths are emitted only once and
+    clashing names get a " (n)" suffix.
+    """
+    seen_files = set()
+    used_names = set()
+    for abs_path, arcname in sources:
+        if os.path.isfile(abs_path):
+            real = os.path.realpath(abs_path)
+            if real in seen_files:
+                continue
+            seen_files.add(real)
+            name = _unique_arcname(arcname or os.path.basename(abs_path), used_names)
+            used_names.add(name)
+            yield abs_path, name, False
+            continue
+        if arcname:
+            arcname = _unique_arcname(arcname, used_names)
+            used_names.add(arcname)
+            yield abs_path, arcname, True
+        for root, dirs, files in os.walk(abs_path):
+            # Trash and partial uploads never end up in an archive
+            dirs[:] = sorted(d for d in dirs if not is_internal_name(d))
+            files = [f for f in files if not is_internal_name(f)]
+            rel_root = os.path.relpath(root, abs_path)
+            prefix = arcname if rel_root == "." else os.path.join(arcname, rel_root)
+            for d in dirs:
+                name = os.path.join(prefix, d)
+                if name not in used_names:
+                    used_names.add(name)
+                    yield os.path.join(root, d), name, True
+            for file in sorted(files):
+                file_path = os.path.join(root, file)
+                real = os.path.realpath(file_path)
+                if real in seen_files:
+                    continue
+                seen_files.add(real)
+                name = _unique_arcname(os.path.join(prefix, file), used_names)
+                used_names.add(name)
+                yield file_path, name, False
+
+
+class _ChunkBuffer:
+    """Write-only sink whose content is drained by the streaming generator"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _iter_zip(members, compresslevel):
+    buf = _ChunkBuffer()
+    # The sink is not seekable, so zipfile writes data descriptors and
+    # never has to go back: memory use is bounded by CHUNK_SIZE
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED, compresslevel=compresslevel) as zip_file:
+        for abs_path, arcname, is_dir in members:
+            try:
+                if is_dir:
+                    zip_file.mkdir(arcname)
+                else:
+                    info = zipfile.ZipInfo.from_file(abs_path, arcname, strict_timestamps=False)
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                    with open(abs_path, "rb") as src, zip_file.open(info, "w") as dst:
+                        while True:
+                            chunk = src.read(CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            dst.write(chunk)
+                            data = buf.drain()
+                            if data:
+                                yield data
+            except (OSError, IOError) as e:
+                # Skip files that can't be read (permissions, etc.)
+                print(f"Warning: Skipping file {abs_path}: {e}")
+                continue
+            data = buf.drain()
+            if data:
+                yield data
+    yield buf.drain()
+
+
+def _iter_tar(members):
+    # Uncompressed ustar/pax stream, written block by block by hand so a
+    # large file never has to be buffered in full
+    written = 0
+    for abs_path, arcname, is_dir in members:
+        try:
+            stat = os.stat(abs_path)
+            info = tarfile.TarInfo(arcname)
+            info.mtime = int(stat.st_mtime)
+            info.mode = stat.st_mode & 0o7777
+            if is_dir:
+                info.type = tarfile.DIRTYPE
+                info.size = 0
+            else:
+                info.size = stat.st_size
+            src = None if is_dir else open(abs_path, "rb")
+        except OSError as e:
+            print(f"Warning: Skipping file {abs_path}: {e}")
+            continue
+        header = info.tobuf(format=tarfile.PAX_FORMAT)
+        written += len(header)
+        yield header
+        if src is None:
+            continue
+        with src:
+            remaining = info.size
+            while remaining > 0:
+                chunk = src.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    # File shrank while streaming: pad to the announced size
+                    chunk = b"\0" * min(CHUNK_SIZE, remaining)
+                remaining -= len(chunk)
+                written += len(chunk)
+                yield chunk
+        padding = -info.size % tarfile.BLOCKSIZE
+        if padding:
+            written += padding
+            yield b"\0" * padding
+    # End-of-archive marker, then pad to a full record
+    trailer = 2 * tarfile.BLOCKSIZE
+    trailer += -(written + trailer) % tarfile.RECORDSIZE
+    yield b"\0" * trailer
+
+
+def iter_archive(sources, fmt: str = "zip", compresslevel: int = ZIP_COMPRESSLEVEL):
+    """Yield the archive for the given (abs_path, arcname) pairs in chunks"""
+    members = iter_archive_members(sources)
+    if fmt == "tar":
+        return _iter_tar(members)
+    return _iter_zip(members, compresslevel)
+
+
+def archive_response(sources, archive_name: str, fmt: str = "zip", user=None, share=None) -> StreamingResponse:
+    """
+    Stream the given (abs_path, arcname) pairs as one ZIP or TAR archive,
+    shaped by the bandwidth limits of user or share.
+    """
+    if fmt not in ARCHIVE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported archive format: {fmt}")
+    # Deflate is CPU work, an uncompressed TAR only waits on the disk
+    executor = cpu_executor if fmt == "zip" else io_executor
+    return StreamingResponse(
+        shaped(
+            iterate_in(executor, iter_archive(sources, fmt)),
+            "share-archive" if share else "archive", user=user, share=share, path=archive_name,
+        ),
+        media_type=ARCHIVE_FORMATS[fmt],
+        headers={
+            "Content-Disposition": f'attachment; filename="{archive_name}.{fmt}"',
+            # Note: We can't provide Content-Length since we don't know the final size
+        },
+    )
+
+
+def _iter_zip_cached(key: str, target_path: str):
+    """
+    Yield the ZIP of target_path and write the same bytes into the archive
+    cache. The file is only published once the archive is complete; if
+    another request is already building it, just stream.
+    """
+    tmp_path = archive_cache.begin(key)
+    if tmp_path is None:
+        yield from iter_archive([(target_path, "")])
+        return
+    complete = False
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in iter_archive([(target_path, "")]):
+                f.write(chunk)
+                yield chunk
+        complete = True
+    finally:
+        # Also runs when the client goes away and the stream is closed early
+        archive_cache.finish(key, tmp_path, complete)
+
+
+def zip_response(target_path: str, folder_name: str, user=None, share=None) -> StreamingResponse:
+    """
+    Stream target_path as ZIP. With the archive cache enabled, a miss is
+    streamed while it is written to the cache, and later requests for the
+    same subtree fingerprint are served from disk.
+    """
+    if not archive_cache.enabled:
+        return archive_response([(target_path, "")], folder_name, user=user, share=share)
+
+    kind = "share-archive" if share else "archive"
+    headers = {"Content-Disposition": f'attachment; filename="{folder_name}.zip"'}
+    key = subtree_fingerprint(target_path)
+    path = archive_cache.get(key)
+    f = None
+    if path:
+        # Open right away so a concurrent eviction can't pull the file from under us
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            pass
+    if f is None:
+        return StreamingResponse(
+            shaped(iterate_in(cpu_executor, _iter_zip_cached(key, target_path)),
+                   kind, user=user, share=share, path=folder_name),
+            media_type="application/zip",
+            headers=headers,
+        )
+    return StreamingResponse(
+        shaped(aiter_file(f), kind, user=user, share=share, path=folder_name),
+        media_type="application/zip",
+        headers={**headers, "Content-Length": str(os.fstat(f.fileno()).st_size)},
+        # aiter_file closes it too, but only once the body is being sent
+        background=BackgroundTask(f.close),
+    )
@@ -3,6 +3,8 @@ import json
 from datetime import datetime, timedelta
 from passlib.context import CryptContext
 import jwt
+from backend.utils.metrics import Histogram
+from backend.utils.timing import phase
 
 ADMIN_USER = os.getenv("ADMIN_USER", "admin")
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "supersecret")
@@ -12,10 +14,15 @@ JWT_EXPIRE_MINUTES = 60
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+PASSWORD_CHECK_SECONDS = Histogram(
+    "mntsrv_password_check_seconds", "Duration of password verification", labels=("kind",)
+)
+
 def verify_password(plain_password, user):
     if user.get("is_admin"):
         return plain_password == ADMIN_PASSWORD
-    return pwd_context.verify(plain_password, user["password_hash"])
+    with PASSWORD_CHECK_SECONDS.time(kind="login"), phase("bcrypt"):
+        return pwd_context.verify(plain_password, user["password_hash"])
 
 def get_user(username):
     # Admin from ENV
@@ -50,6 +57,10 @@ from fastapi.security import OAuth2PasswordBearer
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/login")
 
 def get_current_user(token: str = Depends(oauth2_scheme)):
+    with phase("auth"):
+        return _user_from_token(token)
+
+def _user_from_token(token):
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         username = payload.get("sub")
@@ -69,8 +80,8 @@ def has_permission(user, permission):
     role = user.get("role", "standard")
     
     permissions = {
-        "admin": ["browse", "download", "share", "delete", "rename", "manage_users"],
-        "power": ["browse", "download", "share", "delete", "rename"],
+        "admin": ["browse", "download", "share", "delete", "rename", "upload", "manage_users", "monitor"],
+        "power": ["browse", "download", "share", "delete", "rename", "upload"],
         "standard": ["browse", "download", "share"],
         "readonly": ["browse", "download"]
     }
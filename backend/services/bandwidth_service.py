@@ -0,0 +1,240 @@
+import os
+import time
+import asyncio
+import itertools
+import threading
+from backend.utils.metrics import Gauge
+from backend.services.worker_service import WORKER_ID, register_state, on_refresh, other_workers
+
+# Limits in bytes per second, 0 = unlimited. They hold for the whole
+# installation: each worker gets the share of a limit that matches its part of
+# the streams on it (see _rebalance)
+BANDWIDTH_LIMIT = int(os.getenv("BANDWIDTH_LIMIT", 0))
+ROLE_LIMITS = {
+    role: int(os.getenv(f"BANDWIDTH_LIMIT_{role.upper()}", 0))
+    for role in ("admin", "power", "standard", "readonly")
+}
+# Split BANDWIDTH_LIMIT evenly across the active streams instead of first come, first served
+BANDWIDTH_FAIR_SHARE = os.getenv("BANDWIDTH_FAIR_SHARE", "true").lower() in ("1", "true", "yes")
+# Bucket capacity in seconds of traffic
+BANDWIDTH_BURST_SECONDS = float(os.getenv("BANDWIDTH_BURST_SECONDS", 0.5))
+
+
+class TokenBucket:
+    """
+    Token bucket that may go into debt: a chunk larger than the bucket is let
+    through and paid for by waiting, so chunk size and limit are independent.
+    """
+
+    def __init__(self, rate: float, burst_seconds: float = BANDWIDTH_BURST_SECONDS):
+        self.rate = rate
+        self.burst_seconds = burst_seconds
+        self.tokens = rate * burst_seconds
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self._refill()
+            self.rate = rate
+
+    def _refill(self):
+        now = time.monotonic()
+        capacity = self.rate * self.burst_seconds
+        self.tokens = min(capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, n: int) -> float:
+        """Take n tokens and return how long the caller has to wait for them"""
+        with self._lock:
+            if self.rate <= 0:
+                return 0.0
+            self._refill()
+            self.tokens -= n
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def consume_blocking(self, n: int):
+        delay = self.reserve(n)
+        if delay:
+            time.sleep(delay)
+
+
+class _Stream:
+    def __init__(self, stream_id, kind, user, share, path, limits):
+        self.id = stream_id
+        self.kind = kind
+        self.user = user
+        self.share = share
+        self.path = path
+        self.limits = limits
+        self.started = time.time()
+        self.bytes_sent = 0
+        self.fair_bucket = None
+        self._window_start = time.monotonic()
+        self._window_bytes = 0
+        self.current_bps = 0.0
+
+    def record(self, n):
+        self.bytes_sent += n
+        self._window_bytes += n
+        now = time.monotonic()
+        if now - self._window_start >= 1.0:
+            self.current_bps = self._window_bytes / (now - self._window_start)
+            self._window_start = now
+            self._window_bytes = 0
+
+    def info(self):
+        elapsed = max(time.time() - self.started, 1e-6)
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "user": self.user,
+            "share": self.share,
+            "path": self.path,
+            "bytes_sent": self.bytes_sent,
+            "elapsed_seconds": round(elapsed, 1),
+            "current_bps": round(self.current_bps),
+            "average_bps": round(self.bytes_sent / elapsed),
+            "limits": self.limits,
+            "fair_share_bps": round(self.fair_bucket.rate) if self.fair_bucket else None,
+            "worker": WORKER_ID,
+        }
+
+
+_lock = threading.Lock()
+_streams = {}
+_ids = itertools.count(1)
+_global_bucket = TokenBucket(BANDWIDTH_LIMIT)
+# Shared buckets per user and per share, so parallel connections of a
+# download manager all draw from the same budget: key -> (bucket, refs, limit)
+_buckets = {}
+# Streams of the other workers: "global" and per bucket key
+_remote = {}
+
+
+def _shared_bucket(key, limit):
+    bucket, refs, _ = _buckets.get(key, (None, 0, limit))
+    if bucket is None:
+        bucket = TokenBucket(limit)
+    _buckets[key] = (bucket, refs + 1, limit)
+    return bucket
+
+
+def _release_bucket(key):
+    bucket, refs, limit = _buckets[key]
+    if refs <= 1:
+        del _buckets[key]
+    else:
+        _buckets[key] = (bucket, refs - 1, limit)
+
+
+def _rebalance():
+    # Caller holds _lock
+    if BANDWIDTH_LIMIT and _streams:
+        total = len(_streams) + _remote.get("global", 0)
+        if BANDWIDTH_FAIR_SHARE:
+            for stream in _streams.values():
+                stream.fair_bucket.set_rate(BANDWIDTH_LIMIT / total)
+        else:
+            _global_bucket.set_rate(BANDWIDTH_LIMIT * len(_streams) / total)
+    for key, (bucket, refs, limit) in _buckets.items():
+        bucket.set_rate(limit * refs / (refs + _remote.get(key, 0)))
+
+
+def _published_state():
+    with _lock:
+        return {
+            "streams": [s.info() for s in _streams.values()],
+            "keys": [[kind, name, refs] for (kind, name), (_, refs, _) in _buckets.items()],
+        }
+
+
+def _refresh(states):
+    remote = {}
+    for state in states:
+        bandwidth = state.get("bandwidth") or {}
+        remote["global"] = remote.get("global", 0) + len(bandwidth.get("streams", ()))
+        for kind, name, refs in bandwidth.get("keys", ()):
+            remote[(kind, name)] = remote.get((kind, name), 0) + refs
+    global _remote
+    with _lock:
+        _remote = remote
+        _rebalance()
+
+
+register_state("bandwidth", _published_state)
+on_refresh(_refresh)
+
+
+async def shaped(iterator, kind, user=None, share=None, path=None):
+    """
+    Pass the chunks of an async iterator through the applicable token buckets
+    (global, per user role, per share) and track the stream for /api/admin/streams.
+    """
+    user_name = user.get("username") if user else None
+    role_limit = ROLE_LIMITS.get(user.get("role"), 0) if user else 0
+    share_token = share.get("token") if share else None
+    share_limit = int(share.get("bandwidth_limit") or 0) if share else 0
+
+    keys = []
+    with _lock:
+        stream = _Stream(next(_ids), kind, user_name, share_token, path, {
+            "global": BANDWIDTH_LIMIT or None,
+            "role": role_limit or None,
+            "share": share_limit or None,
+        })
+        buckets = []
+        if BANDWIDTH_LIMIT:
+            if BANDWIDTH_FAIR_SHARE:
+                stream.fair_bucket = TokenBucket(BANDWIDTH_LIMIT)
+                buckets.append(stream.fair_bucket)
+            else:
+                buckets.append(_global_bucket)
+        if role_limit:
+            keys.append(("user", user_name))
+            buckets.append(_shared_bucket(keys[-1], role_limit))
+        if share_limit:
+            keys.append(("share", share_token))
+            buckets.append(_shared_bucket(keys[-1], share_limit))
+        _streams[stream.id] = stream
+        _rebalance()
+
+    try:
+        async for chunk in iterator:
+            delay = max((b.reserve(len(chunk)) for b in buckets), default=0.0)
+            if delay:
+                await asyncio.sleep(delay)
+            yield chunk
+            stream.record(len(chunk))
+    finally:
+        with _lock:
+            del _streams[stream.id]
+            for key in keys:
+                _release_bucket(key)
+            _rebalance()
+
+
+def list_streams():
+    """Active streams of all workers"""
+    with _lock:
+        streams = [s.info() for s in _streams.values()]
+    for state in other_workers():
+        streams.extend((state.get("bandwidth") or {}).get("streams", ()))
+    return {
+        "streams": streams,
+        "active": len(streams),
+        "total_bps": sum(s["current_bps"] for s in streams),
+        "global_limit": BANDWIDTH_LIMIT or None,
+        "fair_share": BANDWIDTH_FAIR_SHARE,
+    }
+
+
+def _active_by_kind():
+    with _lock:
+        counts = {}
+        for stream in _streams.values():
+            counts[(stream.kind,)] = counts.get((stream.kind,), 0) + 1
+    return counts
+
+
+Gauge("mntsrv_active_downloads", "Downloads and archives currently streaming", labels=("kind",), callback=_active_by_kind)
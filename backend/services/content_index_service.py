@@ -0,0 +1,405 @@
+import os
+import re
+import json
+import zlib
+import time
+import heapq
+import bisect
+import datetime
+import itertools
+import threading
+import collections
+import concurrent.futures
+from array import array
+from fastapi import HTTPException
+from backend.utils.file_lock import FileLock, write_json_atomic
+from backend.utils.metrics import Gauge, Histogram
+from backend.services.search_service import INDEX_FILE, SEARCH_CACHE_SIZE, SEARCH_CACHE, ResultCache, index_items
+
+# Optional stage after each scan: index the words of text files for /api/search?content=
+CONTENT_INDEX_ENABLED = os.getenv("CONTENT_INDEX_ENABLED", "false").lower() in ("1", "true", "yes")
+CONTENT_INDEX_DIR = os.getenv(
+    "CONTENT_INDEX_DIR", os.path.join(os.path.dirname(INDEX_FILE), "content_index")
+)
+CONTENT_WORKERS = int(os.getenv("CONTENT_WORKERS", 2))
+# Larger files are not indexed
+CONTENT_MAX_FILE_SIZE = int(os.getenv("CONTENT_MAX_FILE_SIZE", 2 * 1024 * 1024))
+# New documents are written in segments of this many; once there are more than
+# CONTENT_MAX_SEGMENTS segments they are merged into one
+CONTENT_SEGMENT_DOCS = int(os.getenv("CONTENT_SEGMENT_DOCS", 5000))
+CONTENT_MAX_SEGMENTS = int(os.getenv("CONTENT_MAX_SEGMENTS", 8))
+
+# Indexed without a second look at the name; other unknown extensions are sniffed
+TEXT_EXTENSIONS = frozenset((
+    ".txt", ".md", ".markdown", ".rst", ".log", ".csv", ".tsv", ".json", ".jsonl", ".xml", ".yaml",
+    ".yml", ".toml", ".ini", ".cfg", ".conf", ".env", ".properties", ".html", ".htm", ".css", ".js",
+    ".jsx", ".ts", ".tsx", ".py", ".rb", ".go", ".rs", ".java", ".kt", ".c", ".h", ".cpp", ".hpp",
+    ".cs", ".php", ".pl", ".sh", ".bash", ".zsh", ".ps1", ".bat", ".sql", ".tex", ".srt", ".vtt",
+    ".diff", ".patch",
+))
+# Never opened
+BINARY_EXTENSIONS = frozenset((
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp", ".tif", ".tiff", ".heic", ".ico", ".mp3",
+    ".flac", ".wav", ".ogg", ".m4a", ".mp4", ".mkv", ".avi", ".mov", ".webm", ".zip", ".gz", ".tgz",
+    ".bz2", ".xz", ".7z", ".rar", ".tar", ".iso", ".img", ".pdf", ".doc", ".docx", ".xls", ".xlsx",
+    ".ppt", ".pptx", ".odt", ".exe", ".dll", ".so", ".bin", ".dat", ".db", ".sqlite", ".pyc", ".class",
+))
+SNIFF_BYTES = 8192
+MAX_TOKEN_LENGTH = 40
+SNIPPET_CHARS = 160
+TOKEN_RE = re.compile(r"\w+")
+
+MANIFEST_FILE = os.path.join(CONTENT_INDEX_DIR, "manifest.json")
+content_lock = FileLock(os.path.join(CONTENT_INDEX_DIR, "content.lock"))
+_state_cache = {"generation": None, "state": None}
+_state_lock = threading.Lock()
+_segments = {}
+
+CONTENT_SEARCH_SECONDS = Histogram("mntsrv_content_search_duration_seconds", "Duration of content_search")
+content_cache = ResultCache("content", SEARCH_CACHE_SIZE)
+CONTENT_DOCUMENTS = Gauge("mntsrv_content_index_documents", "Text files in the content index at last update")
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall(text.lower()) if 2 <= len(t) <= MAX_TOKEN_LENGTH]
+
+
+def looks_like_text(sample: bytes) -> bool:
+    """No NUL bytes and hardly any control characters besides whitespace"""
+    if b"\0" in sample:
+        return False
+    control = sum(1 for b in sample if b < 32 and b not in (9, 10, 12, 13, 27))
+    return control <= len(sample) // 100
+
+
+def tokenize_file(path: str):
+    """
+    Runs in a worker process. Returns {term: count} for a text file, or None if
+    the file turns out to be binary or can't be read.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read(CONTENT_MAX_FILE_SIZE)
+    except OSError:
+        return None
+    if not looks_like_text(data[:SNIFF_BYTES]):
+        return None
+    return dict(collections.Counter(tokenize(data.decode("utf-8", "replace"))))
+
+
+def _is_candidate(name):
+    return os.path.splitext(name)[1].lower() not in BINARY_EXTENSIONS
+
+
+def _encode_postings(doc_ids, counts):
+    # Doc ids ascending, stored as gaps; both arrays compressed together
+    gaps = array("I", (b - a for a, b in zip(itertools.chain((0,), doc_ids), doc_ids)))
+    return zlib.compress(gaps.tobytes() + array("I", counts).tobytes())
+
+
+def _decode_postings(blob):
+    values = array("I")
+    values.frombytes(zlib.decompress(blob))
+    n = len(values) // 2
+    return list(itertools.accumulate(values[:n])), values[n:]
+
+
+class SegmentWriter:
+    """Writes one immutable segment: <name>.post (postings) and <name>.terms (dictionary)"""
+
+    def __init__(self, name):
+        self.name = name
+        self.base = os.path.join(CONTENT_INDEX_DIR, name)
+        self._f = open(f"{self.base}.post.tmp", "wb")
+        self.terms = []
+        self.offsets = [0]
+
+    def add(self, term, doc_ids, counts):
+        self._f.write(_encode_postings(doc_ids, counts))
+        self.terms.append(term)
+        self.offsets.append(self._f.tell())
+
+    def close(self):
+        self._f.close()
+        os.replace(f"{self.base}.post.tmp", f"{self.base}.post")
+        write_json_atomic(f"{self.base}.terms", {"terms": self.terms, "offsets": self.offsets},
+                          separators=(",", ":"))
+
+
+class Segment:
+    """Read side of a segment; the term dictionary stays in memory, postings are read per query"""
+
+    def __init__(self, name):
+        self.name = name
+        self.base = os.path.join(CONTENT_INDEX_DIR, name)
+        with open(f"{self.base}.terms") as f:
+            data = json.load(f)
+        self.terms = data["terms"]
+        self.offsets = data["offsets"]
+
+    def postings(self, term, f=None):
+        """(doc ids, counts) for term; f: the open .post file, when reading many terms"""
+        i = bisect.bisect_left(self.terms, term)
+        if i == len(self.terms) or self.terms[i] != term:
+            return [], ()
+        start, end = self.offsets[i], self.offsets[i + 1]
+        if f is None:
+            with open(f"{self.base}.post", "rb") as f:
+                return self.postings(term, f)
+        f.seek(start)
+        return _decode_postings(f.read(end - start))
+
+
+def _segment(name):
+    segment = _segments.get(name)
+    if segment is None:
+        segment = _segments[name] = Segment(name)
+    return segment
+
+
+def _remove_segment(name):
+    _segments.pop(name, None)
+    for ext in ("post", "terms"):
+        try:
+            os.remove(os.path.join(CONTENT_INDEX_DIR, f"{name}.{ext}"))
+        except FileNotFoundError:
+            pass
+
+
+def _load_manifest():
+    try:
+        with open(MANIFEST_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"format": 1, "next_doc": 0, "next_segment": 0, "segments": [], "docs": {}}
+
+
+def _new_segment_name(manifest):
+    manifest["next_segment"] += 1
+    return f"seg-{manifest['next_segment']:06d}"
+
+
+def _write_segment(manifest, postings):
+    writer = SegmentWriter(_new_segment_name(manifest))
+    for term in sorted(postings):
+        doc_ids, counts = postings[term]
+        writer.add(term, doc_ids, counts)
+    writer.close()
+    manifest["segments"].append(writer.name)
+
+
+def _merge_segments(manifest):
+    """Merge all segments into one, dropping postings of changed or deleted files"""
+    live = {doc[0] for doc in manifest["docs"].values() if doc[0] >= 0}
+    segments = [_segment(name) for name in manifest["segments"]]
+    writer = SegmentWriter(_new_segment_name(manifest))
+    files = [open(f"{s.base}.post", "rb") for s in segments]
+    try:
+        for term, _ in itertools.groupby(heapq.merge(*(s.terms for s in segments))):
+            doc_ids, counts = [], []
+            # Segments are in creation order, so their doc ids ascend
+            for segment, f in zip(segments, files):
+                for doc_id, count in zip(*segment.postings(term, f)):
+                    if doc_id in live:
+                        doc_ids.append(doc_id)
+                        counts.append(count)
+            if doc_ids:
+                writer.add(term, doc_ids, counts)
+    finally:
+        for f in files:
+            f.close()
+    writer.close()
+    old = manifest["segments"]
+    manifest["segments"] = [writer.name]
+    return old
+
+
+def update_content_index():
+    """
+    Bring the content index up to date with the search index. Only files whose
+    size or mtime changed are tokenized again (on CONTENT_WORKERS processes);
+    their new postings go into new segments, the old ones become dead and are
+    dropped at the next merge.
+    """
+    start = time.time()
+    try:
+        items = index_items()
+    except Exception as e:
+        print(f"Content index: no search index to work from ({e})")
+        return None
+    os.makedirs(CONTENT_INDEX_DIR, exist_ok=True)
+    with content_lock:
+        manifest = _load_manifest()
+        docs = manifest["docs"]
+        seen = set()
+        todo = []
+        for parent, name, is_dir, _mtime in items:
+            if is_dir or not _is_candidate(name):
+                continue
+            path = os.path.join(parent, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if st.st_size > CONTENT_MAX_FILE_SIZE:
+                continue
+            seen.add(path)
+            known = docs.get(path)
+            if known is None or known[1] != st.st_size or known[2] != st.st_mtime_ns:
+                todo.append((path, st.st_size, st.st_mtime_ns))
+        removed = [path for path in docs if path not in seen]
+        for path in removed:
+            del docs[path]
+        print(f"Content index: {len(todo)} files to tokenize, {len(removed)} removed")
+
+        indexed = 0
+        with concurrent.futures.ProcessPoolExecutor(max_workers=CONTENT_WORKERS) as pool:
+            for offset in range(0, len(todo), CONTENT_SEGMENT_DOCS):
+                batch = todo[offset:offset + CONTENT_SEGMENT_DOCS]
+                postings = {}
+                for (path, size, mtime_ns), counts in zip(
+                    batch, pool.map(tokenize_file, [t[0] for t in batch], chunksize=16)
+                ):
+                    if counts is None:
+                        # Binary after all: remembered so it isn't opened again until it changes
+                        docs[path] = [-1, size, mtime_ns]
+                        continue
+                    doc_id = manifest["next_doc"]
+                    manifest["next_doc"] += 1
+                    docs[path] = [doc_id, size, mtime_ns]
+                    indexed += 1
+                    for term, count in counts.items():
+                        entry = postings.get(term)
+                        if entry is None:
+                            entry = postings[term] = ([], [])
+                        entry[0].append(doc_id)
+                        entry[1].append(count)
+                if postings:
+                    _write_segment(manifest, postings)
+
+        obsolete = []
+        if len(manifest["segments"]) > CONTENT_MAX_SEGMENTS:
+            obsolete = _merge_segments(manifest)
+        manifest["updated_at"] = datetime.datetime.now().isoformat()
+        manifest["documents"] = sum(1 for doc in docs.values() if doc[0] >= 0)
+        write_json_atomic(MANIFEST_FILE, manifest, separators=(",", ":"))
+        # Only now nothing refers to them any more
+        for name in obsolete:
+            _remove_segment(name)
+    CONTENT_DOCUMENTS.set(manifest["documents"])
+    print(f"Content index: {indexed} files tokenized, {manifest['documents']} documents, "
+          f"{len(manifest['segments'])} segments in {time.time() - start:.1f}s")
+    return manifest
+
+
+def _manifest_generation():
+    try:
+        st = os.stat(MANIFEST_FILE)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _load_state():
+    """Manifest plus doc id -> (path, size, mtime_ns), reloaded when the manifest changes"""
+    generation = _manifest_generation()
+    if generation is None:
+        raise HTTPException(status_code=404, detail="Content index has not been built")
+    with _state_lock:
+        if _state_cache["generation"] == generation:
+            return _state_cache["state"]
+    manifest = _load_manifest()
+    state = {
+        "segments": manifest["segments"],
+        "docs": {doc[0]: (path, doc[1], doc[2]) for path, doc in manifest["docs"].items() if doc[0] >= 0},
+    }
+    with _state_lock:
+        _state_cache.update(generation=generation, state=state)
+    return state
+
+
+def _snippet(path, terms):
+    """(line number, text around the first hit) or None if the file no longer contains a term"""
+    try:
+        with open(path, "rb") as f:
+            text = f.read(CONTENT_MAX_FILE_SIZE).decode("utf-8", "replace")
+    except OSError:
+        return None
+    pattern = re.compile(r"(?<!\w)(?:" + "|".join(map(re.escape, terms)) + r")(?!\w)", re.IGNORECASE)
+    match = pattern.search(text)
+    if match is None:
+        return None
+    line_start = text.rfind("\n", 0, match.start()) + 1
+    line_end = text.find("\n", match.end())
+    if line_end == -1:
+        line_end = len(text)
+    start = max(line_start, match.start() - SNIPPET_CHARS // 2)
+    end = min(line_end, start + SNIPPET_CHARS)
+    snippet = text[start:end].strip()
+    if start > line_start:
+        snippet = "…" + snippet
+    if end < line_end:
+        snippet += "…"
+    return text.count("\n", 0, match.start()) + 1, snippet
+
+
+def content_search(root: str, query: str, name_query: str = None, max_results: int = 100):
+    """
+    Text files under root that contain every word of query (optionally also
+    name_query in their name), most occurrences first, each with the line of
+    the first hit as snippet. Results are cached until the index is updated.
+    """
+    start = time.perf_counter()
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+    generation = _manifest_generation()
+    key = (tuple(sorted(terms)), root, name_query.lower() if name_query else None, max_results)
+    cached = content_cache.get(key, generation)
+    if cached is not None:
+        SEARCH_CACHE.inc(kind="content", result="hit")
+        return cached[0]
+    SEARCH_CACHE.inc(kind="content", result="miss")
+    for _ in range(2):
+        state = _load_state()
+        try:
+            postings = []
+            for term in terms:
+                counts = {}
+                for name in state["segments"]:
+                    for doc_id, count in zip(*_segment(name).postings(term)):
+                        counts[doc_id] = count
+                postings.append(counts)
+            break
+        except FileNotFoundError:
+            # Segments merged away in the meantime: take the new manifest
+            continue
+    else:
+        raise HTTPException(status_code=503, detail="Content index is being rewritten, try again")
+
+    # Rarest term first keeps the intersection small
+    postings.sort(key=len)
+    scores = {d: c for d, c in postings[0].items() if d in state["docs"]}
+    for counts in postings[1:]:
+        scores = {d: s + counts[d] for d, s in scores.items() if d in counts}
+
+    prefix = root.rstrip(os.sep) + os.sep if root else ""
+    name_lower = name_query.lower() if name_query else None
+    results = []
+    for doc_id in sorted(scores, key=lambda d: (-scores[d], d)):
+        path, size, _mtime = state["docs"][doc_id]
+        if prefix and not path.startswith(prefix):
+            continue
+        name = os.path.basename(path)
+        if name_lower and name_lower not in name.lower():
+            continue
+        hit = _snippet(path, terms)
+        if hit is None:
+            continue
+        results.append({"name": name, "path": path, "is_dir": False, "size": size,
+                        "matches": scores[doc_id], "line": hit[0], "snippet": hit[1]})
+        if len(results) >= max_results:
+            break
+    content_cache.put(key, generation, results)
+    CONTENT_SEARCH_SECONDS.observe(time.perf_counter() - start)
+    return results
@@ -1,9 +1,22 @@
 import os
 import json
+import time
+import bisect
+import base64
 import hashlib
+import secrets
 from typing import List, Dict, Any
+from backend.utils.file_lock import FileLock, write_json_atomic
 
-CACHE_DIR = os.path.join(os.path.dirname(__file__), "cache")
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.dirname(__file__), "cache"))
+# Serialisiert Dateisystem-Änderung + inkrementelles Cache-Update (siehe update_cache),
+# auch über mehrere uvicorn-Worker hinweg
+cache_lock = FileLock(os.path.join(CACHE_DIR, ".lock"))
+# Größere Verzeichnisse werden als Header + Seiten gespeichert, damit eine
+# Listing-Seite nur die benötigten Seiten liest
+LISTING_PAGE_SIZE = int(os.getenv("LISTING_PAGE_SIZE", 1000))
+# Sortierung der gespeicherten Einträge: Ordner zuerst, dann nach Name
+LISTING_SORT = "dirs_first_name"
 
 def ensure_cache_dir():
     if not os.path.exists(CACHE_DIR):
@@ -15,35 +28,176 @@ def get_cache_path(folder_path: str, mtime: float) -> str:
     h = hashlib.sha256(key.encode("utf-8")).hexdigest()
     return os.path.join(CACHE_DIR, f"{h}.json")
 
-from backend.utils.path_utils import SCAN_ROOT
+from backend.utils.path_utils import SCAN_ROOT, is_internal_name
+from backend.utils.metrics import Counter, Histogram
+from backend.utils.timing import phase
+
+LISTING_CACHE_REQUESTS = Counter(
+    "mntsrv_listing_cache_requests_total", "scan_or_cache lookups by result", labels=("result",)
+)
+FOLDER_SCAN_SECONDS = Histogram("mntsrv_folder_scan_duration_seconds", "Duration of scan_folder")
+
+def entry_info(name: str, is_dir: bool, stat) -> Dict[str, Any]:
+    """
+    Baut den Listing-Eintrag für eine Datei/einen Ordner.
+    """
+    info = {
+        "name": name,
+        "is_dir": is_dir,
+        "mtime": stat.st_mtime,
+    }
+    if not is_dir:
+        info["size"] = stat.st_size
+    return info
+
+def sort_key(entry: Dict[str, Any]):
+    return (not entry["is_dir"], entry["name"].casefold(), entry["name"])
+
+# Im Cache (und intern bis zur API-Grenze) ist ein Eintrag eine Zeile
+# [name, is_dir, mtime, size]; Dicts entstehen erst für die ausgelieferten Einträge
+ROW_COLUMNS = ("name", "is_dir", "mtime", "size")
+
+def to_row(entry: Dict[str, Any]) -> list:
+    return [entry["name"], entry["is_dir"], entry["mtime"], entry.get("size")]
+
+def to_entry(row: list) -> Dict[str, Any]:
+    name, is_dir, mtime, size = row
+    if is_dir:
+        return {"name": name, "is_dir": True, "mtime": mtime}
+    return {"name": name, "is_dir": False, "mtime": mtime, "size": size}
+
+def row_sort_key(row: list):
+    return (not row[1], row[0].casefold(), row[0])
+
+def _page_path(cache_path: str, index: int, generation: str = None) -> str:
+    # Ohne generation: Seitennamen älterer Versionen
+    base = cache_path[:-len('.json')]
+    if generation:
+        return f"{base}.{generation}.p{index}.page"
+    return f"{base}.p{index}.page"
+
+def _remove_pages(cache_path: str, header):
+    """Löscht die Seiten, auf die header verweist (falls es ein Seiten-Header ist)"""
+    header = header or {}
+    for index in range(header.get("pages", 0)):
+        try:
+            os.remove(_page_path(cache_path, index, header.get("generation")))
+        except FileNotFoundError:
+            pass
+
+def write_cache(folder_path: str, rel_path: str, mtime: float, entries: List[Dict[str, Any]]) -> str:
+    """
+    Schreibt den Listing-Cache, sortiert nach sort_key (entries wird dabei sortiert).
+    Bis LISTING_PAGE_SIZE Einträge eine Datei, darüber ein Header mit Anzahl und
+    erstem Sortierschlüssel je Seite plus eine Datei pro Seite.
+    Die Seiten tragen eine Generation, auf die der Header verweist: ein Leser sieht
+    so immer Header und Seiten desselben Stands, und die Seiten des vorherigen
+    Stands werden erst nach dem Austausch des Headers gelöscht.
+    """
+    entries.sort(key=sort_key)
+    rows = [to_row(e) for e in entries]
+    cache_path = get_cache_path(folder_path, mtime)
+    header = {"path": rel_path, "mtime": mtime, "count": len(rows), "sort": LISTING_SORT}
+    if len(rows) <= LISTING_PAGE_SIZE:
+        header["rows"] = rows
+    else:
+        generation = secrets.token_hex(6)
+        pages = [rows[i:i + LISTING_PAGE_SIZE] for i in range(0, len(rows), LISTING_PAGE_SIZE)]
+        for index, page in enumerate(pages):
+            write_json_atomic(_page_path(cache_path, index, generation), page)
+        header.update({
+            "page_size": LISTING_PAGE_SIZE,
+            "pages": len(pages),
+            "generation": generation,
+            "first_keys": [list(row_sort_key(page[0])) for page in pages],
+        })
+    # Header zuletzt und atomar, da andere Worker die Datei gleichzeitig lesen können
+    previous = _read_json(cache_path)
+    write_json_atomic(cache_path, header)
+    # Leser, die noch den alten Header haben, finden dessen Seiten nicht mehr und
+    # scannen neu (siehe read_listing)
+    _remove_pages(cache_path, previous)
+    return cache_path
+
+def remove_cache_file(cache_path: str):
+    """Löscht eine Cache-Datei samt ihrer Seiten"""
+    _remove_pages(cache_path, _read_json(cache_path))
+    try:
+        os.remove(cache_path)
+    except FileNotFoundError:
+        pass
+
+def _read_json(path: str):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _normalize(header: Dict[str, Any]) -> Dict[str, Any]:
+    # Cache-Dateien älterer Versionen: Dicts statt Zeilen, evtl. unsortiert und ohne count
+    if "entries" in header:
+        entries = header.pop("entries")
+        if header.get("sort") != LISTING_SORT:
+            entries.sort(key=sort_key)
+        header["rows"] = [to_row(e) for e in entries]
+        header["count"] = len(entries)
+        header["sort"] = LISTING_SORT
+    return header
+
+def _read_pages(cache_path: str, header: Dict[str, Any], first: int, last: int) -> List[list]:
+    rows = []
+    for index in range(first, last + 1):
+        path = _page_path(cache_path, index, header.get("generation"))
+        page = _read_json(path)
+        if page is None:
+            raise FileNotFoundError(path)
+        rows.extend(page)
+    return rows
+
+def _materialize(cache_path: str, header: Dict[str, Any]) -> Dict[str, Any]:
+    """Header + alle Seiten als vollständiges Listing mit Dict-Einträgen"""
+    if "entries" in header:
+        return _normalize_legacy(header)
+    rows = header["rows"] if "rows" in header else _read_pages(cache_path, header, 0, header["pages"] - 1)
+    data = {k: v for k, v in header.items() if k not in ("rows", "pages", "page_size", "generation", "first_keys")}
+    data["entries"] = [to_entry(row) for row in rows]
+    return data
+
+def _normalize_legacy(data: Dict[str, Any]) -> Dict[str, Any]:
+    if data.get("sort") != LISTING_SORT:
+        data["entries"].sort(key=sort_key)
+        data["count"] = len(data["entries"])
+        data["sort"] = LISTING_SORT
+    return data
 
 def scan_folder(folder_path: str) -> Dict[str, Any]:
     """
     Scannt ein Verzeichnis und gibt Dict mit Ordnern/Dateien zurück.
     """
     ensure_cache_dir()
+    with phase("scandir"):
+        return _scan_folder(folder_path)
+
+def _scan_folder(folder_path: str) -> Dict[str, Any]:
     try:
+        start = time.perf_counter()
         rel_path = os.path.relpath(folder_path, SCAN_ROOT)
         if rel_path == ".":
             rel_path = ""
         entries = []
         with os.scandir(folder_path) as it:
             for entry in it:
+                if is_internal_name(entry.name):
+                    continue
                 stat = entry.stat(follow_symlinks=False)
-                info = {
-                    "name": entry.name,
-                    "is_dir": entry.is_dir(follow_symlinks=False),
-                    "mtime": stat.st_mtime,
-                }
-                if not entry.is_dir(follow_symlinks=False):
-                    info["size"] = stat.st_size
-                entries.append(info)
+                entries.append(entry_info(entry.name, entry.is_dir(follow_symlinks=False), stat))
         # Cache schreiben
         mtime = os.stat(folder_path).st_mtime
-        cache_path = get_cache_path(folder_path, mtime)
-        with open(cache_path, "w") as f:
-            json.dump({"path": rel_path, "mtime": mtime, "entries": entries}, f)
-        return {"path": rel_path, "mtime": mtime, "entries": entries, "cache": cache_path}
+        cache_path = write_cache(folder_path, rel_path, mtime, entries)
+        FOLDER_SCAN_SECONDS.observe(time.perf_counter() - start)
+        return {"path": rel_path, "mtime": mtime, "count": len(entries), "sort": LISTING_SORT,
+                "entries": entries, "cache": cache_path}
     except Exception as e:
         return {"error": str(e)}
 
@@ -54,34 +208,195 @@ def load_cache(folder_path: str) -> Dict[str, Any]:
     try:
         mtime = os.stat(folder_path).st_mtime
         cache_path = get_cache_path(folder_path, mtime)
-        if os.path.exists(cache_path):
-            with open(cache_path) as f:
-                return json.load(f)
+        header = _read_json(cache_path)
+        if header is not None:
+            return _materialize(cache_path, header)
     except Exception:
         pass
     return None
 
+def load_header(folder_path: str):
+    """
+    Wie load_cache, liest bei großen Verzeichnissen aber nur den Header
+    (count, first_keys, ...) und liefert Zeilen statt Dicts.
+    Gibt (cache_path, header) oder None zurück.
+    """
+    try:
+        cache_path = get_cache_path(folder_path, os.stat(folder_path).st_mtime)
+    except OSError:
+        return None
+    header = _read_json(cache_path)
+    if header is None:
+        return None
+    return cache_path, _normalize(header)
+
+def listing_header(folder_path: str):
+    """Header aus dem Cache, scannt falls nötig. Gibt (cache_path, header) zurück."""
+    with phase("cache"):
+        cached = load_header(folder_path)
+    if cached:
+        LISTING_CACHE_REQUESTS.inc(result="hit")
+        return cached
+    LISTING_CACHE_REQUESTS.inc(result="miss")
+    data = scan_folder(folder_path)
+    if "error" in data:
+        return None, data
+    return data["cache"], _normalize(data)
+
+def listing_count(folder_path: str) -> int:
+    """Anzahl Einträge eines Verzeichnisses, ohne große Listings zu laden"""
+    _, header = listing_header(folder_path)
+    return header.get("count", 0)
+
+def read_listing(folder_path: str, offset: int = 0, limit: int = None, after=None):
+    """
+    Ausschnitt eines Listings in sort_key-Reihenfolge: ab offset oder, falls after
+    (ein Sortierschlüssel) gesetzt ist, direkt nach diesem Eintrag. Liest bei großen
+    Verzeichnissen nur die betroffenen Seiten; nur die zurückgegebenen Einträge
+    werden zu Dicts.
+    Gibt (header, entries, start) zurück; header enthält "error" bei Scan-Fehlern.
+    """
+    cache_path, header = listing_header(folder_path)
+    if "error" in header:
+        return header, [], 0
+    after = tuple(after) if after is not None else None
+    try:
+        header, rows, start = _read_listing(cache_path, header, offset, limit, after)
+    except FileNotFoundError:
+        # Seiten wurden zwischenzeitlich ersetzt (update_cache), neu scannen
+        data = scan_folder(folder_path)
+        if "error" in data:
+            return data, [], 0
+        header, rows, start = _read_listing(data["cache"], _normalize(data), offset, limit, after)
+    return header, [to_entry(row) for row in rows], start
+
+def _read_listing(cache_path: str, header: Dict[str, Any], offset: int, limit: int, after):
+    count = header["count"]
+
+    if "rows" in header:
+        rows = header["rows"]
+        if after is not None:
+            offset = bisect.bisect_right([row_sort_key(r) for r in rows], after)
+        end = count if limit is None else min(count, offset + limit)
+        return header, rows[offset:end], offset
+
+    page_size = header["page_size"]
+    if after is not None:
+        first_keys = [tuple(k) for k in header["first_keys"]]
+        page = max(0, bisect.bisect_right(first_keys, after) - 1)
+        rows = _read_pages(cache_path, header, page, page)
+        offset = page * page_size + bisect.bisect_right([row_sort_key(r) for r in rows], after)
+    end = count if limit is None else min(count, offset + limit)
+    if offset >= end:
+        return header, [], offset
+    rows = _read_pages(cache_path, header, offset // page_size, (end - 1) // page_size)
+    base = (offset // page_size) * page_size
+    return header, rows[offset - base:end - base], offset
+
+def iter_entries(folder_path: str):
+    """
+    Einträge eines Verzeichnisses einzeln: aus dem Cache, falls er aktuell ist
+    (seitenweise, sortiert), sonst direkt aus os.scandir (unsortiert, ohne den
+    Cache zu schreiben). Hält höchstens eine Cache-Seite im Speicher.
+    """
+    cached = load_header(folder_path)
+    if cached:
+        cache_path, header = cached
+        pages = [header["rows"]] if "rows" in header else (
+            _read_pages(cache_path, header, index, index) for index in range(header["pages"])
+        )
+        for rows in pages:
+            for row in rows:
+                yield to_entry(row)
+        return
+    with os.scandir(folder_path) as it:
+        for entry in it:
+            if is_internal_name(entry.name):
+                continue
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                # Zwischen scandir und stat gelöscht: nur diesen Eintrag auslassen
+                continue
+            yield entry_info(entry.name, entry.is_dir(follow_symlinks=False), stat)
+
+def encode_cursor(entry: Dict[str, Any]) -> str:
+    """Opaker Cursor für "nach diesem Eintrag weiterlesen" (siehe read_listing)"""
+    raw = json.dumps(list(sort_key(entry)), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str):
+    """Sortierschlüssel aus einem Cursor; ValueError bei ungültigem Cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        is_file, folded, name = json.loads(raw)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(is_file, bool) or not isinstance(folded, str) or not isinstance(name, str):
+        raise ValueError("Invalid cursor")
+    return (is_file, folded, name)
+
 def invalidate_cache(folder_path: str):
     """
     Löscht alle Cache-Dateien für ein Verzeichnis (unabhängig von MTime).
     """
     ensure_cache_dir()
+    # Im Cache steht der Pfad relativ zu SCAN_ROOT
+    rel_path = os.path.relpath(folder_path, SCAN_ROOT)
+    if rel_path == ".":
+        rel_path = ""
     for fname in os.listdir(CACHE_DIR):
         if fname.endswith(".json"):
             fpath = os.path.join(CACHE_DIR, fname)
-            try:
-                with open(fpath) as f:
-                    data = json.load(f)
-                    if data.get("path") == folder_path:
-                        os.remove(fpath)
-            except Exception:
-                continue
+            data = _read_json(fpath)
+            if data is not None and data.get("path") == rel_path:
+                remove_cache_file(fpath)
 
 def scan_or_cache(folder_path: str) -> Dict[str, Any]:
     """
     Gibt Cache zurück, scannt falls nötig.
     """
-    cache = load_cache(folder_path)
+    with phase("cache"):
+        cache = load_cache(folder_path)
     if cache:
+        LISTING_CACHE_REQUESTS.inc(result="hit")
         return cache
+    LISTING_CACHE_REQUESTS.inc(result="miss")
     return scan_folder(folder_path)
+
+def rescan_folder(folder_path: str, old_mtime: float = None) -> Dict[str, Any]:
+    """
+    Scannt ein geändertes Verzeichnis neu und entfernt den Cache des Stands old_mtime.
+    Anders als update_cache enthält das Ergebnis auch, was andere (parallele Jobs,
+    Uploads, SMB/NFS-Clients) in der Zwischenzeit geändert haben.
+    """
+    data = scan_folder(folder_path)
+    if old_mtime is not None and "error" not in data:
+        old_cache_path = get_cache_path(folder_path, old_mtime)
+        if old_cache_path != data["cache"]:
+            remove_cache_file(old_cache_path)
+    return data
+
+def update_cache(folder_path: str, old_mtime: float, upserts=(), removals=()) -> Dict[str, Any]:
+    """
+    Aktualisiert den Cache eines Verzeichnisses inkrementell, statt es neu zu scannen.
+    old_mtime ist die MTime des Verzeichnisses vor der Änderung; existiert dafür kein
+    Cache, wird das Verzeichnis einfach neu gescannt.
+    """
+    old_cache_path = get_cache_path(folder_path, old_mtime)
+    try:
+        data = _materialize(old_cache_path, _read_json(old_cache_path))
+    except Exception:
+        return scan_folder(folder_path)
+    try:
+        changed = {e["name"] for e in upserts} | set(removals)
+        entries = [e for e in data["entries"] if e["name"] not in changed]
+        entries.extend(upserts)
+        mtime = os.stat(folder_path).st_mtime
+        cache_path = write_cache(folder_path, data["path"], mtime, entries)
+        if cache_path != old_cache_path:
+            remove_cache_file(old_cache_path)
+        return {"path": data["path"], "mtime": mtime, "count": len(entries), "sort": LISTING_SORT,
+                "entries": entries, "cache": cache_path}
+    except Exception as e:
+        return {"error": str(e)}
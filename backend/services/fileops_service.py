@@ -0,0 +1,402 @@
+import os
+import errno
+import shutil
+from fastapi import HTTPException
+from backend.utils.path_utils import SCAN_ROOT, is_safe_path, is_public_path, is_internal_name
+from backend.services.auth_service import has_permission
+from backend.services.dirscan_service import rescan_folder, cache_lock
+from backend.services.search_service import update_index
+from backend.services.job_service import start_job, JobCancelled
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Permission needed per batch operation
+OPERATIONS = {
+    "delete": "delete",
+    "rename": "rename",
+    "move": "rename",
+    "mkdir": "upload",
+    "copy": "upload",
+}
+MAX_BATCH_OPERATIONS = int(os.getenv("MAX_BATCH_OPERATIONS", 10000))
+# Files removed between two cancellation checks while deleting a tree
+CANCEL_CHECK_EVERY = 500
+# Bytes per copy_file_range/read call; progress and cancellation are checked in between
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+# ioctl number of FICLONE (linux/fs.h): share all blocks of a file (btrfs, XFS)
+FICLONE = 0x40049409
+# copy_file_range/FICLONE not possible for this pair of files, use the next method
+_FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF}
+
+
+def _resolve(rel_path, allow_root=False):
+    rel_path = (rel_path or "").strip("/")
+    if not rel_path and not allow_root:
+        raise HTTPException(status_code=400, detail="Invalid path")
+    if os.path.isabs(rel_path) or ".." in rel_path.split("/"):
+        raise HTTPException(status_code=400, detail="Invalid path: directory traversal or absolute paths are not allowed")
+    abs_path = os.path.join(SCAN_ROOT, rel_path)
+    if not is_public_path(SCAN_ROOT, abs_path):
+        raise HTTPException(status_code=403, detail="Path not allowed")
+    return abs_path
+
+
+def _reflink(src_fd, dst_fd):
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return True
+    except OSError as e:
+        if e.errno in _FALLBACK_ERRNOS:
+            return False
+        raise
+
+
+def copy_file(src, dst, job):
+    """
+    Copy one file's content, fastest method first: FICLONE reflink (no data is
+    copied at all), then os.copy_file_range (in-kernel, may use server-side
+    copy on NFS), then chunked read/write. Removes dst if interrupted.
+    """
+    size = os.path.getsize(src)
+    with open(src, "rb") as fsrc, open(dst, "xb") as fdst:
+        try:
+            src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+            cloned = size > 0 and _reflink(src_fd, dst_fd)
+            if cloned:
+                job.advance(0, bytes_done=size)
+            offset = 0
+            use_range = hasattr(os, "copy_file_range")
+            while not cloned:
+                job.check_cancelled()
+                if use_range:
+                    try:
+                        n = os.copy_file_range(src_fd, dst_fd, COPY_CHUNK_SIZE)
+                    except OSError as e:
+                        if e.errno not in _FALLBACK_ERRNOS or offset:
+                            raise
+                        use_range = False
+                        continue
+                else:
+                    data = fsrc.read(COPY_CHUNK_SIZE)
+                    fdst.write(data)
+                    n = len(data)
+                if not n:
+                    break
+                offset += n
+                job.advance(0, bytes_done=n)
+        except BaseException:
+            fdst.close()
+            os.remove(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+def tree_size(abs_path):
+    """Total size of the files below abs_path (for byte progress)"""
+    if os.path.islink(abs_path):
+        return 0
+    if not os.path.isdir(abs_path):
+        return os.path.getsize(abs_path)
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(abs_path):
+        for name in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                continue
+    return total
+
+
+def copy_tree(src, dst, job):
+    """Copy a file, symlink or folder (recursively) to dst, which must not exist"""
+    if os.path.islink(src):
+        os.symlink(os.readlink(src), dst)
+    elif not os.path.isdir(src):
+        copy_file(src, dst, job)
+    else:
+        os.mkdir(dst)
+        for entry in os.scandir(src):
+            copy_tree(entry.path, os.path.join(dst, entry.name), job)
+        shutil.copystat(src, dst)
+
+
+def _valid_name(name):
+    return bool(name) and "/" not in name and "\\" not in name and name not in (".", "..") and not is_internal_name(name)
+
+
+def _rel(abs_path):
+    rel_path = os.path.relpath(abs_path, SCAN_ROOT)
+    return "" if rel_path == "." else rel_path
+
+
+def index_entries(abs_path):
+    """Search index entries for abs_path and everything below it"""
+    def entry(path, is_dir):
+        try:
+            mtime = os.lstat(path).st_mtime
+        except OSError:
+            mtime = 0
+        return {"name": os.path.basename(path), "path": path, "is_dir": is_dir, "mtime": mtime}
+
+    entries = [entry(abs_path, os.path.isdir(abs_path))]
+    if not entries[0]["is_dir"] or os.path.islink(abs_path):
+        return entries
+    for dirpath, dirnames, filenames in os.walk(abs_path):
+        dirnames[:] = [d for d in dirnames if not is_internal_name(d)]
+        for name in dirnames:
+            entries.append(entry(os.path.join(dirpath, name), True))
+        for name in filenames:
+            if not is_internal_name(name):
+                entries.append(entry(os.path.join(dirpath, name), False))
+    return entries
+
+
+class Changes:
+    """
+    Listing cache and search index changes of a batch, collected while it runs
+    and applied at the end: one rescan per affected directory and a single
+    update_index, instead of invalidating after every operation.
+    Directories are rescanned rather than patched, because others (uploads,
+    SMB/NFS clients, other jobs) may have changed them while the batch ran.
+    Index changes are kept as an ordered log, so later operations of a batch
+    also apply to what earlier ones added or moved.
+    """
+
+    def __init__(self):
+        # Affected directory -> its MTime before the first change
+        self.dirs = {}
+        self.index_steps = []
+
+    def _dir(self, abs_dir):
+        if abs_dir not in self.dirs:
+            try:
+                self.dirs[abs_dir] = os.stat(abs_dir).st_mtime
+            except OSError:
+                self.dirs[abs_dir] = None
+
+    def before(self, *abs_paths):
+        """Call before changing abs_paths, to remember their parents' MTimes"""
+        for abs_path in abs_paths:
+            self._dir(os.path.dirname(abs_path))
+
+    def removed(self, abs_path, index=True):
+        self._dir(os.path.dirname(abs_path))
+        if index:
+            self.index_steps.append(("remove", abs_path))
+
+    def added(self, abs_path, index=True):
+        self._dir(os.path.dirname(abs_path))
+        if index:
+            self.index_steps.append(("add", index_entries(abs_path)))
+
+    def moved(self, old_path, new_path):
+        self.removed(old_path, index=False)
+        self.added(new_path, index=False)
+        self.index_steps.append(("move", old_path, new_path))
+
+    def partially_removed(self, abs_path):
+        """After an interrupted delete: whatever is left is listed and indexed again"""
+        if os.path.lexists(abs_path):
+            self.index_steps.append(("remove", abs_path))
+            self.added(abs_path)
+        else:
+            self.removed(abs_path)
+
+    def apply(self):
+        with cache_lock:
+            for abs_dir, mtime in self.dirs.items():
+                if os.path.isdir(abs_dir):
+                    rescan_folder(abs_dir, mtime)
+        if self.index_steps:
+            update_index(steps=self.index_steps)
+
+
+def remove_tree(abs_path, on_removed=None):
+    """
+    shutil.rmtree, but calls on_removed() after every removed file, which may
+    raise to stop (cancellation) or sleep (rate limit).
+    """
+    if os.path.islink(abs_path) or not os.path.isdir(abs_path):
+        os.remove(abs_path)
+        return
+    for dirpath, dirnames, filenames in os.walk(abs_path, topdown=False):
+        for name in filenames:
+            os.remove(os.path.join(dirpath, name))
+            if on_removed is not None:
+                on_removed()
+        for name in dirnames:
+            path = os.path.join(dirpath, name)
+            if os.path.islink(path):
+                os.remove(path)
+            else:
+                os.rmdir(path)
+    os.rmdir(abs_path)
+
+
+def cancel_checker(job):
+    """on_removed callback for remove_tree that checks every CANCEL_CHECK_EVERY files"""
+    removed = [0]
+
+    def check():
+        removed[0] += 1
+        if removed[0] % CANCEL_CHECK_EVERY == 0:
+            job.check_cancelled()
+    return check
+
+
+def _delete(op, job, changes):
+    from backend.services.trash_service import move_to_trash, TRASH_ENABLED
+    path = op["abs_path"]
+    if not os.path.lexists(path):
+        raise FileNotFoundError("File or directory not found")
+    changes.before(path)
+    if TRASH_ENABLED and not op.get("permanent"):
+        item = move_to_trash(path, job.record["created_by"])
+        changes.removed(path)
+        return {"op": "delete", "path": op["path"], "trash_id": item["id"]}
+    try:
+        remove_tree(path, cancel_checker(job))
+    except BaseException:
+        changes.partially_removed(path)
+        raise
+    changes.removed(path)
+    return {"op": "delete", "path": op["path"]}
+
+
+def _rename(op, job, changes):
+    path = op["abs_path"]
+    new_path = os.path.join(os.path.dirname(path), op["new_name"])
+    if not os.path.lexists(path):
+        raise FileNotFoundError("File or directory not found")
+    if os.path.lexists(new_path):
+        raise FileExistsError("File or directory with new name already exists")
+    changes.before(path, new_path)
+    os.rename(path, new_path)
+    changes.moved(path, new_path)
+    return {"op": "rename", "path": op["path"], "new_path": _rel(new_path)}
+
+
+def _destination(op):
+    path = op["abs_path"]
+    new_path = os.path.join(op["abs_dest"], op.get("new_name") or os.path.basename(path))
+    if not os.path.lexists(path):
+        raise FileNotFoundError("File or directory not found")
+    if not os.path.isdir(op["abs_dest"]):
+        raise NotADirectoryError("Destination folder not found")
+    if is_safe_path(path, op["abs_dest"]):
+        raise ValueError(f"Cannot {op['op']} a folder into itself")
+    if os.path.lexists(new_path):
+        raise FileExistsError("File or directory already exists at the destination")
+    return path, new_path
+
+
+def _copy_into(path, new_path, job, changes):
+    job.record["bytes_total"] += tree_size(path)
+    changes.before(new_path)
+    try:
+        copy_tree(path, new_path, job)
+    finally:
+        # Also after a cancel: list and index what has been copied so far
+        if os.path.lexists(new_path):
+            changes.added(new_path)
+
+
+def _move(op, job, changes):
+    path, new_path = _destination(op)
+    changes.before(path, new_path)
+    try:
+        # Same filesystem: atomic, nothing is copied
+        os.rename(path, new_path)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        _copy_into(path, new_path, job, changes)
+        try:
+            remove_tree(path, cancel_checker(job))
+        except BaseException:
+            changes.partially_removed(path)
+            raise
+        changes.removed(path)
+    else:
+        changes.moved(path, new_path)
+    return {"op": "move", "path": op["path"], "new_path": _rel(new_path)}
+
+
+def _copy(op, job, changes):
+    path, new_path = _destination(op)
+    _copy_into(path, new_path, job, changes)
+    return {"op": "copy", "path": op["path"], "new_path": _rel(new_path)}
+
+
+def _mkdir(op, job, changes):
+    path = op["abs_path"]
+    if os.path.lexists(path):
+        raise FileExistsError("File or directory already exists")
+    changes.before(path)
+    os.mkdir(path)
+    changes.added(path)
+    return {"op": "mkdir", "path": op["path"]}
+
+
+HANDLERS = {"delete": _delete, "rename": _rename, "move": _move, "mkdir": _mkdir, "copy": _copy}
+
+
+def _validate(op, user):
+    kind = op.get("op")
+    if kind not in OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown operation: {kind}")
+    if not has_permission(user, OPERATIONS[kind]):
+        raise HTTPException(status_code=403, detail=f"Insufficient permissions. Required: {OPERATIONS[kind]}")
+    op = dict(op, abs_path=_resolve(op.get("path")))
+    if kind == "rename" and not _valid_name(op.get("new_name")):
+        raise HTTPException(status_code=400, detail="Invalid new name")
+    if kind in ("move", "copy"):
+        op["abs_dest"] = _resolve(op.get("dest"), allow_root=True)
+        if op.get("new_name") is not None and not _valid_name(op["new_name"]):
+            raise HTTPException(status_code=400, detail="Invalid new name")
+    if kind == "mkdir" and not _valid_name(os.path.basename(op["abs_path"])):
+        raise HTTPException(status_code=400, detail="Invalid folder name")
+    return op
+
+
+def run_operations(operations, job, handlers=HANDLERS):
+    """
+    Job body: runs the operations in order. A failing operation is recorded
+    and skipped; cache and index are updated once at the end, also after a
+    cancel, for everything that was done up to then.
+    """
+    changes = Changes()
+    results = []
+    try:
+        for op in operations:
+            job.check_cancelled()
+            try:
+                results.append(handlers[op["op"]](op, job, changes))
+            except (JobCancelled, KeyboardInterrupt):
+                raise
+            except Exception as e:
+                job.error(op.get("path"), str(e))
+            job.advance()
+    finally:
+        changes.apply()
+    return {"results": results}
+
+
+def batch_service(operations, user):
+    """
+    Check permissions and paths of all operations, then run them as one
+    background job. Returns the job record (poll /api/jobs/{id}).
+    """
+    if not operations:
+        raise HTTPException(status_code=400, detail="No operations given")
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_OPERATIONS} operations per batch")
+    operations = [_validate(op, user) for op in operations]
+    return start_job(
+        "batch", user, lambda job: run_operations(operations, job), total=len(operations),
+    )
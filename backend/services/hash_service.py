@@ -0,0 +1,255 @@
+import os
+import json
+import stat
+import time
+import hashlib
+import datetime
+import concurrent.futures
+from fastapi import HTTPException
+from backend.utils.path_utils import SCAN_ROOT
+from backend.utils.file_lock import write_json_atomic
+from backend.utils.metrics import Counter
+from backend.services.dirscan_service import scan_or_cache
+from backend.services.leader_service import STATE_DIR
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# Optional stage after each scan: find duplicate files by content
+HASHING_ENABLED = os.getenv("HASHING_ENABLED", "false").lower() in ("1", "true", "yes")
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", 2))
+# Read limit in bytes per second for all hash workers together, 0 = unlimited
+HASH_IO_LIMIT = int(os.getenv("HASH_IO_LIMIT", 0))
+# Smaller files are ignored, they can't free much space
+HASH_MIN_SIZE = int(os.getenv("HASH_MIN_SIZE", 1))
+HASH_STORE_FILE = os.getenv("HASH_STORE_FILE", os.path.join(STATE_DIR, "hashes.json"))
+DUPLICATES_FILE = os.getenv("DUPLICATES_FILE", os.path.join(STATE_DIR, "duplicates.json"))
+
+HASH_ALGORITHM = "xxh3_128" if xxhash is not None else "sha256"
+PARTIAL_BYTES = 64 * 1024  # head and tail
+READ_CHUNK = 1024 * 1024
+
+BYTES_HASHED = Counter("mntsrv_hash_bytes_total", "Bytes read for content hashing", labels=("stage",))
+
+_worker_bucket = None
+
+
+def _new_hasher():
+    return xxhash.xxh3_128() if xxhash is not None else hashlib.sha256()
+
+
+def _init_worker(rate):
+    global _worker_bucket
+    from backend.services.bandwidth_service import TokenBucket
+    _worker_bucket = TokenBucket(rate, burst_seconds=1.0) if rate else None
+
+
+def _read(f, size):
+    data = f.read(size)
+    if _worker_bucket is not None and data:
+        _worker_bucket.consume_blocking(len(data))
+    return data
+
+
+def hash_file(path: str, partial: bool):
+    """
+    Runs in a worker process. partial: hash of the first and last PARTIAL_BYTES
+    only. Returns (hex digest, bytes read) or (None, 0) if the file can't be read.
+    """
+    h = _new_hasher()
+    read = 0
+    try:
+        # O_NOFOLLOW: the path may have been replaced by a symlink since it was collected
+        with open(os.open(path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0)), "rb") as f:
+            if partial:
+                size = os.fstat(f.fileno()).st_size
+                head = _read(f, PARTIAL_BYTES)
+                h.update(head)
+                read += len(head)
+                if size > 2 * PARTIAL_BYTES:
+                    f.seek(size - PARTIAL_BYTES)
+                    tail = _read(f, PARTIAL_BYTES)
+                    h.update(tail)
+                    read += len(tail)
+            else:
+                while True:
+                    chunk = _read(f, READ_CHUNK)
+                    if not chunk:
+                        break
+                    h.update(chunk)
+                    read += len(chunk)
+    except OSError:
+        return None, 0
+    return h.hexdigest(), read
+
+
+def _file_key(st):
+    # Content can only have changed if one of these did; the path is irrelevant
+    return f"{st.st_dev}:{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def load_hash_store():
+    try:
+        with open(HASH_STORE_FILE) as f:
+            store = json.load(f)
+        if store.get("algorithm") == HASH_ALGORITHM:
+            return store["files"]
+    except (OSError, ValueError, KeyError):
+        pass
+    return {}
+
+
+def load_duplicates():
+    try:
+        with open(DUPLICATES_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_duplicates(result):
+    os.makedirs(os.path.dirname(DUPLICATES_FILE), exist_ok=True)
+    write_json_atomic(DUPLICATES_FILE, result)
+
+
+def _collect_files(root):
+    """(abs path, size) of all files below root, from the listing cache"""
+    files = []
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        data = scan_or_cache(folder)
+        for entry in data.get("entries", []):
+            path = os.path.join(folder, entry["name"])
+            if entry["is_dir"]:
+                stack.append(path)
+            elif entry.get("size", 0) >= HASH_MIN_SIZE:
+                files.append((path, entry["size"]))
+    return files
+
+
+def _group(items, key):
+    groups = {}
+    for item in items:
+        groups.setdefault(key(item), []).append(item)
+    return [g for g in groups.values() if len(g) > 1]
+
+
+def _hash_stage(pool, candidates, store, field, report):
+    """Fill store[key][field] for all candidates that don't have it yet"""
+    todo = [c for c in candidates if field not in store.setdefault(c["key"], {})]
+    futures = {pool.submit(hash_file, c["path"], field == "partial"): c for c in todo}
+    for future in concurrent.futures.as_completed(futures):
+        digest, read = future.result()
+        c = futures[future]
+        BYTES_HASHED.inc(read, stage=field)
+        report(read)
+        if digest is not None:
+            store[c["key"]][field] = digest
+    return [c for c in candidates if store[c["key"]].get(field)]
+
+
+def find_duplicates(root: str = SCAN_ROOT):
+    """
+    Group by size, then by a head/tail hash, then by the full content hash.
+    Hashes are stored by (device, inode, size, mtime) and reused by later runs.
+    """
+    start = time.time()
+    status = {"status": "hashing", "started": datetime.datetime.now().isoformat(),
+              "files_hashed": 0, "bytes_hashed": 0}
+    previous = load_duplicates() or {}
+    _save_duplicates({**previous, "progress": status})
+    last_report = [time.monotonic()]
+
+    def report(read):
+        status["bytes_hashed"] += read
+        status["files_hashed"] += 1
+        # Earlier results stay available while the new run is in progress
+        if time.monotonic() - last_report[0] >= 5:
+            last_report[0] = time.monotonic()
+            _save_duplicates({**previous, "progress": status})
+
+    print(f"Hashing: collecting candidates below {root}...")
+
+    by_size = _group(_collect_files(root), key=lambda f: f[1])
+    candidates = []
+    seen_inodes = set()
+    for group in by_size:
+        for path, size in group:
+            try:
+                st = os.stat(path, follow_symlinks=False)
+            except OSError:
+                continue
+            # Listings don't mark symlinks; hashing would follow them to their
+            # target (or block on a FIFO), so only regular files qualify
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            # Hard links share their blocks, deleting one frees nothing
+            if (st.st_dev, st.st_ino) in seen_inodes:
+                continue
+            seen_inodes.add((st.st_dev, st.st_ino))
+            candidates.append({"path": path, "size": st.st_size, "key": _file_key(st)})
+    candidates = [c for g in _group(candidates, key=lambda c: c["size"]) for c in g]
+
+    old_store = load_hash_store()
+    store = {c["key"]: old_store[c["key"]] for c in candidates if c["key"] in old_store}
+    rate = HASH_IO_LIMIT / HASH_WORKERS if HASH_IO_LIMIT else 0
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=HASH_WORKERS, initializer=_init_worker, initargs=(rate,)
+    ) as pool:
+        status.update(phase="partial", candidates=len(candidates))
+        partial = _hash_stage(pool, candidates, store, "partial", report)
+        partial = [c for g in _group(partial, key=lambda c: (c["size"], store[c["key"]]["partial"])) for c in g]
+        status["phase"] = "full"
+        full = _hash_stage(pool, partial, store, "full", report)
+
+    os.makedirs(os.path.dirname(HASH_STORE_FILE), exist_ok=True)
+    write_json_atomic(HASH_STORE_FILE, {"algorithm": HASH_ALGORITHM, "files": store})
+
+    groups = []
+    for group in _group(full, key=lambda c: (c["size"], store[c["key"]]["full"])):
+        size = group[0]["size"]
+        groups.append({
+            "hash": store[group[0]["key"]]["full"],
+            "size": size,
+            "count": len(group),
+            "reclaimable": size * (len(group) - 1),
+            "paths": sorted(os.path.relpath(c["path"], SCAN_ROOT) for c in group),
+        })
+    groups.sort(key=lambda g: (-g["reclaimable"], g["hash"]))
+    status.update(status="completed", phase=None, finished=datetime.datetime.now().isoformat(),
+                  duration_seconds=time.time() - start)
+    result = {
+        "algorithm": HASH_ALGORITHM,
+        "generated_at": status["finished"],
+        "total_groups": len(groups),
+        "total_reclaimable": sum(g["reclaimable"] for g in groups),
+        "groups": groups,
+        "progress": status,
+    }
+    _save_duplicates(result)
+    print(f"Hashing done: {len(groups)} duplicate groups, {result['total_reclaimable']} bytes reclaimable")
+    return result
+
+
+def duplicates_service(offset: int = 0, limit: int = 50, min_size: int = 0):
+    """One page of duplicate groups, largest reclaimable space first"""
+    result = load_duplicates()
+    if result is None:
+        raise HTTPException(status_code=404, detail="No duplicate scan has run yet")
+    groups = result.get("groups", [])
+    if min_size:
+        groups = [g for g in groups if g["size"] >= min_size]
+    return {
+        "algorithm": result.get("algorithm"),
+        "generated_at": result.get("generated_at"),
+        "progress": result.get("progress"),
+        "total_groups": len(groups),
+        "total_reclaimable": sum(g["reclaimable"] for g in groups),
+        "offset": offset,
+        "limit": limit,
+        "has_more": offset + limit < len(groups),
+        "groups": groups[offset:offset + limit],
+    }
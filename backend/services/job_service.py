@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import secrets
+import threading
+import concurrent.futures
+from fastapi import HTTPException
+from backend.utils.datetime_utils import format_utc_timestamp
+from backend.utils.file_lock import write_json_atomic
+from backend.utils.metrics import Gauge
+from backend.services.leader_service import STATE_DIR
+
+# Long-running file operations run here instead of inside the request
+JOB_DIR = os.path.join(STATE_DIR, "jobs")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+# Finished jobs are kept this long (seconds) for their status to be fetched
+JOB_TTL = int(os.getenv("JOB_TTL", 24 * 3600))
+# Progress is written at most this often (seconds)
+JOB_SAVE_INTERVAL = 0.5
+MAX_JOB_ERRORS = 100
+
+FINISHED = ("completed", "failed", "cancelled")
+
+job_executor = concurrent.futures.ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="mntsrv-job")
+_running = {}
+_running_lock = threading.Lock()
+
+Gauge("mntsrv_jobs_running", "Background jobs running in this worker", callback=lambda: len(_running))
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """
+    Status of one background job, kept in JOB_DIR/<id>.json so every worker can
+    report it. Cancellation is a marker file, checked by the job between steps.
+    """
+
+    def __init__(self, record):
+        self.record = record
+        self.id = record["id"]
+        self._last_save = 0
+
+    def save(self, force=False):
+        now = time.monotonic()
+        if force or now - self._last_save >= JOB_SAVE_INTERVAL:
+            self._last_save = now
+            write_json_atomic(_job_file(self.id, "json"), self.record)
+
+    def advance(self, done=1, bytes_done=0):
+        self.record["done"] += done
+        self.record["bytes_done"] += bytes_done
+        self.save()
+
+    def error(self, path, message):
+        errors = self.record["errors"]
+        if len(errors) < MAX_JOB_ERRORS:
+            errors.append({"path": path, "error": message})
+        self.record["error_count"] += 1
+
+    def cancelled(self):
+        return os.path.exists(_job_file(self.id, "cancel"))
+
+    def check_cancelled(self):
+        """Raise JobCancelled if a cancel was requested (call between steps)"""
+        if self.cancelled():
+            raise JobCancelled()
+
+
+def _job_file(job_id, ext):
+    return os.path.join(JOB_DIR, f"{job_id}.{ext}")
+
+
+def _remove_job_files(job_id):
+    for ext in ("json", "cancel"):
+        try:
+            os.remove(_job_file(job_id, ext))
+        except FileNotFoundError:
+            pass
+
+
+def _run(job, fn):
+    record = job.record
+    record.update(status="running", started_at=format_utc_timestamp())
+    job.save(force=True)
+    try:
+        record["result"] = fn(job)
+        record["status"] = "completed"
+    except JobCancelled:
+        record["status"] = "cancelled"
+    except Exception as e:
+        print(f"Job {job.id} ({record['kind']}) failed: {e}")
+        record.update(status="failed", error=str(e))
+    finally:
+        record["finished_at"] = format_utc_timestamp()
+        job.save(force=True)
+        with _running_lock:
+            _running.pop(job.id, None)
+
+
+def start_job(kind, user, fn, total=0, bytes_total=0, **details):
+    """
+    Run fn(job) on the job pool and return the job record right away. fn reports
+    progress with job.advance() and should call job.check_cancelled() between
+    steps; its return value becomes the job's "result".
+    """
+    os.makedirs(JOB_DIR, exist_ok=True)
+    purge_finished_jobs()
+    record = {
+        "id": secrets.token_urlsafe(12),
+        "kind": kind,
+        "status": "queued",
+        "created_by": user.get("username"),
+        "created_at": format_utc_timestamp(),
+        "done": 0,
+        "total": total,
+        "bytes_done": 0,
+        "bytes_total": bytes_total,
+        "errors": [],
+        "error_count": 0,
+        **details,
+    }
+    job = Job(record)
+    job.save(force=True)
+    with _running_lock:
+        _running[job.id] = job
+    job_executor.submit(_run, job, fn)
+    return record
+
+
+def load_job(job_id, user):
+    if not job_id.replace("-", "").replace("_", "").isalnum():
+        raise HTTPException(status_code=404, detail="Job not found")
+    try:
+        with open(_job_file(job_id, "json")) as f:
+            record = json.load(f)
+    except (FileNotFoundError, ValueError):
+        raise HTTPException(status_code=404, detail="Job not found")
+    if record["created_by"] != user.get("username") and user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Job belongs to another user")
+    return record
+
+
+def list_jobs_service(user):
+    """Jobs of the user (all jobs for admins), newest first"""
+    purge_finished_jobs()
+    jobs = []
+    try:
+        names = os.listdir(JOB_DIR)
+    except FileNotFoundError:
+        return []
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(JOB_DIR, name)) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if record["created_by"] == user.get("username") or user.get("role") == "admin":
+            jobs.append(record)
+    jobs.sort(key=lambda r: r["created_at"], reverse=True)
+    return jobs
+
+
+def cancel_job_service(job_id, user):
+    """Ask a running job to stop; it finishes its current step first"""
+    record = load_job(job_id, user)
+    if record["status"] in FINISHED:
+        raise HTTPException(status_code=409, detail=f"Job already {record['status']}")
+    with open(_job_file(job_id, "cancel"), "w"):
+        pass
+    return {"status": "cancelling", "id": job_id}
+
+
+def purge_finished_jobs():
+    """Remove finished jobs older than JOB_TTL"""
+    cutoff = time.time() - JOB_TTL
+    try:
+        names = os.listdir(JOB_DIR)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        job_id = name[:-len(".json")]
+        if job_id in _running:
+            continue
+        try:
+            if os.path.getmtime(os.path.join(JOB_DIR, name)) < cutoff:
+                _remove_job_files(job_id)
+        except OSError:
+            continue
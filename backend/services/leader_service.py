@@ -0,0 +1,45 @@
+import os
+import time
+import threading
+from backend.utils.file_lock import try_exclusive_lock
+
+# Runtime state shared by all workers of one installation (locks, scan requests)
+STATE_DIR = os.getenv("STATE_DIR", os.path.join(os.path.dirname(__file__), "state"))
+LEADER_LOCK_FILE = os.path.join(STATE_DIR, "leader.lock")
+LEADER_POLL_SECONDS = float(os.getenv("LEADER_POLL_SECONDS", 5))
+
+_leader_fd = None
+_election_thread = None
+
+
+def is_leader() -> bool:
+    """True in the one worker that runs scans and background jobs"""
+    return _leader_fd is not None
+
+
+def _elect(on_elected):
+    global _leader_fd
+    while _leader_fd is None:
+        try:
+            _leader_fd = try_exclusive_lock(LEADER_LOCK_FILE)
+        except OSError as e:
+            print(f"Leader election failed: {e}")
+        if _leader_fd is None:
+            # Another worker leads; take over if it dies (the kernel drops its lock)
+            time.sleep(LEADER_POLL_SECONDS)
+    print(f"Worker {os.getpid()} is the scan leader")
+    on_elected()
+
+
+def start_leader_election(on_elected):
+    """
+    Compete for the leader lock in a background thread; the winning worker
+    calls on_elected() once. Followers keep polling and take over if the
+    leader process exits.
+    """
+    global _election_thread
+    if _election_thread is not None:
+        return _election_thread
+    _election_thread = threading.Thread(target=_elect, args=(on_elected,), daemon=True)
+    _election_thread.start()
+    return _election_thread
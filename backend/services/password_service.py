@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import ipaddress
+import asyncio
+import threading
+import contextvars
+import concurrent.futures
+from fastapi import HTTPException
+from backend.utils.metrics import Counter, Gauge
+from backend.utils.file_lock import FileLock, write_json_atomic
+from backend.services.leader_service import STATE_DIR
+
+# bcrypt runs only on these threads, so a burst of logins or share password
+# guesses can never occupy the I/O pool or Starlette's threadpool
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", 2))
+# Checks waiting or running at once; beyond that clients get an immediate 429
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", 16))
+# Failed attempts per client IP within the window, then 429
+PASSWORD_MAX_FAILURES = int(os.getenv("PASSWORD_MAX_FAILURES", 10))
+PASSWORD_FAILURE_WINDOW = int(os.getenv("PASSWORD_FAILURE_WINDOW", 300))
+# Reverse proxies (addresses or networks, comma-separated) whose X-Forwarded-For is believed
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(p.strip(), strict=False) for p in os.getenv("TRUSTED_PROXIES", "").split(",") if p.strip()
+]
+
+password_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=PASSWORD_WORKERS, thread_name_prefix="mntsrv-password"
+)
+_pending = 0
+_pending_lock = threading.Lock()
+
+PASSWORD_REJECTED = Counter(
+    "mntsrv_password_rejected_total", "Password checks answered with 429", labels=("reason",)
+)
+Gauge("mntsrv_password_pending", "Password checks queued or running", callback=lambda: _pending)
+
+
+def _acquire():
+    global _pending
+    with _pending_lock:
+        if _pending >= PASSWORD_MAX_PENDING:
+            PASSWORD_REJECTED.inc(reason="saturated")
+            raise HTTPException(status_code=429, detail="Too many password checks, try again later",
+                                headers={"Retry-After": "1"})
+        _pending += 1
+
+
+def _release(_future=None):
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+
+
+async def run_password(fn, *args, **kwargs):
+    """Run a bcrypt hash/verify on the password pool, or 429 if its queue is full"""
+    _acquire()
+    try:
+        future = password_executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+    except BaseException:
+        _release()
+        raise
+    # Released when bcrypt is done, not when the request is: a client that
+    # disconnects does not free the slot of a check that keeps running
+    future.add_done_callback(_release)
+    return await asyncio.wrap_future(future)
+
+
+def call_password(fn, *args, **kwargs):
+    """run_password for sync code: waits for the result on the calling thread"""
+    _acquire()
+    future = password_executor.submit(fn, *args, **kwargs)
+    future.add_done_callback(_release)
+    return future.result()
+
+
+class AttemptLimiter:
+    """
+    Counts failed attempts per key (usually the client IP) in a sliding
+    window. The counters live in a JSON file under a FileLock, so all uvicorn
+    workers share them and the limit does not grow with WORKERS.
+    """
+
+    def __init__(self, max_failures, window, path):
+        self.max_failures = max_failures
+        self.window = window
+        self.path = path
+        self._lock = FileLock(f"{path}.lock")
+
+    @staticmethod
+    def _key(key):
+        return ":".join(str(part) for part in key)
+
+    def _load(self, now):
+        try:
+            with open(self.path) as f:
+                failures = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # Drop attempts outside the window
+        recent = {}
+        for key, times in failures.items():
+            times = [t for t in times if t > now - self.window]
+            if times:
+                recent[key] = times
+        return recent
+
+    def check(self, *keys):
+        """Raise 429 if any key has used up its failed attempts"""
+        if not self.max_failures:
+            return
+        now = time.time()
+        with self._lock:
+            failures = self._load(now)
+        for key in keys:
+            times = failures.get(self._key(key), [])
+            if len(times) >= self.max_failures:
+                PASSWORD_REJECTED.inc(reason="attempts")
+                retry_after = int(times[0] + self.window - now) + 1
+                raise HTTPException(status_code=429, detail="Too many failed attempts, try again later",
+                                    headers={"Retry-After": str(retry_after)})
+
+    def failed(self, *keys):
+        if not self.max_failures:
+            return
+        now = time.time()
+        with self._lock:
+            failures = self._load(now)
+            for key in keys:
+                # Only the last max_failures attempts matter
+                failures[self._key(key)] = (failures.get(self._key(key), []) + [now])[-self.max_failures:]
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            write_json_atomic(self.path, failures, separators=(",", ":"))
+
+
+attempts = AttemptLimiter(PASSWORD_MAX_FAILURES, PASSWORD_FAILURE_WINDOW,
+                          os.path.join(STATE_DIR, "password_failures.json"))
+
+
+def _trusted_proxy(host):
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+
+def client_ip(request):
+    """Peer address, or behind TRUSTED_PROXIES the last X-Forwarded-For hop not added by one of them"""
+    host = request.client.host if request is not None and request.client else "unknown"
+    if not TRUSTED_PROXIES or not _trusted_proxy(host):
+        return host
+    # Proxies append to the right; everything left of the first untrusted hop may be forged
+    hops = [h.strip() for h in ",".join(request.headers.getlist("x-forwarded-for")).split(",") if h.strip()]
+    for hop in reversed(hops):
+        if not _trusted_proxy(hop):
+            return hop
+        host = hop
+    return host
@@ -4,16 +4,62 @@ import json
 import time
 import datetime
 import concurrent.futures
-from backend.services.dirscan_service import scan_folder, ensure_cache_dir
+from backend.services.dirscan_service import scan_folder, ensure_cache_dir, load_cache
+from backend.services.search_service import save_index, index_items, update_index, shard_key, INDEX_FILE, CompactIndex
+from backend.services.thumbnail_service import THUMB_PREGENERATE, schedule_pregenerate
+from backend.utils.path_utils import is_internal_name
+from backend.utils.metrics import Counter, Gauge
+from backend.utils.file_lock import write_json_atomic
+from backend.services.leader_service import STATE_DIR
+from backend.services.hash_service import HASHING_ENABLED, find_duplicates
+from backend.services.content_index_service import CONTENT_INDEX_ENABLED, update_content_index
+
+SCAN_DIRS = Counter("mntsrv_scan_dirs_total", "Directories cached by background scans")
+SCAN_ENTRIES = Counter("mntsrv_scan_entries_total", "Entries (files and folders) indexed by background scans")
+# Throughput of the running scan, or of the last one once it has finished
+_scan_progress = {"start": None, "end": None, "dirs": 0, "entries": 0, "pending": 0}
+
+def _scan_rates():
+    if _scan_progress["start"] is None:
+        return {("dirs",): 0, ("entries",): 0}
+    elapsed = max((_scan_progress["end"] or time.time()) - _scan_progress["start"], 1e-6)
+    return {
+        ("dirs",): _scan_progress["dirs"] / elapsed,
+        ("entries",): _scan_progress["entries"] / elapsed,
+    }
 
-SCAN_STATUS_FILE = os.path.join(os.path.dirname(__file__), "..", "scan_status.json")
+SCAN_RATE = Gauge("mntsrv_scan_rate_per_second", "Scan throughput", labels=("unit",), callback=_scan_rates)
+SCAN_QUEUE = Gauge(
+    "mntsrv_scan_queue_depth", "Top-level directories waiting to be scanned",
+    callback=lambda: _scan_progress["pending"],
+)
+SCAN_REQUESTS_QUEUED = Gauge(
+    "mntsrv_scan_requests_queued", "Scan requests waiting for the leader worker",
+    callback=lambda: len(_pending_scan_requests()),
+)
+
+SCAN_STATUS_FILE = os.getenv(
+    "SCAN_STATUS_FILE", os.path.join(os.path.dirname(__file__), "..", "scan_status.json")
+)
 lock = threading.RLock()
+# Scan-Aufträge aller Worker; abgearbeitet nur vom Leader (siehe run_scan_requests)
+SCAN_REQUEST_DIR = os.path.join(STATE_DIR, "scan-requests")
+SCAN_REQUEST_POLL_SECONDS = 1
+# Beim Start vorhandenen Cache/Index weiterverwenden und nur inkrementell prüfen
+WARM_START = os.getenv("WARM_START", "true").lower() in ("1", "true", "yes")
+# Fortschritt der Prüfung wird alle so viele Verzeichnisse gespeichert
+VERIFY_STATUS_INTERVAL = 500
+
+VERIFY_DIRS = Counter(
+    "mntsrv_verify_dirs_total", "Directories checked by the warm-start verification", labels=("result",)
+)
 
 def save_status(status):
     try:
         with lock:
-            with open(SCAN_STATUS_FILE, "w") as f:
-                json.dump(status, f)
+            # Atomar, da andere Worker den Status jederzeit lesen
+            os.makedirs(os.path.dirname(SCAN_STATUS_FILE), exist_ok=True)
+            write_json_atomic(SCAN_STATUS_FILE, status)
     except Exception as e:
         print("Fehler beim Schreiben von scan_status.json:", e)
 
@@ -24,6 +70,25 @@ def load_status():
         with open(SCAN_STATUS_FILE) as f:
             return json.load(f)
 
+_generation_cache = {"mtime": None, "generation": 0}
+
+def get_scan_generation():
+    """
+    Zähler, der mit jedem abgeschlossenen Scan steigt (fließt z. B. in ETags ein).
+    """
+    try:
+        mtime = os.stat(SCAN_STATUS_FILE).st_mtime_ns
+    except OSError:
+        return 0
+    if _generation_cache["mtime"] != mtime:
+        try:
+            status = load_status() or {}
+        except Exception:
+            return _generation_cache["generation"]
+        _generation_cache["mtime"] = mtime
+        _generation_cache["generation"] = status.get("generation", 0)
+    return _generation_cache["generation"]
+
 def count_folder_contents(folder_path):
     num_folders = 0
     num_files = 0
@@ -40,6 +105,8 @@ def walk_scandir(top):
     try:
         with os.scandir(top) as it:
             for entry in it:
+                if is_internal_name(entry.name):
+                    continue
                 if entry.is_dir(follow_symlinks=False):
                     dirs.append(entry.name)
                 else:
@@ -52,38 +119,39 @@ def walk_scandir(top):
         yield from walk_scandir(new_path)
 
 def scan_folder_with_progress(folder_path, progress_callback=None):
-    index_entries = []
+    with lock:
+        _scan_progress["pending"] = max(0, _scan_progress["pending"] - 1)
+    index_entries = CompactIndex()
     folders_scanned = 0
     files_scanned = 0
     try:
         for dirpath, dirs, files in walk_scandir(folder_path):
+            mtimes = {}
             try:
-                scan_folder(dirpath)
+                data = scan_folder(dirpath)
+                mtimes = {e["name"]: e["mtime"] for e in data.get("entries", ())}
+                if THUMB_PREGENERATE:
+                    schedule_pregenerate(dirpath)
             except Exception as e:
                 print(f"Error caching {dirpath}: {e}")
             # Count this directory as scanned
             folders_scanned += 1
+            SCAN_DIRS.inc()
+            SCAN_ENTRIES.inc(len(dirs) + len(files))
+            with lock:
+                _scan_progress["dirs"] += 1
+                _scan_progress["entries"] += len(dirs) + len(files)
             if progress_callback:
                 print(f"Progress: {folders_scanned} folders, {files_scanned} files (current: {dirpath})")
                 progress_callback(dirpath, folders_scanned, files_scanned)
             # Add directory entries
             for name in dirs:
-                full_path = os.path.join(dirpath, name)
-                index_entries.append({
-                    "name": name,
-                    "path": full_path,
-                    "is_dir": True
-                })
+                index_entries.add(dirpath, name, True, mtimes.get(name))
             for name in files:
-                full_path = os.path.join(dirpath, name)
-                index_entries.append({
-                    "name": name,
-                    "path": full_path,
-                    "is_dir": False
-                })
+                index_entries.add(dirpath, name, False, mtimes.get(name))
                 files_scanned += 1
                 if progress_callback:
-                    progress_callback(full_path, folders_scanned, files_scanned)
+                    progress_callback(os.path.join(dirpath, name), folders_scanned, files_scanned)
                 time.sleep(0.001)
     except Exception as e:
         print(f"Error scanning {folder_path}: {e}")
@@ -105,6 +173,8 @@ def background_scan(root):
     try:
         with os.scandir(root) as it:
             for entry in it:
+                if is_internal_name(entry.name):
+                    continue
                 if entry.is_dir(follow_symlinks=False):
                     top_level_dirs.append(entry.name)
                 else:
@@ -139,6 +209,7 @@ def background_scan(root):
     # Initialize status
     status = {
         "status": "scanning",
+        "generation": get_scan_generation(),
         "total_folders": total_folders,
         "total_files": total_files,
         "total_items": total_items,
@@ -157,16 +228,12 @@ def background_scan(root):
 
     # Step 2: Scan root files first
     print("Step 2: Scanning root files...")
-    root_index = []
+    root_index = CompactIndex()
     try:
         with os.scandir(root) as it:
             for entry in it:
-                if entry.is_file(follow_symlinks=False):
-                    root_index.append({
-                        "name": entry.name,
-                        "path": os.path.join(root, entry.name),
-                        "is_dir": False
-                    })
+                if entry.is_file(follow_symlinks=False) and not is_internal_name(entry.name):
+                    root_index.add(root, entry.name, False, entry.stat(follow_symlinks=False).st_mtime)
                     status["scanned_files"] += 1
                     status["scanned_items"] += 1
                     status["current_path"] = entry.name
@@ -178,12 +245,17 @@ def background_scan(root):
     # Create cache for root directory
     try:
         scan_folder(root)
+        if THUMB_PREGENERATE:
+            schedule_pregenerate(root)
     except Exception as e:
         print(f"Error caching root directory: {e}")
 
     # Step 3: Scan each top-level directory
     print("Step 3: Scanning directories...")
-    all_index_entries = root_index.copy()
+    all_index_entries = root_index
+    _scan_progress.update(
+        start=time.time(), end=None, dirs=0, entries=len(root_index), pending=len(top_level_dirs)
+    )
 
     # Use ThreadPoolExecutor for parallel scanning
     with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
@@ -243,23 +315,20 @@ def background_scan(root):
 
     # Step 4: Save search index
     print("Step 4: Saving search index...")
-    config_dir = os.path.join(os.path.dirname(__file__), "..", "config")
-    os.makedirs(config_dir, exist_ok=True)
-    index_file = os.path.join(config_dir, "search_index.json")
-
     try:
-        with open(index_file, "w") as f:
-            json.dump(all_index_entries, f)
+        save_index(all_index_entries, root)
         print(f"Search index saved with {len(all_index_entries)} entries")
     except Exception as e:
         print(f"Error saving search index: {e}")
 
     # Final status update
+    _scan_progress.update(end=time.time(), pending=0)
     end_time = datetime.datetime.now()
     duration = end_time - start_time
 
     status.update({
         "status": "completed",
+        "generation": status["generation"] + 1,
         "done": True,
         "end_time": end_time.isoformat(),
         "duration_seconds": duration.total_seconds(),
@@ -279,6 +348,165 @@ def start_background_scan(root):
     t.start()
     return t
 
+def _pending_scan_requests():
+    try:
+        return sorted(n for n in os.listdir(SCAN_REQUEST_DIR) if n.endswith(".json"))
+    except FileNotFoundError:
+        return []
+
+def request_scan(root, kind="scan"):
+    """
+    Reiht einen Scan (kind="scan"), eine Duplikatsuche (kind="hash") oder das
+    Aktualisieren des Volltextindex (kind="content") für den Leader-Worker ein (funktioniert aus jedem Worker). Scans laufen so nie
+    parallel auf denselben Status-/Indexdateien.
+    """
+    os.makedirs(SCAN_REQUEST_DIR, exist_ok=True)
+    name = f"{time.time_ns()}-{os.getpid()}-{threading.get_ident()}.json"
+    write_json_atomic(os.path.join(SCAN_REQUEST_DIR, name), {"path": root, "kind": kind})
+
+def take_scan_requests():
+    """Holt alle eingereihten Aufträge als (kind, path), ohne Duplikate, in Reihenfolge"""
+    roots = []
+    for name in _pending_scan_requests():
+        path = os.path.join(SCAN_REQUEST_DIR, name)
+        try:
+            with open(path) as f:
+                request = json.load(f)
+            root = (request.get("kind", "scan"), request["path"])
+            os.remove(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ungültiger Scan-Auftrag {name}: {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        if root not in roots:
+            roots.append(root)
+    return roots
+
+def run_scan_requests():
+    """Leader-Schleife: führt eingereihte Scans nacheinander aus"""
+    while True:
+        requests = take_scan_requests()
+        for kind, root in requests:
+            try:
+                if kind == "hash":
+                    find_duplicates(root)
+                elif kind == "content":
+                    update_content_index()
+                else:
+                    background_scan(root)
+                    if CONTENT_INDEX_ENABLED and ("content", root) not in requests:
+                        update_content_index()
+                    if HASHING_ENABLED and ("hash", root) not in requests:
+                        find_duplicates(root)
+            except Exception as e:
+                print(f"Error processing {kind} request for {root}: {e}")
+        time.sleep(SCAN_REQUEST_POLL_SECONDS)
+
+def can_warm_start():
+    """Es gibt einen abgeschlossenen Scan und einen Suchindex, von dem aus gestartet werden kann"""
+    try:
+        status = load_status()
+    except Exception:
+        return False
+    return bool(status and status.get("done")) and os.path.exists(INDEX_FILE)
+
+def _update_verify_status(**fields):
+    with lock:
+        try:
+            status = load_status() or {}
+        except Exception:
+            status = {}
+        status.setdefault("verify", {}).update(fields)
+        if fields.get("done") and fields.get("changed_dirs"):
+            # Listings/ETags, die auf dem alten Stand beruhen, ungültig machen
+            status["generation"] = status.get("generation", 0) + 1
+        save_status(status)
+
+def verify_tree(root):
+    """
+    Inkrementelle Prüfung nach einem Warmstart. Verzeichnisse, deren MTime zum
+    Listing-Cache passt, werden ohne scandir übernommen; nur geänderte werden neu
+    gescannt und ihre Einträge im Suchindex ersetzt. Bis dahin bedienen Cache und
+    Index weiter den letzten Stand.
+    Wie der Listing-Cache selbst erkennt das nur Änderungen, die die MTime des
+    Verzeichnisses ändern (Anlegen, Löschen, Umbenennen). Weicht die MTime eines
+    Eintrags im Listing vom Index ab, wird der Indexeintrag aktualisiert.
+    """
+    root = root.rstrip(os.sep) or os.sep
+    start = time.time()
+    print(f"Warm start: verifying {root} against the listing cache...")
+    try:
+        items = index_items()
+    except Exception:
+        items = ()
+    # Indexeinträge nach Elternverzeichnis
+    known = {}
+    for parent, name, is_dir, mtime in items:
+        known.setdefault(parent, {})[name] = (is_dir, mtime)
+
+    _update_verify_status(running=True, done=False, start_time=datetime.datetime.now().isoformat(),
+                          checked_dirs=0, changed_dirs=0)
+    # Änderungen werden pro Index-Shard gesammelt und einmal geschrieben. Die
+    # Tiefensuche arbeitet einen obersten Ordner komplett ab, bevor sie zum
+    # nächsten geht, die Ordner eines Shards kommen also am Stück.
+    add, remove = [], []
+    batch_key = None
+    checked = changed = 0
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        key = shard_key(folder)
+        if key != batch_key:
+            if add or remove:
+                update_index(add=add, remove_paths=remove)
+                add, remove = [], []
+            batch_key = key
+        data = load_cache(folder)
+        if data is None:
+            data = scan_folder(folder)
+            if "error" in data:
+                continue
+            changed += 1
+            VERIFY_DIRS.inc(result="changed")
+            if THUMB_PREGENERATE:
+                schedule_pregenerate(folder)
+            old = known.get(folder, {})
+            fresh = {e["name"]: e for e in data["entries"]}
+            for name, (is_dir, _mtime) in old.items():
+                if name not in fresh or fresh[name]["is_dir"] != is_dir:
+                    remove.append(os.path.join(folder, name))
+            for name, e in fresh.items():
+                # Neu, Typ geändert oder andere MTime: ein Add ersetzt den alten Eintrag
+                if old.get(name) != (e["is_dir"], int(e["mtime"] or 0)):
+                    add.append({"name": name, "path": os.path.join(folder, name), "is_dir": e["is_dir"],
+                                "mtime": e["mtime"]})
+        else:
+            VERIFY_DIRS.inc(result="unchanged")
+            # Der Ordner selbst ist unverändert, aber der Index kann älter sein als der Cache
+            old = known.get(folder, {})
+            for e in data["entries"]:
+                known_entry = old.get(e["name"])
+                if known_entry and known_entry[0] == e["is_dir"] and known_entry[1] != int(e["mtime"] or 0):
+                    add.append({"name": e["name"], "path": os.path.join(folder, e["name"]),
+                                "is_dir": e["is_dir"], "mtime": e["mtime"]})
+        checked += 1
+        known.pop(folder, None)
+        for entry in data["entries"]:
+            if entry["is_dir"]:
+                stack.append(os.path.join(folder, entry["name"]))
+        if checked % VERIFY_STATUS_INTERVAL == 0:
+            _update_verify_status(checked_dirs=checked, changed_dirs=changed)
+
+    if add or remove:
+        update_index(add=add, remove_paths=remove)
+    duration = time.time() - start
+    _update_verify_status(running=False, done=True, checked_dirs=checked, changed_dirs=changed,
+                          end_time=datetime.datetime.now().isoformat(), duration_seconds=duration)
+    print(f"Warm start verification done in {duration:.1f}s: {checked} folders checked, {changed} changed")
+
 def get_scan_status(SCAN_ROOT):
     status = load_status()
     if not status:
@@ -364,6 +592,7 @@ def get_scan_status(SCAN_ROOT):
         "end_time": status.get("end_time"),
         "duration_seconds": status.get("duration_seconds"),
         "folders": folders_with_progress,
+        "verify": status.get("verify"),
         "num_folders": status.get("total_folders", 0),
         "num_files": status.get("total_files", 0),
         "total": status.get("total_items", 0)
@@ -1,35 +1,691 @@
 import os
+import sys
 import json
+import time
+import heapq
+import bisect
+import hashlib
+import itertools
+import threading
+import collections
+import concurrent.futures
+from array import array
 from typing import List, Dict, Any
 
 from backend.services.dirscan_service import scan_or_cache
+from backend.utils.metrics import Counter, Gauge, Histogram
+from backend.utils.timing import phase
+from backend.utils.file_lock import FileLock, write_json_atomic
+from backend.utils.path_utils import SCAN_ROOT
+
+INDEX_FILE = os.getenv(
+    "SEARCH_INDEX_FILE", os.path.join(os.path.dirname(__file__), "..", "config", "search_index.json")
+)
+# INDEX_FILE ist das Manifest; die Einträge liegen in einem Shard je oberstem
+# Ordner unter SCAN_ROOT (Einträge direkt in SCAN_ROOT im Shard "")
+INDEX_SHARD_DIR = os.path.splitext(INDEX_FILE)[0] + ".shards"
+# Threads, auf denen eine Suche die Shards parallel durchgeht
+SEARCH_SHARD_WORKERS = int(os.getenv("SEARCH_SHARD_WORKERS", 4))
+# Auch über Worker-Prozesse hinweg, da update_index lesen-ändern-schreiben macht
+index_lock = FileLock(f"{INDEX_FILE}.lock")
+_index_cache = {"generation": None, "manifest": None}
+_shard_cache = {}
+_index_cache_lock = threading.Lock()
+shard_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=SEARCH_SHARD_WORKERS, thread_name_prefix="mntsrv-search"
+)
+
+SEARCH_SECONDS = Histogram("mntsrv_search_duration_seconds", "Duration of search_files", labels=("source",))
+INDEX_LOAD_SECONDS = Histogram("mntsrv_search_index_load_seconds", "Time to read and parse the search index")
+INDEX_ENTRIES = Gauge("mntsrv_search_index_entries", "Entries in the search index at last load/save")
+INDEX_BYTES = Gauge(
+    "mntsrv_search_index_bytes", "Size of the search index files (manifest and shards)",
+    callback=lambda: _index_bytes(),
+)
+
+# Vorschläge beim Tippen (suggest_files): bis zu so vielen Präfixtreffern wird
+# jeder bewertet, darüber die Rangfolge des ganzen Index durchlaufen
+SUGGEST_SCAN_LIMIT = int(os.getenv("SUGGEST_SCAN_LIMIT", 20000))
+# Abstand (Einträge) zwischen den Prüfungen, ob eine neuere Anfrage da ist
+SUGGEST_CHECK_EVERY = 4096
+# Gemerkte Pfadfilter (parent_ids unter root) je Index
+SUGGEST_SCOPE_CACHE = 64
+SUGGEST_SECONDS = Histogram("mntsrv_suggest_duration_seconds", "Duration of suggest_files", labels=("result",))
+_suggest_lock = threading.Lock()
+# Neueste Vorschlagsanfrage je Client; ältere, noch laufende brechen ab
+_suggest_latest = {}
+_suggest_latest_lock = threading.Lock()
+_suggest_seq = itertools.count()
+
+
+# Gemerkte Suchergebnisse (LRU), gültig bis sich die Indexgeneration ändert;
+# je Anfrage werden bis zu SEARCH_CACHE_CANDIDATES Treffer gemerkt, damit
+# längere Suchbegriffe darauf aufsetzen können
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", 128))
+SEARCH_CACHE_CANDIDATES = int(os.getenv("SEARCH_CACHE_CANDIDATES", 500))
+SEARCH_CACHE = Counter("mntsrv_search_cache_total", "Search result cache lookups", labels=("kind", "result"))
+
+
+class ResultCache:
+    """
+    LRU-Cache für Suchergebnisse. Alle Einträge gehören zu einer Generation
+    (des Suchindex bzw. Volltextindex); ändert sie sich, gilt der Cache als
+    leer. complete=True: die gemerkte Liste enthält alle Treffer.
+    """
+
+    def __init__(self, kind, max_entries):
+        self.kind = kind
+        self.max_entries = max_entries
+        self._generation = None
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, generation):
+        """(Ergebnisse, complete) oder None"""
+        with self._lock:
+            if generation != self._generation:
+                return None
+            item = self._entries.get(key)
+            if item is not None:
+                self._entries.move_to_end(key)
+            return item
+
+    def put(self, key, generation, results, complete=True):
+        if not self.max_entries or generation is None:
+            return
+        with self._lock:
+            if generation != self._generation:
+                self._entries.clear()
+                self._generation = generation
+            self._entries[key] = (results, complete)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+search_cache = ResultCache("name", SEARCH_CACHE_SIZE)
+Gauge("mntsrv_search_cache_entries", "Entries in the search result cache", callback=lambda: len(search_cache))
+
+
+class Superseded(Exception):
+    """Eine neuere Vorschlagsanfrage desselben Clients ist eingetroffen"""
+
+def _rank(length, is_dir, mtime):
+    # Rang als eine Zahl: Namenslänge, Datei-Bit, dann invertierte mtime
+    newest = (1 << 40) - 1
+    return ((min(length, 1023) * 2 + 1 - is_dir) << 40) | (newest - min(max(mtime, 0), newest))
+
+
+class CompactIndex:
+    """
+    Suchindex im Speicher, statt eines Dicts mit vollem Pfad pro Eintrag:
+    jeder Elternpfad einmal (parent_ids verweist darauf), Namen interned,
+    is_dir als Bytes, mtime als ganze Sekunden (0 = unbekannt). Die
+    kleingeschriebenen Namen liegen zusätzlich in einem einzigen String (durch
+    "\0" getrennt), so läuft die Teilstring-Suche per str.find in C. Dicts
+    entstehen erst für die Treffer (entry()).
+    Nach dem Laden wird der Index geteilt und nicht mehr verändert.
+    """
+    __slots__ = ("parents", "parent_ids", "names", "is_dir", "mtimes", "_parent_lookup", "_blob", "_starts",
+                 "_suggest", "_scopes")
+
+    def __init__(self):
+        self.parents = []
+        self.parent_ids = array("I")
+        self.names = []
+        self.is_dir = bytearray()
+        self.mtimes = array("q")
+        self._parent_lookup = {}
+        self._blob = None
+        self._starts = None
+        self._suggest = None
+        self._scopes = {}
+
+    def add(self, parent, name, is_dir, mtime=0):
+        pid = self._parent_lookup.get(parent)
+        if pid is None:
+            pid = self._parent_lookup[parent] = len(self.parents)
+            self.parents.append(sys.intern(parent))
+        self.parent_ids.append(pid)
+        self.names.append(sys.intern(name))
+        self.is_dir.append(1 if is_dir else 0)
+        self.mtimes.append(int(mtime or 0))
+        self._blob = None
+        self._suggest = None
+        self._scopes = {}
+
+    def append(self, entry):
+        """Eintrag im Dict-Format {"name", "path", "is_dir"}, optional mit "mtime" """
+        self.add(os.path.dirname(entry["path"]), entry["name"], entry["is_dir"], entry.get("mtime"))
+
+    def extend(self, other):
+        if isinstance(other, CompactIndex):
+            for parent, name, is_dir, mtime in other.items():
+                self.add(parent, name, is_dir, mtime)
+        else:
+            for entry in other:
+                self.append(entry)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return (self.entry(i) for i in range(len(self.names)))
+
+    def items(self):
+        """(Elternpfad, Name, is_dir, mtime) je Eintrag, ohne Dicts"""
+        parents, names, is_dir, mtimes = self.parents, self.names, self.is_dir, self.mtimes
+        for i, pid in enumerate(self.parent_ids):
+            yield parents[pid], names[i], bool(is_dir[i]), mtimes[i]
+
+    def path(self, i):
+        return os.path.join(self.parents[self.parent_ids[i]], self.names[i])
+
+    def entry(self, i):
+        return {"name": self.names[i], "path": self.path(i), "is_dir": bool(self.is_dir[i])}
+
+    def _search_blob(self):
+        if self._blob is None:
+            starts = array("Q")
+            pos = 0
+            lowered = []
+            for name in self.names:
+                low = name.lower()
+                starts.append(pos)
+                lowered.append(low)
+                pos += len(low) + 1
+            self._blob = "\0".join(lowered)
+            self._starts = starts
+        return self._blob, self._starts
+
+    def find(self, query_lower, root=""):
+        """Indizes der Einträge unter root, deren Name query_lower enthält, in Indexreihenfolge"""
+        blob, starts = self._search_blob()
+        pos = blob.find(query_lower)
+        while pos != -1:
+            i = bisect.bisect_right(starts, pos) - 1
+            if not root or self.path(i).startswith(root):
+                yield i
+            if i + 1 >= len(starts):
+                break
+            pos = blob.find(query_lower, starts[i + 1])
+
+    def _suggest_orders(self):
+        """
+        Für suggest(): Einträge nach kleingeschriebenem Namen sortiert (Präfixe
+        per bisect) und nach Rang (kürzere Namen, Ordner zuerst, neuere zuerst,
+        dann Name). Wird beim ersten Aufruf je Indexgeneration gebaut.
+        """
+        with _suggest_lock:
+            if self._suggest is None:
+                names = self.names
+                lowered = [name.lower() for name in names]
+                by_name = array("I", sorted(range(len(names)), key=lowered.__getitem__))
+                del lowered
+                ranks = list(map(_rank, map(len, names), self.is_dir, self.mtimes))
+                # sorted ist stabil: bei gleichem Rang bleibt die Namensreihenfolge
+                by_rank = array("I", sorted(by_name, key=ranks.__getitem__))
+                del ranks
+                rank_of = array("I", bytes(4 * len(names)))
+                for rank, i in enumerate(by_rank):
+                    rank_of[i] = rank
+                self._suggest = (by_name, by_rank, rank_of)
+            return self._suggest
+
+    def rank_key(self, i):
+        """Sortierschlüssel von suggest(), vergleichbar über mehrere Indizes (Shards)"""
+        return _rank(len(self.names[i]), self.is_dir[i], self.mtimes[i]), self.names[i].lower()
+
+    def _scope(self, root):
+        """
+        Pfadfilter für root: [parent_ids darunter, Einträge darunter in
+        Rangfolge (erst bei Bedarf)], je root gemerkt. None = kein Filter.
+        """
+        if not root:
+            return None
+        root = root.rstrip(os.sep) or os.sep
+        scope = self._scopes.get(root)
+        if scope is None:
+            prefix = root if root.endswith(os.sep) else root + os.sep
+            pids = frozenset(pid for pid, parent in enumerate(self.parents)
+                             if parent == root or parent.startswith(prefix))
+            if len(self._scopes) >= SUGGEST_SCOPE_CACHE:
+                self._scopes.clear()
+            scope = self._scopes[root] = [pids, None]
+        return scope
+
+    def suggest(self, prefix_lower, root="", limit=10, should_stop=None):
+        """
+        Indizes der bestplatzierten Einträge unter root, deren Name mit
+        prefix_lower beginnt. Bei wenigen Treffern wird der Namensbereich
+        bewertet, bei vielen die Rangfolge durchlaufen, bis limit Treffer da sind.
+        should_stop() wird zwischendurch gefragt und bricht mit Superseded ab.
+        """
+        by_name, by_rank, rank_of = self._suggest_orders()
+        names, parent_ids = self.names, self.parent_ids
+        scope = self._scope(root)
+        key = lambda i: names[i].lower()
+        lo = bisect.bisect_left(by_name, prefix_lower, key=key)
+        hi = bisect.bisect_left(by_name, prefix_lower + "\U0010ffff", lo, key=key)
+        if hi - lo > SUGGEST_SCAN_LIMIT:
+            # Häufiges Präfix: Treffer sind dicht, die Rangfolge liefert sie schnell
+            ranked = by_rank
+            if scope is not None:
+                if scope[1] is None:
+                    pids = scope[0]
+                    scope[1] = array("I", [i for i in by_rank if parent_ids[i] in pids])
+                ranked = scope[1]
+            found = []
+            for n, i in enumerate(ranked):
+                if n % SUGGEST_CHECK_EVERY == 0 and should_stop and should_stop():
+                    raise Superseded()
+                if names[i].lower().startswith(prefix_lower):
+                    found.append(i)
+                    if len(found) >= limit:
+                        break
+            return found
+        best = []
+        for start in range(lo, hi, SUGGEST_CHECK_EVERY):
+            if should_stop and should_stop():
+                raise Superseded()
+            chunk = by_name[start:min(hi, start + SUGGEST_CHECK_EVERY)]
+            if scope is not None:
+                pids = scope[0]
+                chunk = [i for i in chunk if parent_ids[i] in pids]
+            best = heapq.nsmallest(limit, itertools.chain(best, chunk), key=rank_of.__getitem__)
+        return best
+
+    def to_json(self):
+        return {
+            "format": 2,
+            "parents": self.parents,
+            "parent_ids": self.parent_ids.tolist(),
+            "names": self.names,
+            "is_dir": list(self.is_dir),
+            "mtimes": self.mtimes.tolist(),
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        index = cls()
+        if isinstance(data, list):
+            # Indexdateien älterer Versionen: Liste von Dicts
+            index.extend(data)
+            return index
+        index.parents = [sys.intern(p) for p in data["parents"]]
+        index._parent_lookup = {p: i for i, p in enumerate(index.parents)}
+        index.parent_ids = array("I", data["parent_ids"])
+        index.names = [sys.intern(n) for n in data["names"]]
+        index.is_dir = bytearray(data["is_dir"])
+        index.mtimes = array("q", data.get("mtimes") or bytes(8 * len(index.names)))
+        return index
+
+def _index_bytes():
+    total = os.path.getsize(INDEX_FILE) if os.path.exists(INDEX_FILE) else 0
+    try:
+        with os.scandir(INDEX_SHARD_DIR) as it:
+            total += sum(entry.stat().st_size for entry in it if entry.name.endswith(".json"))
+    except FileNotFoundError:
+        pass
+    return total
+
+def index_generation():
+    """
+    Identität der Manifest-Datei (INDEX_FILE). Jedes Schreiben eines Shards
+    ersetzt auch das Manifest per rename, daher ändert sich die Generation bei
+    jeder Änderung am Index - auch durch andere Worker.
+    """
+    return _file_generation(INDEX_FILE)
+
+def _file_generation(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def shard_key(parent: str) -> str:
+    """Shard eines Eintrags: oberster Ordner seines Elternpfads unter SCAN_ROOT, "" direkt in SCAN_ROOT"""
+    rel = os.path.relpath(parent, SCAN_ROOT)
+    if rel == "." or rel == ".." or rel.startswith(".." + os.sep):
+        return ""
+    return rel.split(os.sep, 1)[0]
+
+def _shard_file(key):
+    digest = hashlib.sha1(key.encode("utf-8", "surrogateescape")).hexdigest()[:20]
+    return os.path.join(INDEX_SHARD_DIR, f"{digest}.json")
+
+def _partition(index: CompactIndex) -> Dict[str, CompactIndex]:
+    keys = [shard_key(parent) for parent in index.parents]
+    shards = {}
+    for i, pid in enumerate(index.parent_ids):
+        shard = shards.get(keys[pid])
+        if shard is None:
+            shard = shards[keys[pid]] = CompactIndex()
+        shard.add(index.parents[pid], index.names[i], index.is_dir[i], index.mtimes[i])
+    return shards
+
+def load_manifest() -> Dict[str, Any]:
+    """
+    Manifest des Suchindex: {"shards": {Schlüssel: {"file", "entries"}}}.
+    Eine Indexdatei im alten Format (ein Index für alles) wird dabei einmalig
+    in Shards aufgeteilt.
+    """
+    generation = index_generation()
+    if generation is None:
+        raise FileNotFoundError(INDEX_FILE)
+    with _index_cache_lock:
+        if _index_cache["generation"] == generation:
+            return _index_cache["manifest"]
+    with open(INDEX_FILE) as f:
+        manifest = json.load(f)
+    if not isinstance(manifest, dict) or manifest.get("format") != 3:
+        with index_lock:
+            _write_shards(_partition(CompactIndex.from_json(manifest)), replace_all=True)
+        return load_manifest()
+    INDEX_ENTRIES.set(sum(shard["entries"] for shard in manifest["shards"].values()))
+    with _index_cache_lock:
+        _index_cache.update(generation=generation, manifest=manifest)
+    return manifest
+
+def load_shard(key: str) -> CompactIndex:
+    """
+    Ein Shard des Suchindex, neu geladen nur wenn sich seine Datei geändert hat
+    (leer, wenn es ihn nicht gibt). Wird geteilt und darf nicht verändert werden.
+    """
+    path = _shard_file(key)
+    generation = _file_generation(path)
+    if generation is None:
+        return CompactIndex()
+    with _index_cache_lock:
+        cached = _shard_cache.get(key)
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+    start = time.perf_counter()
+    try:
+        with phase("index_load"), open(path) as f:
+            st = os.fstat(f.fileno())
+            generation = (st.st_ino, st.st_mtime_ns, st.st_size)
+            index = CompactIndex.from_json(json.load(f))
+    except FileNotFoundError:
+        return CompactIndex()
+    INDEX_LOAD_SECONDS.observe(time.perf_counter() - start)
+    with _index_cache_lock:
+        _shard_cache[key] = (generation, index)
+    return index
+
+def _shard_order(keys):
+    return sorted(keys, key=lambda key: (key != "", key))
+
+def shards_for(root: str = None) -> List[str]:
+    """Schlüssel der Shards, die Einträge unter root enthalten können (alle für SCAN_ROOT)"""
+    keys = load_manifest()["shards"]
+    if root:
+        rel = os.path.relpath(os.path.normpath(root), SCAN_ROOT)
+        if rel != ".":
+            top = rel.split(os.sep, 1)[0]
+            return [top] if top in keys else []
+    return _shard_order(keys)
+
+def _shard_scope(root):
+    # Pfadfilter innerhalb der Shards; für SCAN_ROOT und oberste Ordner überflüssig
+    if not root:
+        return ""
+    rel = os.path.relpath(os.path.normpath(root), SCAN_ROOT)
+    return "" if rel == "." or os.sep not in rel else root
+
+def index_items():
+    """(Elternpfad, Name, is_dir, mtime) aller Einträge, Shard für Shard"""
+    keys = shards_for()
+    return (item for key in keys for item in load_shard(key).items())
+
+def _write_shards(shards: Dict[str, CompactIndex], replace_all: bool = False):
+    """Schreibt die übergebenen Shards (leere werden entfernt) und dann das Manifest; unter index_lock"""
+    with index_lock:
+        os.makedirs(INDEX_SHARD_DIR, exist_ok=True)
+        manifest = {"format": 3, "root": SCAN_ROOT, "shards": {}}
+        if not replace_all:
+            try:
+                manifest = load_manifest()
+            except (OSError, ValueError):
+                pass
+        entries = dict(manifest["shards"])
+        if replace_all:
+            for key in entries:
+                if key not in shards:
+                    _remove_file(_shard_file(key))
+            entries = {}
+        for key, index in shards.items():
+            if len(index):
+                write_json_atomic(_shard_file(key), index.to_json(), separators=(",", ":"))
+                entries[key] = {"file": os.path.basename(_shard_file(key)), "entries": len(index)}
+            elif key in entries or replace_all:
+                _remove_file(_shard_file(key))
+                entries.pop(key, None)
+        manifest = {"format": 3, "root": SCAN_ROOT, "shards": entries}
+        write_json_atomic(INDEX_FILE, manifest, separators=(",", ":"))
+    INDEX_ENTRIES.set(sum(shard["entries"] for shard in entries.values()))
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def save_index(index, root: str = None):
+    """
+    Schreibt den Suchindex nach einem Scan von root (Standard SCAN_ROOT). index
+    ist ein CompactIndex oder eine Liste von Einträgen {"name", "path", "is_dir"}.
+    Für SCAN_ROOT werden alle Shards neu geschrieben, für einen Unterordner nur
+    dessen Einträge in seinem Shard ersetzt.
+    """
+    if not isinstance(index, CompactIndex):
+        compact = CompactIndex()
+        compact.extend(index)
+        index = compact
+    os.makedirs(os.path.dirname(INDEX_FILE), exist_ok=True)
+    shards = _partition(index)
+    root = os.path.normpath(root or SCAN_ROOT)
+    if root == os.path.normpath(SCAN_ROOT) or not os.path.exists(INDEX_FILE):
+        _write_shards(shards, replace_all=True)
+        return
+    key = shard_key(root)
+    prefix = root + os.sep
+    with index_lock:
+        merged = CompactIndex()
+        for parent, name, is_dir, mtime in load_shard(key).items():
+            if parent != root and not parent.startswith(prefix):
+                merged.add(parent, name, is_dir, mtime)
+        merged.extend(shards.pop(key, ()))
+        shards[key] = merged
+        _write_shards(shards)
+
+def _apply_steps(path, steps):
+    """Pfad eines Eintrags nach den Schritten (in Reihenfolge), None wenn entfernt oder ersetzt"""
+    for step in steps:
+        kind = step[0]
+        if kind == "add":
+            if path in step[2]:
+                return None
+        elif kind == "remove":
+            if path == step[1] or path.startswith(step[1] + os.sep):
+                return None
+        elif path == step[1]:
+            path = step[2]
+        elif path.startswith(step[1] + os.sep):
+            path = step[2] + path[len(step[1]):]
+    return path
+
+def update_index(add=(), remove_paths=(), moves=(), steps=None):
+    """
+    Ergänzt/entfernt einzelne Einträge im Suchindex, ohne neu zu scannen.
+    Ein Pfad in remove_paths entfernt auch alle Einträge darunter, ein Paar
+    (alt, neu) in moves verschiebt einen Eintrag samt allem darunter.
+    steps: stattdessen geordnete Schritte ("remove", Pfad), ("move", alt, neu),
+    ("add", [Einträge]), die nacheinander gelten - auch für Einträge aus
+    früheren Schritten. Ohne steps: erst remove_paths, dann moves, dann add.
+    Neu geschrieben werden nur die betroffenen Shards.
+    """
+    if not os.path.exists(INDEX_FILE):
+        return
+    if steps is None:
+        steps = [("remove", p) for p in remove_paths]
+        steps += [("move", old, new) for old, new in moves]
+        if add:
+            steps.append(("add", list(add)))
+    if not steps:
+        return
+    # Normalisiert; "add" bekommt zusätzlich die Menge seiner Pfade (ersetzt vorhandene Einträge)
+    ops = []
+    for step in steps:
+        if step[0] == "add":
+            ops.append(("add", step[1], {e["path"] for e in step[1]}))
+        elif step[0] == "remove":
+            ops.append(("remove", step[1].rstrip(os.sep)))
+        else:
+            ops.append(("move", step[1].rstrip(os.sep), step[2].rstrip(os.sep)))
+    # Nur Einträge an oder unter diesen Pfaden können sich ändern
+    touched = set()
+    for op in ops:
+        touched.update(op[2] if op[0] == "add" else op[1:])
+    prefixes = tuple(p + os.sep for p in touched)
+    # Ein Pfad betrifft den Shard seines Eintrags und den der Einträge darunter
+    affected = {shard_key(os.path.dirname(p)) for p in touched} | {shard_key(p) for p in touched}
+
+    with index_lock:
+        try:
+            known = load_manifest()["shards"]
+        except Exception as e:
+            print("Fehler beim Lesen von search_index.json:", e)
+            return
+        updated = {key: CompactIndex() for key in affected}
+        keys_by_parent = {}
+
+        def place(parent, name, is_dir, mtime, path, remaining):
+            new_path = _apply_steps(path, remaining)
+            if new_path is None:
+                return
+            if new_path != path:
+                parent, name = os.path.dirname(new_path), os.path.basename(new_path)
+            key = keys_by_parent.get(parent)
+            if key is None:
+                key = keys_by_parent[parent] = shard_key(parent)
+            updated[key].add(parent, name, is_dir, mtime)
+
+        for key in affected & set(known):
+            for parent, name, is_dir, mtime in load_shard(key).items():
+                path = os.path.join(parent, name)
+                if path in touched or path.startswith(prefixes):
+                    place(parent, name, is_dir, mtime, path, ops)
+                else:
+                    updated[key].add(parent, name, is_dir, mtime)
+        for i, op in enumerate(ops):
+            if op[0] != "add":
+                continue
+            for entry in op[1]:
+                path = entry["path"]
+                place(os.path.dirname(path), entry["name"], entry["is_dir"], entry.get("mtime"), path, ops[i + 1:])
+        _write_shards(updated)
+
+def register_suggest(client: str) -> int:
+    """
+    Meldet eine Vorschlagsanfrage von client an und liefert ihre Nummer; ab
+    jetzt gelten ältere Anfragen dieses Clients als überholt.
+    """
+    with _suggest_latest_lock:
+        seq = next(_suggest_seq)
+        _suggest_latest[client] = seq
+    return seq
+
+def suggest_files(root: str, prefix: str, limit: int = 10, client: str = None, seq: int = None) -> List[Dict[str, Any]]:
+    """
+    Einträge unter root, deren Name mit prefix beginnt, die besten zuerst
+    (kürzere Namen, Ordner, zuletzt geändert). Braucht den Suchindex.
+    Mit client/seq aus register_suggest wird abgebrochen (Superseded), sobald
+    derselbe Client eine neuere Anfrage gestellt hat.
+    """
+    start = time.perf_counter()
+    should_stop = None
+    if client is not None:
+        should_stop = lambda: _suggest_latest.get(client) != seq
+    try:
+        if should_stop and should_stop():
+            raise Superseded()
+        prefix_lower, scope = prefix.lower(), _shard_scope(root)
+
+        def suggest_shard(key):
+            index = load_shard(key)
+            return [(index.rank_key(i), index, i) for i in index.suggest(prefix_lower, scope, limit, should_stop)]
+
+        # Je Shard die besten limit, dann über alle Shards zusammengeführt
+        candidates = itertools.chain.from_iterable(shard_executor.map(suggest_shard, shards_for(root)))
+        best = heapq.nsmallest(limit, candidates, key=lambda c: c[0])
+        results = [index.entry(i) for _, index, i in best]
+    except Superseded:
+        SUGGEST_SECONDS.observe(time.perf_counter() - start, result="superseded")
+        raise
+    finally:
+        if client is not None:
+            with _suggest_latest_lock:
+                if _suggest_latest.get(client) == seq:
+                    del _suggest_latest[client]
+    SUGGEST_SECONDS.observe(time.perf_counter() - start, result="ok")
+    return results
+
+def _index_search(root, query_lower, max_results):
+    scope = _shard_scope(root)
+
+    def search_shard(key):
+        index = load_shard(key)
+        return [index.entry(i) for i in itertools.islice(index.find(query_lower, scope), max_results)]
+
+    results = []
+    for hits in shard_executor.map(search_shard, shards_for(root)):
+        results.extend(hits[:max_results - len(results)])
+    return results
+
+def _cached_search(root, query_lower, max_results):
+    """
+    _index_search über search_cache. Ohne eigenen Eintrag dient das vollständige
+    Ergebnis des längsten gemerkten Präfixes als Kandidatenmenge: wer "invoice"
+    enthält, enthält auch "inv".
+    """
+    generation = index_generation()
+    cached = search_cache.get((query_lower, root), generation)
+    if cached is not None and (cached[1] or len(cached[0]) >= max_results):
+        SEARCH_CACHE.inc(kind="name", result="hit")
+        return cached[0][:max_results]
+    for length in range(len(query_lower) - 1, 0, -1):
+        base = search_cache.get((query_lower[:length], root), generation)
+        if base is not None and base[1]:
+            SEARCH_CACHE.inc(kind="name", result="prefix")
+            results = [e for e in base[0] if query_lower in e["name"].lower()]
+            search_cache.put((query_lower, root), generation, results)
+            return results[:max_results]
+    SEARCH_CACHE.inc(kind="name", result="miss")
+    limit = max(max_results, SEARCH_CACHE_CANDIDATES)
+    results = _index_search(root, query_lower, limit)
+    search_cache.put((query_lower, root), generation, results, complete=len(results) < limit)
+    return results[:max_results]
 
 def search_files(root: str, query: str, max_results: int = 100) -> List[Dict[str, Any]]:
     """
     Durchsucht rekursiv ab root alle Ordner/Dateien nach query im Namen.
-    Nutzt zentrale Indexdatei, falls vorhanden, sonst Cache.
+    Nutzt den Suchindex, falls vorhanden, sonst Cache. Gesucht wird nur in
+    den Shards unter root, bei mehreren parallel; Treffer in Shard-Reihenfolge.
+    Ergebnisse werden in search_cache gemerkt.
     """
-    config_dir = os.path.join(os.path.dirname(__file__), "config")
-    index_file = os.path.join(config_dir, "search_index.json")
+    start = time.perf_counter()
     query_lower = query.lower()
     results = []
 
-    if os.path.exists(index_file):
+    if os.path.exists(INDEX_FILE):
         try:
-            with open(index_file) as f:
-                index = json.load(f)
-            for entry in index:
-                # Optional: root-Filter (nur Treffer unterhalb root)
-                if not entry["path"].startswith(root):
-                    continue
-                if query_lower in entry["name"].lower():
-                    results.append({
-                        "name": entry["name"],
-                        "path": entry["path"],
-                        "is_dir": entry["is_dir"],
-                    })
-                    if len(results) >= max_results:
-                        break
+            results = _cached_search(root, query_lower, max_results)
+            SEARCH_SECONDS.observe(time.perf_counter() - start, source="index")
             return results
         except Exception as e:
             print("Fehler beim Lesen von search_index.json:", e)
@@ -58,4 +714,5 @@ def search_files(root: str, query: str, max_results: int = 100) -> List[Dict[str
                     break
             if entry["is_dir"]:
                 stack.append(entry_path)
+    SEARCH_SECONDS.observe(time.perf_counter() - start, source="fallback")
     return results
@@ -4,11 +4,20 @@ import secrets
 from datetime import datetime, timedelta, timezone
 from fastapi import HTTPException
 from fastapi.responses import StreamingResponse
-from backend.services.auth_service import pwd_context
-from backend.utils.path_utils import SCAN_ROOT, is_safe_path
-from backend.services.dirscan_service import scan_or_cache
+from backend.services.auth_service import pwd_context, PASSWORD_CHECK_SECONDS
+from backend.utils.timing import phase
+from backend.utils.file_lock import FileLock, write_json_atomic
+from backend.services.leader_service import STATE_DIR
+from backend.utils.path_utils import SCAN_ROOT, is_public_path
+from backend.services.dirscan_service import read_listing, encode_cursor, decode_cursor
+from backend.services.archive_service import zip_response, archive_response
+from backend.services.thumbnail_service import thumbnail_response
+from backend.services.scan_service import get_scan_generation
+from backend.utils.http_utils import make_etag, conditional_json, compact_rows, LISTING_COLUMNS
 from backend.utils.datetime_utils import format_utc_timestamp
-import os
+from backend.utils.executors import run_io, aiter_file
+from backend.services.password_service import run_password, call_password, attempts, client_ip
+from backend.services.bandwidth_service import shaped
 
 SHARE_FILE = os.path.join(os.path.dirname(__file__), "..", "config", "share.json")
 
@@ -19,13 +28,56 @@ def load_shares():
     except Exception:
         return []
 
+# Serialises load-modify-save of share.json across threads and workers
+shares_lock = FileLock(os.path.join(STATE_DIR, "shares.lock"))
+
 def save_shares(shares):
-    with open(SHARE_FILE, "w") as f:
-        json.dump(shares, f)
+    write_json_atomic(SHARE_FILE, shares)
 
 def create_share_token():
     return secrets.token_urlsafe(16)
 
+def find_share(token):
+    """Look up a share and check its expiry, raising HTTPException otherwise"""
+    with phase("share_lookup"):
+        shares = load_shares()
+    share = next((s for s in shares if s["token"] == token), None)
+    if not share:
+        raise HTTPException(status_code=404, detail="Share not found")
+    if datetime.now(timezone.utc) > datetime.fromisoformat(share["expires_at"]):
+        raise HTTPException(status_code=403, detail="Share expired")
+    return share
+
+def check_share_password(share, password):
+    """bcrypt check of the share password - CPU-bound, run it on the password pool"""
+    if share["password_hash"]:
+        valid = False
+        try:
+            if password:
+                with PASSWORD_CHECK_SECONDS.time(kind="share"), phase("bcrypt"):
+                    valid = pwd_context.verify(password, share["password_hash"])
+        except Exception:
+            pass
+        if not valid:
+            raise HTTPException(status_code=401, detail="Password required or incorrect")
+
+async def authorize_share(token, password, request=None):
+    """
+    Share lookup on the I/O pool, password check on the password pool. Failed
+    passwords count against the client IP (429 when used up).
+    """
+    share = await run_io(find_share, token)
+    if share["password_hash"]:
+        keys = (("ip", client_ip(request)),)
+        attempts.check(*keys)
+        try:
+            await run_password(check_share_password, share, password)
+        except HTTPException as e:
+            if e.status_code == 401:
+                attempts.failed(*keys)
+            raise
+    return share
+
 def list_shares_service(user):
     shares = load_shares()
     
@@ -41,22 +93,23 @@ def list_shares_service(user):
             "path": s["path"],
             "expires_at": s["expires_at"],
             "created_by": s.get("created_by", "unknown"),
+            "bandwidth_limit": s.get("bandwidth_limit"),
         }
         for s in filtered_shares
     ]
 
-def create_share_service(path, password, expires_in, user):
+def create_share_service(path, password, expires_in, user, bandwidth_limit=None):
     abs_path = os.path.join(SCAN_ROOT, path.lstrip("/"))
     print(f"[DEBUG] create_share_service: path={path}, abs_path={abs_path}")
     if not os.path.exists(abs_path):
         raise HTTPException(status_code=404, detail="Path not found")
-    if not is_safe_path(SCAN_ROOT, abs_path):
+    if not is_public_path(SCAN_ROOT, abs_path):
         raise HTTPException(status_code=403, detail="Pfad nicht erlaubt")
     token = create_share_token()
     expires_at = (datetime.now(timezone.utc) + timedelta(seconds=expires_in)).replace(microsecond=0).isoformat().replace("+00:00", "Z")
     password_hash = None
     if password:
-        password_hash = pwd_context.hash(password)
+        password_hash = call_password(pwd_context.hash, password)
     share = {
         "token": token,
         "path": path,
@@ -65,56 +118,75 @@ def create_share_service(path, password, expires_in, user):
         "password_plain": password if password else None,
         "created_by": user.get("username"),
         "created_at": format_utc_timestamp(),
+        # Bytes per second for all downloads of this share together, None = unlimited
+        "bandwidth_limit": bandwidth_limit or None,
     }
-    shares = load_shares()
-    shares.append(share)
-    save_shares(shares)
+    with shares_lock:
+        shares = load_shares()
+        shares.append(share)
+        save_shares(shares)
     return {"share_url": f"/api/share/{token}", "token": token, "expires_at": expires_at}
 
 def delete_share_service(token, user):
-    shares = load_shares()
-    share_to_delete = next((s for s in shares if s["token"] == token), None)
-    
-    if not share_to_delete:
-        raise HTTPException(status_code=404, detail="Share not found")
-    
-    # Check if user can delete this share
-    if user.get("role") != "admin" and share_to_delete.get("created_by") != user.get("username"):
-        raise HTTPException(status_code=403, detail="You can only delete your own shares")
-    
-    new_shares = [s for s in shares if s["token"] != token]
-    save_shares(new_shares)
+    with shares_lock:
+        shares = load_shares()
+        share_to_delete = next((s for s in shares if s["token"] == token), None)
+
+        if not share_to_delete:
+            raise HTTPException(status_code=404, detail="Share not found")
+
+        # Check if user can delete this share
+        if user.get("role") != "admin" and share_to_delete.get("created_by") != user.get("username"):
+            raise HTTPException(status_code=403, detail="You can only delete your own shares")
+
+        new_shares = [s for s in shares if s["token"] != token]
+        save_shares(new_shares)
     return {"status": "deleted", "token": token}
 
-def access_share_service(token, password):
-    shares = load_shares()
-    share = next((s for s in shares if s["token"] == token), None)
-    if not share:
-        raise HTTPException(status_code=404, detail="Share not found")
-    if datetime.now(timezone.utc) > datetime.fromisoformat(share["expires_at"]):
-        raise HTTPException(status_code=403, detail="Share expired")
-    if share["password_hash"]:
-        valid = False
-        try:
-            valid = pwd_context.verify(password, share["password_hash"])
-        except Exception:
-            pass
-        if not password or not valid:
-            raise HTTPException(status_code=401, detail="Password required or incorrect")
+def _share_listing(abs_path, cursor=None, limit=None):
+    """
+    Entries of a shared folder, all of them by default or one page of limit
+    entries after cursor. Returns the listing fields (entries, total, next_cursor).
+    """
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    header, entries, start = read_listing(abs_path, 0, limit, after)
+    if "error" in header:
+        raise HTTPException(status_code=400, detail=header["error"])
+    has_more = start + len(entries) < header["count"]
+    return {
+        "entries": entries,
+        "total": header["count"],
+        "next_cursor": encode_cursor(entries[-1]) if has_more and entries else None,
+    }
+
+def access_share_service(share, request=None, format=None, cursor=None, limit=None):
+    """Listing of a shared folder (or metadata of a shared file) for an authorized share"""
+    token = share["token"]
     abs_path = os.path.join(SCAN_ROOT, share["path"].lstrip("/"))
-    if not is_safe_path(SCAN_ROOT, abs_path):
+    if not is_public_path(SCAN_ROOT, abs_path):
         raise HTTPException(status_code=403, detail="Pfad nicht erlaubt")
     if os.path.isdir(abs_path):
-        data = scan_or_cache(abs_path)
-        if "error" in data:
-            raise HTTPException(status_code=400, detail=data["error"])
-        return {
-            "type": "folder",
-            "path": share["path"],
-            "entries": data["entries"],
-            "token": token,
-            "password_required": bool(share["password_hash"]),
-        }
+        etag = make_etag(
+            "share", token, share["path"], bool(share["password_hash"]),
+            os.stat(abs_path).st_mtime, cursor, limit, format, get_scan_generation(),
+        )
+
+        def build():
+            listing = {
+                "type": "folder",
+                "path": share["path"],
+                **_share_listing(abs_path, cursor, limit),
+                "token": token,
+                "password_required": bool(share["password_hash"]),
+            }
+            if format == "compact":
+                return compact_rows(listing, "entries", LISTING_COLUMNS)
+            return listing
+
+        return conditional_json(request, etag, build)
     elif os.path.isfile(abs_path):
         return {
             "type": "file",
@@ -125,24 +197,14 @@ def access_share_service(token, password):
     else:
         raise HTTPException(status_code=404, detail="Path not found")
 
-def download_share_service(token, password, file, request):
-    shares = load_shares()
-    share = next((s for s in shares if s["token"] == token), None)
-    if not share:
-        raise HTTPException(status_code=404, detail="Share not found")
-    if datetime.now(timezone.utc) > datetime.fromisoformat(share["expires_at"]):
-        raise HTTPException(status_code=403, detail="Share expired")
-    if share["password_hash"]:
-        if not password or not pwd_context.verify(password, share["password_hash"]):
-            raise HTTPException(status_code=401, detail="Password required or incorrect")
-
+def download_share_service(share, file, request):
     abs_share_path = os.path.join(SCAN_ROOT, share["path"].lstrip("/"))
-    if not is_safe_path(SCAN_ROOT, abs_share_path):
+    if not is_public_path(SCAN_ROOT, abs_share_path):
         raise HTTPException(status_code=403, detail="Pfad nicht erlaubt")
 
     if file and os.path.isdir(abs_share_path):
         abs_file = os.path.join(abs_share_path, file)
-        if not is_safe_path(abs_share_path, abs_file) or not os.path.isfile(abs_file):
+        if not is_public_path(abs_share_path, abs_file) or not os.path.isfile(abs_file):
             raise HTTPException(status_code=404, detail="File not found")
         path = abs_file
     elif os.path.isfile(abs_share_path):
@@ -153,19 +215,6 @@ def download_share_service(token, password, file, request):
     file_size = os.path.getsize(path)
     range_header = request.headers.get("range") if request else None
 
-    def file_iterator(start, end):
-        with open(path, "rb") as f:
-            f.seek(start)
-            while start < end:
-                chunk_size = min(1024 * 1024, end - start)
-                data = f.read(chunk_size)
-                if not data:
-                    break
-                start += len(data)
-                yield data
-
-    from fastapi.responses import StreamingResponse
-
     if range_header:
         try:
             _, range_spec = range_header.split("=")
@@ -178,7 +227,7 @@ def download_share_service(token, password, file, request):
             raise HTTPException(status_code=416, detail="Invalid Range header")
 
         return StreamingResponse(
-            file_iterator(start, end + 1),
+            shaped(aiter_file(path, start, end + 1), "share-download", share=share, path=os.path.basename(path)),
             status_code=206,
             media_type="application/octet-stream",
             headers={
@@ -190,7 +239,7 @@ def download_share_service(token, password, file, request):
         )
 
     return StreamingResponse(
-        file_iterator(0, file_size),
+        shaped(aiter_file(path, 0, file_size), "share-download", share=share, path=os.path.basename(path)),
         media_type="application/octet-stream",
         headers={
             "Content-Length": str(file_size),
@@ -199,46 +248,42 @@ def download_share_service(token, password, file, request):
         },
     )
 
-def browse_share_service(token, password, path):
+def browse_share_service(share, path, request=None, format=None, cursor=None, limit=None):
     """
     Browse a subfolder within a shared folder.
 
     Args:
-        token (str): The unique token identifying the shared folder.
-        password (str): The password for accessing the shared folder, if required.
+        share (dict): The share record, already authorized via authorize_share.
         path (str): The relative path within the shared folder to browse.
+        request (Request): The incoming request, used for If-None-Match and Accept-Encoding handling.
+        format (str): "compact" to return the entries as column header plus rows.
+        cursor (str): next_cursor of the previous page, to continue after its last entry.
+        limit (int): Maximum number of entries to return, all entries if None.
 
     Returns:
-        dict: A dictionary containing the folder's metadata and its entries. The structure includes:
+        JSONResponse: The folder's metadata and its entries, with an ETag header. The body includes:
             - type (str): Always "folder".
             - path (str): The relative path within the share.
             - share_path (str): The base path of the shared folder.
             - entries (list): A list of entries (files and subfolders) in the folder.
+            - total (int): The number of entries in the folder.
+            - next_cursor (str): Cursor for the next page, None if this was the last one.
             - token (str): The token used for accessing the share.
             - password_required (bool): Whether a password is required to access the share.
 
     Raises:
         HTTPException: If any of the following conditions occur:
-            - 404: The share is not found.
-            - 403: The share has expired, or the path is not allowed.
-            - 401: The password is required or incorrect.
+            - 404: The folder is not found.
+            - 403: The path is not allowed.
             - 400: The share is not a folder, or an error occurs during folder scanning.
+
+    Answers 304 Not Modified if request carries a matching If-None-Match header.
     """
-    shares = load_shares()
-    share = next((s for s in shares if s["token"] == token), None)
-    if not share:
-        raise HTTPException(status_code=404, detail="Share not found")
-    
-    if datetime.now(timezone.utc) > datetime.fromisoformat(share["expires_at"]):
-        raise HTTPException(status_code=403, detail="Share expired")
-    
-    if share["password_hash"]:
-        if not password or not pwd_context.verify(password, share["password_hash"]):
-            raise HTTPException(status_code=401, detail="Password required or incorrect")
+    token = share["token"]
 
     # Get the base share path
     abs_share_path = os.path.join(SCAN_ROOT, share["path"].lstrip("/"))
-    if not is_safe_path(SCAN_ROOT, abs_share_path):
+    if not is_public_path(SCAN_ROOT, abs_share_path):
         raise HTTPException(status_code=403, detail="Path not allowed")
     
     # Only allow browsing if the share is a folder
@@ -252,47 +297,37 @@ def browse_share_service(token, password, path):
         target_path = abs_share_path
     
     # Ensure the target path is within the shared folder
-    if not is_safe_path(abs_share_path, target_path):
+    if not is_public_path(abs_share_path, target_path):
         raise HTTPException(status_code=403, detail="Path not allowed")
     
     if not os.path.exists(target_path) or not os.path.isdir(target_path):
         raise HTTPException(status_code=404, detail="Folder not found")
     
-    # Scan the folder
-    data = scan_or_cache(target_path)
-    if "error" in data:
-        raise HTTPException(status_code=400, detail=data["error"])
-    
-    return {
-        "type": "folder",
-        "path": path,
-        "share_path": share["path"],
-        "entries": data["entries"],
-        "token": token,
-        "password_required": bool(share["password_hash"]),
-    }
+    etag = make_etag(
+        "share-browse", token, share["path"], path, bool(share["password_hash"]),
+        os.stat(target_path).st_mtime, cursor, limit, format, get_scan_generation(),
+    )
 
-def download_folder_service(token, password, path, request):
-    """Download an entire folder as a ZIP file with true streaming for huge folders"""
-    import zipfile
-    import tempfile
-    from io import BytesIO
-    
-    shares = load_shares()
-    share = next((s for s in shares if s["token"] == token), None)
-    if not share:
-        raise HTTPException(status_code=404, detail="Share not found")
-    
-    if datetime.now(timezone.utc) > datetime.fromisoformat(share["expires_at"]):
-        raise HTTPException(status_code=403, detail="Share expired")
-    
-    if share["password_hash"]:
-        if not password or not pwd_context.verify(password, share["password_hash"]):
-            raise HTTPException(status_code=401, detail="Password required or incorrect")
+    def build():
+        listing = {
+            "type": "folder",
+            "path": path,
+            "share_path": share["path"],
+            **_share_listing(target_path, cursor, limit),
+            "token": token,
+            "password_required": bool(share["password_hash"]),
+        }
+        if format == "compact":
+            return compact_rows(listing, "entries", LISTING_COLUMNS)
+        return listing
 
+    return conditional_json(request, etag, build)
+
+def download_folder_service(share, path):
+    """Download an entire folder as a ZIP file with true streaming for huge folders"""
     # Get the base share path
     abs_share_path = os.path.join(SCAN_ROOT, share["path"].lstrip("/"))
-    if not is_safe_path(SCAN_ROOT, abs_share_path):
+    if not is_public_path(SCAN_ROOT, abs_share_path):
         raise HTTPException(status_code=403, detail="Path not allowed")
     
     # Build the target path within the share
@@ -304,50 +339,50 @@ def download_folder_service(token, password, path, request):
         folder_name = os.path.basename(share["path"].rstrip("/")) or "share"
     
     # Ensure the target path is within the shared folder
-    if not is_safe_path(abs_share_path, target_path):
+    if not is_public_path(abs_share_path, target_path):
         raise HTTPException(status_code=403, detail="Path not allowed")
     
     if not os.path.exists(target_path):
         raise HTTPException(status_code=404, detail="Path not found")
     
-    def streaming_zip_generator():
-        """Generator that yields ZIP data in chunks as it's being created"""
-        # Create a temporary file to write the ZIP to
-        with tempfile.NamedTemporaryFile() as temp_file:
-            # Create ZIP file on disk (not in memory)
-            with zipfile.ZipFile(temp_file, 'w', zipfile.ZIP_DEFLATED, compresslevel=6) as zip_file:
-                if os.path.isfile(target_path):
-                    # Single file
-                    zip_file.write(target_path, os.path.basename(target_path))
-                else:
-                    # Directory - add all files recursively
-                    for root, dirs, files in os.walk(target_path):
-                        for file in files:
-                            try:
-                                file_path = os.path.join(root, file)
-                                # Create relative path within zip
-                                arcname = os.path.relpath(file_path, target_path)
-                                zip_file.write(file_path, arcname)
-                            except (OSError, IOError) as e:
-                                # Skip files that can't be read (permissions, etc.)
-                                print(f"Warning: Skipping file {file_path}: {e}")
-                                continue
-            
-            # Now stream the completed ZIP file in chunks
-            temp_file.seek(0)
-            chunk_size = 1024 * 1024  # 1MB chunks
-            while True:
-                chunk = temp_file.read(chunk_size)
-                if not chunk:
-                    break
-                yield chunk
-    
-    return StreamingResponse(
-        streaming_zip_generator(),
-        media_type="application/zip",
-        headers={
-            "Content-Disposition": f'attachment; filename="{folder_name}.zip"',
-            # Note: We can't provide Content-Length since we don't know the final size
-            # This is normal for streaming responses
-        },
-    )
+    return zip_response(target_path, folder_name, share=share)
+
+def download_selection_service(share, paths, fmt, name=None):
+    """Download several files/folders of a share as one ZIP or TAR archive"""
+
+    abs_share_path = os.path.join(SCAN_ROOT, share["path"].lstrip("/"))
+    if not is_public_path(SCAN_ROOT, abs_share_path):
+        raise HTTPException(status_code=403, detail="Path not allowed")
+    if not os.path.isdir(abs_share_path):
+        raise HTTPException(status_code=400, detail="Share is not a folder")
+    if not paths:
+        raise HTTPException(status_code=400, detail="No paths selected")
+
+    sources = []
+    for path in paths:
+        target_path = os.path.join(abs_share_path, path.lstrip("/"))
+        if not is_public_path(abs_share_path, target_path):
+            raise HTTPException(status_code=403, detail="Path not allowed")
+        if not os.path.exists(target_path):
+            raise HTTPException(status_code=404, detail=f"Path not found: {path}")
+        sources.append((target_path, os.path.basename(target_path.rstrip("/"))))
+
+    archive_name = name or os.path.basename(share["path"].rstrip("/")) or "share"
+    return archive_response(sources, archive_name, fmt, share=share)
+
+def thumb_share_service(share, file, width, height):
+    """Thumbnail of an image/video inside a share (or of the shared file itself)"""
+
+    abs_share_path = os.path.join(SCAN_ROOT, share["path"].lstrip("/"))
+    if not is_public_path(SCAN_ROOT, abs_share_path):
+        raise HTTPException(status_code=403, detail="Path not allowed")
+
+    if file and os.path.isdir(abs_share_path):
+        path = os.path.join(abs_share_path, file.lstrip("/"))
+        if not is_public_path(abs_share_path, path):
+            raise HTTPException(status_code=403, detail="Path not allowed")
+    else:
+        path = abs_share_path
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="File not found")
+    return thumbnail_response(path, width, height)
@@ -0,0 +1,105 @@
+import os
+import asyncio
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from backend.utils.path_utils import SCAN_ROOT, is_public_path
+from backend.utils.http_utils import dumps
+from backend.utils.executors import io_executor, run_in
+from backend.services.dirscan_service import iter_entries
+
+# A chunk is sent once it reaches this size or this age, whichever comes first
+STREAM_FLUSH_BYTES = int(os.getenv("STREAM_FLUSH_BYTES", 64 * 1024))
+STREAM_FLUSH_SECONDS = float(os.getenv("STREAM_FLUSH_SECONDS", 0.5))
+
+
+def _walk(abs_path, rel_path, recursive, max_depth):
+    """
+    Yields one dict per entry (with its path relative to SCAN_ROOT), depth
+    first. Only the stack of pending folders is kept, not the listings.
+    Unreadable folders yield an error line instead of ending the stream; the
+    last line is {"done": true, "count": n}, so clients can detect truncation.
+    """
+    stack = [(abs_path, rel_path, 0)]
+    count = 0
+    while stack:
+        folder, folder_rel, depth = stack.pop()
+        try:
+            for entry in iter_entries(folder):
+                entry_rel = os.path.join(folder_rel, entry["name"]) if folder_rel else entry["name"]
+                yield {"path": entry_rel, **entry}
+                count += 1
+                if entry["is_dir"] and recursive and (max_depth is None or depth + 1 < max_depth):
+                    stack.append((os.path.join(folder, entry["name"]), entry_rel, depth + 1))
+        except OSError as e:
+            yield {"path": folder_rel, "error": str(e)}
+    yield {"done": True, "count": count}
+
+
+_DONE = object()
+
+
+async def _chunks(records):
+    """
+    Batch NDJSON lines into chunks of about STREAM_FLUSH_BYTES. Records are
+    read on the I/O pool; a partial chunk is sent once its first line is
+    STREAM_FLUSH_SECONDS old, even while the next record is still pending
+    (e.g. a slow scandir on a network mount).
+    """
+    loop = asyncio.get_running_loop()
+    records = iter(records)
+    buffer = []
+    size = 0
+    deadline = None
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(run_in(io_executor, next, records, _DONE))
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                yield b"".join(buffer)
+                buffer = []
+                size = 0
+                deadline = None
+                continue
+            record = pending.result()
+            pending = None
+            if record is _DONE:
+                break
+            line = dumps(record) + b"\n"
+            buffer.append(line)
+            size += len(line)
+            if deadline is None:
+                deadline = loop.time() + STREAM_FLUSH_SECONDS
+            if size >= STREAM_FLUSH_BYTES:
+                yield b"".join(buffer)
+                buffer = []
+                size = 0
+                deadline = None
+        if buffer:
+            yield b"".join(buffer)
+    finally:
+        # The walk can only be closed once the running next() has returned
+        if pending is not None:
+            await asyncio.wait({pending})
+        await run_in(io_executor, records.close)
+
+
+def stream_folder_service(path=None, recursive=False, max_depth=None):
+    """
+    Stream the entries of a folder (and with recursive, of its subfolders up
+    to max_depth levels) as newline-delimited JSON, in constant memory.
+    """
+    rel_path = "" if path in (None, "", "/") else path.strip("/")
+    abs_path = os.path.join(SCAN_ROOT, rel_path)
+    if not is_public_path(SCAN_ROOT, abs_path):
+        raise HTTPException(status_code=403, detail="Pfad nicht erlaubt")
+    if not os.path.isdir(abs_path):
+        raise HTTPException(status_code=404, detail="Folder not found")
+    records = _walk(abs_path, rel_path, recursive, max_depth)
+    return StreamingResponse(
+        _chunks(records),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-store"},
+    )
@@ -0,0 +1,182 @@
+import os
+import queue
+import shutil
+import hashlib
+import threading
+import subprocess
+import concurrent.futures
+from fastapi import HTTPException
+from fastapi.responses import FileResponse
+from backend.services.dirscan_service import scan_or_cache
+from backend.utils.disk_cache import DiskLRUCache
+from backend.utils.metrics import Gauge
+
+try:
+    from PIL import Image  # noqa: F401
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+THUMB_CACHE_DIR = os.getenv(
+    "THUMB_CACHE_DIR", os.path.join(os.path.dirname(__file__), "thumb_cache")
+)
+THUMB_CACHE_MAX_BYTES = int(os.getenv("THUMB_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+THUMB_WORKERS = int(os.getenv("THUMB_WORKERS", 2))
+# Requests waiting for or running in the pool; everything beyond gets a 503
+THUMB_MAX_PENDING = int(os.getenv("THUMB_MAX_PENDING", 32))
+THUMB_TIMEOUT = int(os.getenv("THUMB_TIMEOUT", 30))
+THUMB_MAX_SIZE = 1024
+THUMB_DEFAULT_SIZE = 256
+THUMB_PREGENERATE = os.getenv("THUMB_PREGENERATE", "false").lower() in ("1", "true", "yes")
+THUMB_VIDEO = os.getenv("THUMB_VIDEO", "true").lower() in ("1", "true", "yes")
+FFMPEG = shutil.which("ffmpeg")
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp", ".tif", ".tiff"}
+VIDEO_EXTENSIONS = {".mp4", ".mkv", ".mov", ".avi", ".webm", ".m4v"}
+
+thumb_cache = DiskLRUCache(THUMB_CACHE_DIR, THUMB_CACHE_MAX_BYTES, suffix=".jpg")
+_pending = threading.BoundedSemaphore(THUMB_MAX_PENDING)
+_pool = None
+_pool_lock = threading.Lock()
+_pregenerate_queue = queue.Queue(maxsize=1000)
+_pregenerate_thread = None
+
+Gauge(
+    "mntsrv_thumbnail_pregenerate_queue_depth", "Folders waiting for thumbnail pre-generation",
+    callback=_pregenerate_queue.qsize,
+)
+
+
+def thumbnail_kind(path: str):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in IMAGE_EXTENSIONS and PIL_AVAILABLE:
+        return "image"
+    if ext in VIDEO_EXTENSIONS and THUMB_VIDEO and FFMPEG:
+        return "video"
+    return None
+
+
+def render_thumbnail(src: str, dst: str, width: int, height: int, kind: str):
+    """Runs in a worker process: write a JPEG thumbnail of src to dst"""
+    if kind == "video":
+        subprocess.run(
+            [
+                FFMPEG, "-nostdin", "-loglevel", "error", "-y",
+                "-ss", "1", "-i", src, "-frames:v", "1",
+                "-vf", f"scale={width}:{height}:force_original_aspect_ratio=decrease",
+                "-f", "image2", "-c:v", "mjpeg", dst,
+            ],
+            check=True,
+            timeout=THUMB_TIMEOUT,
+        )
+        return
+    from PIL import Image, ImageOps
+    with Image.open(src) as img:
+        img.draft("RGB", (width, height))  # lets JPEG decode at reduced scale
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((width, height))
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.save(dst, "JPEG", quality=80, optimize=True)
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = concurrent.futures.ProcessPoolExecutor(max_workers=THUMB_WORKERS)
+        return _pool
+
+
+def thumbnail_key(abs_path: str, stat, width: int, height: int) -> str:
+    key = f"{abs_path}\0{stat.st_size}\0{stat.st_mtime}\0{width}x{height}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def get_thumbnail(abs_path: str, width: int, height: int, block: bool = True) -> str:
+    """
+    Return the path of the cached thumbnail, generating it on the process pool
+    if needed. Raises HTTPException 503 when the pool is saturated.
+    """
+    kind = thumbnail_kind(abs_path)
+    if kind is None:
+        raise HTTPException(status_code=415, detail="No thumbnail available for this file type")
+    try:
+        stat = os.stat(abs_path)
+    except OSError:
+        raise HTTPException(status_code=404, detail="File not found")
+    key = thumbnail_key(abs_path, stat, width, height)
+    cached = thumb_cache.get(key)
+    if cached:
+        return cached
+
+    if not _pending.acquire(blocking=block, timeout=THUMB_TIMEOUT if block else None):
+        raise HTTPException(status_code=503, detail="Thumbnail generator busy")
+    try:
+        def build(tmp_path):
+            future = _get_pool().submit(render_thumbnail, abs_path, tmp_path, width, height, kind)
+            future.result(timeout=THUMB_TIMEOUT)
+
+        return thumb_cache.get_or_build(key, build)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Thumbnail generation failed for {abs_path}: {e}")
+        raise HTTPException(status_code=422, detail="Could not generate thumbnail")
+    finally:
+        _pending.release()
+
+
+def thumbnail_response(abs_path: str, width: int, height: int) -> FileResponse:
+    # Interactive requests never queue up: a saturated pool answers 503 right away
+    path = get_thumbnail(abs_path, width, height, block=False)
+    return FileResponse(
+        path,
+        media_type="image/jpeg",
+        headers={"Cache-Control": "private, max-age=3600"},
+    )
+
+
+def _pregenerate_worker():
+    while True:
+        folder_path = _pregenerate_queue.get()
+        try:
+            pregenerate_folder(folder_path)
+        except Exception as e:
+            print(f"Error pre-generating thumbnails for {folder_path}: {e}")
+        finally:
+            _pregenerate_queue.task_done()
+
+
+def pregenerate_folder(folder_path: str, width: int = THUMB_DEFAULT_SIZE, height: int = THUMB_DEFAULT_SIZE):
+    """Generate the default-size thumbnails for all media files directly in folder_path"""
+    data = scan_or_cache(folder_path)
+    for entry in data.get("entries", []):
+        if entry["is_dir"]:
+            continue
+        abs_path = os.path.join(folder_path, entry["name"])
+        if thumbnail_kind(abs_path) is None:
+            continue
+        try:
+            get_thumbnail(abs_path, width, height)
+        except HTTPException:
+            continue
+
+
+def schedule_pregenerate(folder_path: str) -> bool:
+    """
+    Queue folder_path for background thumbnail generation. Returns False if
+    thumbnails are unavailable or the queue is full.
+    """
+    global _pregenerate_thread
+    if not (PIL_AVAILABLE or FFMPEG) or not thumb_cache.enabled:
+        return False
+    with _pool_lock:
+        if _pregenerate_thread is None:
+            _pregenerate_thread = threading.Thread(target=_pregenerate_worker, daemon=True)
+            _pregenerate_thread.start()
+    try:
+        _pregenerate_queue.put_nowait(folder_path)
+    except queue.Full:
+        return False
+    return True
@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import secrets
+import threading
+from fastapi import HTTPException
+from backend.utils.path_utils import SCAN_ROOT, INTERNAL_PREFIX
+from backend.utils.datetime_utils import format_utc_timestamp
+from backend.utils.file_lock import FileLock, write_json_atomic
+from backend.services.leader_service import STATE_DIR
+from backend.services.bandwidth_service import TokenBucket
+from backend.services.job_service import start_job
+from backend.services.fileops_service import Changes, remove_tree, cancel_checker
+
+# Deleting moves into a trash folder on the same filesystem (one rename, also for
+# huge folders); the purger removes items for good after the retention period
+TRASH_ENABLED = os.getenv("TRASH_ENABLED", "true").lower() in ("1", "true", "yes")
+TRASH_DIR_NAME = f"{INTERNAL_PREFIX}trash"
+TRASH_RETENTION_DAYS = float(os.getenv("TRASH_RETENTION_DAYS", 30))
+TRASH_PURGE_INTERVAL = int(os.getenv("TRASH_PURGE_INTERVAL", 3600))
+# Files removed per second by the purger, 0 = unlimited
+TRASH_PURGE_RATE = float(os.getenv("TRASH_PURGE_RATE", 0))
+# Trash folders that exist besides the one in SCAN_ROOT (other filesystems below it)
+TRASH_DIRS_FILE = os.path.join(STATE_DIR, "trash_dirs.json")
+
+trash_lock = FileLock(os.path.join(STATE_DIR, "trash.lock"))
+_purger_thread = None
+
+
+def volume_root(abs_path):
+    """Topmost folder within SCAN_ROOT that is on the same filesystem as abs_path"""
+    root = os.path.normpath(SCAN_ROOT)
+    dev = os.lstat(abs_path).st_dev
+    candidate = os.path.dirname(os.path.normpath(abs_path))
+    while candidate != root and os.stat(os.path.dirname(candidate)).st_dev == dev:
+        candidate = os.path.dirname(candidate)
+    return candidate
+
+
+def _load_trash_dirs():
+    try:
+        with open(TRASH_DIRS_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def trash_dirs():
+    dirs = [os.path.join(SCAN_ROOT, TRASH_DIR_NAME)]
+    dirs.extend(d for d in _load_trash_dirs() if d not in dirs)
+    return [d for d in dirs if os.path.isdir(d)]
+
+
+def _trash_dir_for(abs_path):
+    trash = os.path.join(volume_root(abs_path), TRASH_DIR_NAME)
+    if not os.path.isdir(trash):
+        os.makedirs(trash, exist_ok=True)
+        if os.path.normpath(trash) != os.path.normpath(os.path.join(SCAN_ROOT, TRASH_DIR_NAME)):
+            with trash_lock:
+                dirs = _load_trash_dirs()
+                if trash not in dirs:
+                    write_json_atomic(TRASH_DIRS_FILE, dirs + [trash])
+    return trash
+
+
+def move_to_trash(abs_path, username):
+    """Rename abs_path into the trash of its filesystem. Returns the trash item."""
+    trash = _trash_dir_for(abs_path)
+    st = os.lstat(abs_path)
+    is_dir = os.path.isdir(abs_path) and not os.path.islink(abs_path)
+    rel_path = os.path.relpath(abs_path, SCAN_ROOT)
+    item = {
+        "id": f"{int(time.time())}-{secrets.token_hex(6)}",
+        "path": rel_path,
+        "name": os.path.basename(abs_path),
+        "is_dir": is_dir,
+        "size": None if is_dir else st.st_size,
+        "deleted_at": format_utc_timestamp(),
+        "deleted_ts": time.time(),
+        "deleted_by": username,
+    }
+    # Metadata first: an item without it could not be restored
+    info_file = os.path.join(trash, f"{item['id']}.json")
+    write_json_atomic(info_file, item)
+    try:
+        os.rename(abs_path, os.path.join(trash, item["id"]))
+    except BaseException:
+        os.remove(info_file)
+        raise
+    return item
+
+
+def _items(trash):
+    try:
+        names = os.listdir(trash)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(trash, name)) as f:
+                yield json.load(f)
+        except (OSError, ValueError):
+            continue
+
+
+def _with_expiry(item):
+    expires = item["deleted_ts"] + TRASH_RETENTION_DAYS * 86400
+    return {**item, "expires_at": format_utc_timestamp(expires)}
+
+
+def _visible(item, user):
+    return item["deleted_by"] == user.get("username") or user.get("role") == "admin"
+
+
+def list_trash_service(user):
+    """Items in the trash (own items, all for admins), most recently deleted first"""
+    items = [_with_expiry(item) for trash in trash_dirs() for item in _items(trash) if _visible(item, user)]
+    items.sort(key=lambda item: item["deleted_ts"], reverse=True)
+    return items
+
+
+def _find(item_id, user):
+    if not item_id.replace("-", "").isalnum():
+        raise HTTPException(status_code=404, detail="Trash item not found")
+    for trash in trash_dirs():
+        try:
+            with open(os.path.join(trash, f"{item_id}.json")) as f:
+                item = json.load(f)
+        except FileNotFoundError:
+            continue
+        if not _visible(item, user):
+            raise HTTPException(status_code=403, detail="Trash item belongs to another user")
+        return trash, item
+    raise HTTPException(status_code=404, detail="Trash item not found")
+
+
+def restore_service(item_id, user, new_name=None):
+    """Move an item back to its original folder (recreated if needed), optionally renamed"""
+    trash, item = _find(item_id, user)
+    source = os.path.join(trash, item_id)
+    target = os.path.join(SCAN_ROOT, item["path"])
+    if new_name:
+        if "/" in new_name or "\\" in new_name or new_name in (".", "..") or new_name.startswith(INTERNAL_PREFIX):
+            raise HTTPException(status_code=400, detail="Invalid new name")
+        target = os.path.join(os.path.dirname(target), new_name)
+    if os.path.lexists(target):
+        raise HTTPException(status_code=409, detail="A file or directory with this name already exists")
+    if not os.path.lexists(source):
+        os.remove(os.path.join(trash, f"{item_id}.json"))
+        raise HTTPException(status_code=404, detail="Trash item not found")
+
+    # Topmost folder that has to be recreated, or the item itself
+    top = target
+    while not os.path.isdir(os.path.dirname(top)):
+        top = os.path.dirname(top)
+    changes = Changes()
+    changes.before(top)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.rename(source, target)
+    os.remove(os.path.join(trash, f"{item_id}.json"))
+    changes.added(top)
+    changes.apply()
+    return {"status": "restored", "id": item_id, "path": os.path.relpath(target, SCAN_ROOT)}
+
+
+def _purge(trash, item_id, on_removed=None):
+    path = os.path.join(trash, item_id)
+    if os.path.lexists(path):
+        remove_tree(path, on_removed)
+    try:
+        os.remove(os.path.join(trash, f"{item_id}.json"))
+    except FileNotFoundError:
+        pass
+
+
+def delete_item_service(item_id, user):
+    """Remove one item from the trash for good, as a background job"""
+    trash, item = _find(item_id, user)
+
+    def run(job):
+        _purge(trash, item_id, cancel_checker(job))
+        job.advance()
+        return {"purged": [item_id]}
+
+    return start_job("purge-trash", user, run, total=1)
+
+
+def empty_trash_service(user):
+    """Remove all items the user can see from the trash, as a background job"""
+    items = [(trash, item["id"]) for trash in trash_dirs() for item in _items(trash) if _visible(item, user)]
+
+    def run(job):
+        check = cancel_checker(job)
+        for trash, item_id in items:
+            job.check_cancelled()
+            _purge(trash, item_id, check)
+            job.advance()
+        return {"purged": len(items)}
+
+    return start_job("empty-trash", user, run, total=len(items))
+
+
+def purge_expired():
+    """Remove items older than the retention period, at most TRASH_PURGE_RATE files/s"""
+    bucket = TokenBucket(TRASH_PURGE_RATE, burst_seconds=1.0) if TRASH_PURGE_RATE else None
+    on_removed = (lambda: bucket.consume_blocking(1)) if bucket else None
+    cutoff = time.time() - TRASH_RETENTION_DAYS * 86400
+    purged = 0
+    for trash in trash_dirs():
+        known = set()
+        for item in list(_items(trash)):
+            known.add(item["id"])
+            if item["deleted_ts"] < cutoff:
+                try:
+                    _purge(trash, item["id"], on_removed)
+                    purged += 1
+                except OSError as e:
+                    print(f"Trash: could not purge {item['id']}: {e}")
+        # Leftovers without metadata (e.g. after a crash during a move)
+        for name in os.listdir(trash):
+            path = os.path.join(trash, name)
+            if name.endswith(".json") or name.endswith(".tmp") or name in known:
+                continue
+            try:
+                if os.lstat(path).st_mtime < cutoff:
+                    remove_tree(path, on_removed)
+            except OSError as e:
+                print(f"Trash: could not purge {name}: {e}")
+    if purged:
+        print(f"Trash: purged {purged} expired items")
+    return purged
+
+
+def _purge_loop():
+    while True:
+        try:
+            purge_expired()
+        except Exception as e:
+            print(f"Trash purge failed: {e}")
+        time.sleep(TRASH_PURGE_INTERVAL)
+
+
+def start_trash_purger():
+    """Run purge_expired every TRASH_PURGE_INTERVAL seconds (in the leader worker)"""
+    global _purger_thread
+    if _purger_thread is None:
+        _purger_thread = threading.Thread(target=_purge_loop, daemon=True)
+        _purger_thread.start()
+    return _purger_thread
@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import secrets
+from fastapi import HTTPException
+from backend.utils.path_utils import SCAN_ROOT, is_public_path, is_internal_name, INTERNAL_PREFIX
+from backend.utils.datetime_utils import format_utc_timestamp
+from backend.services.dirscan_service import entry_info, update_cache, cache_lock
+from backend.services.search_service import update_index
+
+# Lives below SCAN_ROOT by default so finalize is a same-filesystem rename
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(SCAN_ROOT, f"{INTERNAL_PREFIX}uploads"))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))
+UPLOAD_MAX_CHUNK_SIZE = 64 * 1024 * 1024
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", 24 * 3600))
+
+CHECKSUM_ALGORITHMS = ("sha256", "sha1", "md5")
+
+
+def _session_file(upload_id, ext):
+    return os.path.join(UPLOAD_DIR, f"{upload_id}.{ext}")
+
+
+def _chunk_count(session):
+    return max(1, -(-session["size"] // session["chunk_size"]))
+
+
+def load_session(upload_id, user):
+    if not upload_id.replace("-", "").replace("_", "").isalnum():
+        raise HTTPException(status_code=404, detail="Upload not found")
+    try:
+        with open(_session_file(upload_id, "json")) as f:
+            session = json.load(f)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if session["created_by"] != user.get("username") and user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Upload belongs to another user")
+    return session
+
+
+def _received_chunks(upload_id):
+    # One byte per chunk, written with pwrite so parallel PUTs need no lock
+    try:
+        with open(_session_file(upload_id, "chunks"), "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return b""
+
+
+def _remove_session_files(upload_id):
+    for ext in ("json", "chunks", "part"):
+        try:
+            os.remove(_session_file(upload_id, ext))
+        except FileNotFoundError:
+            pass
+
+
+def purge_stale_uploads():
+    """Remove upload sessions that were not finalized within UPLOAD_SESSION_TTL"""
+    cutoff = time.time() - UPLOAD_SESSION_TTL
+    try:
+        names = os.listdir(UPLOAD_DIR)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        try:
+            if os.path.getmtime(os.path.join(UPLOAD_DIR, name)) < cutoff:
+                _remove_session_files(name[:-len(".json")])
+        except OSError:
+            continue
+
+
+def _resolve_target_dir(path):
+    rel_dir = (path or "").strip("/")
+    abs_dir = os.path.join(SCAN_ROOT, rel_dir)
+    if not is_public_path(SCAN_ROOT, abs_dir):
+        raise HTTPException(status_code=403, detail="Path not allowed")
+    if not os.path.isdir(abs_dir):
+        raise HTTPException(status_code=404, detail="Target folder not found")
+    return rel_dir, abs_dir
+
+
+def create_upload_service(path, filename, size, chunk_size, overwrite, user):
+    """Create an upload session and preallocate its temporary file"""
+    if not filename or "/" in filename or "\\" in filename or filename in (".", "..") or is_internal_name(filename):
+        raise HTTPException(status_code=400, detail="Invalid file name")
+    if size < 0:
+        raise HTTPException(status_code=400, detail="Invalid size")
+    chunk_size = chunk_size or UPLOAD_CHUNK_SIZE
+    if chunk_size <= 0 or chunk_size > UPLOAD_MAX_CHUNK_SIZE:
+        raise HTTPException(status_code=400, detail=f"chunk_size must be between 1 and {UPLOAD_MAX_CHUNK_SIZE}")
+
+    rel_dir, abs_dir = _resolve_target_dir(path)
+    target = os.path.join(abs_dir, filename)
+    if os.path.exists(target) and (not overwrite or os.path.isdir(target)):
+        raise HTTPException(status_code=400, detail="File or directory with this name already exists")
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    purge_stale_uploads()
+
+    upload_id = secrets.token_urlsafe(16)
+    session = {
+        "id": upload_id,
+        "path": rel_dir,
+        "filename": filename,
+        "size": size,
+        "chunk_size": chunk_size,
+        "overwrite": bool(overwrite),
+        "created_by": user.get("username"),
+        "created_at": format_utc_timestamp(),
+    }
+    fd = os.open(_session_file(upload_id, "part"), os.O_CREAT | os.O_WRONLY, 0o644)
+    try:
+        if size:
+            try:
+                os.posix_fallocate(fd, 0, size)
+            except (AttributeError, OSError):
+                # Filesystem without fallocate support: sparse file instead
+                os.ftruncate(fd, size)
+    except OSError as e:
+        os.close(fd)
+        _remove_session_files(upload_id)
+        raise HTTPException(status_code=507, detail=f"Could not allocate upload: {e}")
+    os.close(fd)
+    with open(_session_file(upload_id, "chunks"), "wb") as f:
+        f.write(b"\0" * _chunk_count(session))
+    with open(_session_file(upload_id, "json"), "w") as f:
+        json.dump(session, f)
+
+    return {**session, "chunks": _chunk_count(session)}
+
+
+def upload_status_service(upload_id, user):
+    session = load_session(upload_id, user)
+    received = _received_chunks(upload_id)
+    missing = [i for i in range(_chunk_count(session)) if i >= len(received) or not received[i]]
+    return {
+        **session,
+        "chunks": _chunk_count(session),
+        "received": _chunk_count(session) - len(missing),
+        "missing": missing,
+    }
+
+
+def _chunk_bounds(session, index):
+    if index < 0 or index >= _chunk_count(session):
+        raise HTTPException(status_code=400, detail="Chunk index out of range")
+    offset = index * session["chunk_size"]
+    return offset, min(session["chunk_size"], session["size"] - offset)
+
+
+def expected_chunk_length(upload_id, index, user):
+    """Byte length chunk index must have, checked before its body is read"""
+    return _chunk_bounds(load_session(upload_id, user), index)[1]
+
+
+def write_chunk_service(upload_id, index, data, user):
+    """Write one chunk at its offset; chunks may arrive in any order and in parallel"""
+    session = load_session(upload_id, user)
+    offset, expected = _chunk_bounds(session, index)
+    if len(data) != expected:
+        raise HTTPException(status_code=400, detail=f"Chunk {index} must be {expected} bytes, got {len(data)}")
+
+    fd = os.open(_session_file(upload_id, "part"), os.O_WRONLY)
+    try:
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+    finally:
+        os.close(fd)
+
+    fd = os.open(_session_file(upload_id, "chunks"), os.O_WRONLY)
+    try:
+        os.pwrite(fd, b"\1", index)
+    finally:
+        os.close(fd)
+    return {"id": upload_id, "index": index, "size": len(data)}
+
+
+def _file_checksum(path, algorithm):
+    h = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(1024 * 1024)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def finalize_upload_service(upload_id, checksum, user):
+    """
+    Verify the optional checksum ("<algo>:<hex>" or plain sha256 hex), move the
+    file into place atomically and update only the parent's listing cache and
+    the search index entry.
+    """
+    session = load_session(upload_id, user)
+    status = upload_status_service(upload_id, user)
+    if status["missing"]:
+        raise HTTPException(status_code=409, detail=f"{len(status['missing'])} chunks missing")
+
+    part_file = _session_file(upload_id, "part")
+    if checksum:
+        algorithm, _, expected = checksum.rpartition(":")
+        algorithm = (algorithm or "sha256").lower()
+        if algorithm not in CHECKSUM_ALGORITHMS:
+            raise HTTPException(status_code=400, detail="Unsupported checksum algorithm")
+        actual = _file_checksum(part_file, algorithm)
+        if actual != expected.lower():
+            raise HTTPException(status_code=422, detail=f"Checksum mismatch: {algorithm}:{actual}")
+
+    rel_dir, abs_dir = _resolve_target_dir(session["path"])
+    target = os.path.join(abs_dir, session["filename"])
+    with cache_lock:
+        if os.path.exists(target) and (not session["overwrite"] or os.path.isdir(target)):
+            raise HTTPException(status_code=400, detail="File or directory with this name already exists")
+        old_mtime = os.stat(abs_dir).st_mtime
+        try:
+            os.replace(part_file, target)
+        except OSError:
+            # UPLOAD_DIR on another filesystem
+            shutil.move(part_file, target)
+        st = os.stat(target)
+        update_cache(abs_dir, old_mtime, upserts=[entry_info(session["filename"], False, st)])
+    update_index(add=[{"name": session["filename"], "path": target, "is_dir": False, "mtime": st.st_mtime}])
+    _remove_session_files(upload_id)
+
+    rel_path = os.path.join(rel_dir, session["filename"]) if rel_dir else session["filename"]
+    return {"status": "uploaded", "path": rel_path, "size": session["size"]}
+
+
+def abort_upload_service(upload_id, user):
+    load_session(upload_id, user)
+    _remove_session_files(upload_id)
+    return {"status": "aborted", "id": upload_id}
@@ -3,7 +3,9 @@ import json
 from datetime import datetime, timezone
 from fastapi import HTTPException
 from backend.services.auth_service import pwd_context
+from backend.services.password_service import call_password
 from backend.utils.datetime_utils import format_utc_timestamp
+from backend.utils.file_lock import write_json_atomic
 
 USERS_FILE = os.path.join(os.path.dirname(__file__), "..", "config", "users.json")
 
@@ -19,8 +21,7 @@ def load_users():
 
 def save_users(users):
     """Save users to JSON file"""
-    with open(USERS_FILE, "w") as f:
-        json.dump(users, f, indent=2)
+    write_json_atomic(USERS_FILE, users, indent=2)
 
 def list_users_service():
     """List all users (excluding passwords)"""
@@ -49,7 +50,7 @@ def create_user_service(username, password, role="standard"):
         raise HTTPException(status_code=400, detail="User already exists")
     
     # Hash password
-    password_hash = pwd_context.hash(password)
+    password_hash = call_password(pwd_context.hash, password)
     
     # Create user
     new_user = {
@@ -89,7 +90,7 @@ def update_user_service(username, role=None, password=None):
         users[user_index]["role"] = role
     
     if password:
-        users[user_index]["password_hash"] = pwd_context.hash(password)
+        users[user_index]["password_hash"] = call_password(pwd_context.hash, password)
     
     save_users(users)
     
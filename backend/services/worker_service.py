@@ -0,0 +1,111 @@
+import os
+import json
+import time
+import threading
+from backend.utils.file_lock import write_json_atomic
+from backend.utils.metrics import snapshot as metrics_snapshot
+from backend.services.leader_service import STATE_DIR
+
+# Every uvicorn worker publishes its in-memory state (active streams, metrics)
+# here, so limits and monitoring cover the whole installation, not one process
+WORKER_STATE_DIR = os.path.join(STATE_DIR, "workers")
+WORKER_STATE_INTERVAL = float(os.getenv("WORKER_STATE_INTERVAL", 1))
+# A worker whose file is older than this is considered gone
+WORKER_STATE_TTL = max(5 * WORKER_STATE_INTERVAL, 5)
+
+WORKER_ID = str(os.getpid())
+
+_providers = {}
+_listeners = []
+_lock = threading.Lock()
+_thread = None
+
+
+def register_state(name, provider):
+    """provider() returns the JSON-serialisable part name of this worker's state"""
+    with _lock:
+        _providers[name] = provider
+
+
+def on_refresh(listener):
+    """listener(states) is called after every publish with the other workers' states"""
+    with _lock:
+        _listeners.append(listener)
+
+
+def _state_file(worker_id):
+    return os.path.join(WORKER_STATE_DIR, f"{worker_id}.json")
+
+
+def publish():
+    with _lock:
+        providers = dict(_providers)
+    state = {"worker": WORKER_ID, "updated": time.time()}
+    for name, provider in providers.items():
+        try:
+            state[name] = provider()
+        except Exception as e:
+            print(f"Worker state {name} failed: {e}")
+    os.makedirs(WORKER_STATE_DIR, exist_ok=True)
+    write_json_atomic(_state_file(WORKER_ID), state, separators=(",", ":"))
+
+
+def other_workers():
+    """States of the other live workers; files of workers gone for long are removed"""
+    states = []
+    now = time.time()
+    try:
+        names = os.listdir(WORKER_STATE_DIR)
+    except FileNotFoundError:
+        return states
+    for name in names:
+        if not name.endswith(".json") or name == f"{WORKER_ID}.json":
+            continue
+        path = os.path.join(WORKER_STATE_DIR, name)
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            continue
+        age = now - state.get("updated", 0)
+        if age > 10 * WORKER_STATE_TTL:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        if age <= WORKER_STATE_TTL:
+            states.append(state)
+    return states
+
+
+def _run():
+    while True:
+        try:
+            publish()
+            states = other_workers()
+            with _lock:
+                listeners = list(_listeners)
+            for listener in listeners:
+                listener(states)
+        except Exception as e:
+            print(f"Worker state refresh failed: {e}")
+        time.sleep(WORKER_STATE_INTERVAL)
+
+
+def start_worker_state():
+    """Publish this worker's state and pick up the others' every WORKER_STATE_INTERVAL seconds"""
+    global _thread
+    if _thread is None:
+        _thread = threading.Thread(target=_run, daemon=True, name="mntsrv-worker-state")
+        _thread.start()
+    return _thread
+
+
+def stop_worker_state():
+    try:
+        os.remove(_state_file(WORKER_ID))
+    except OSError:
+        pass
+
+
+register_state("metrics", metrics_snapshot)
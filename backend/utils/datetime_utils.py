@@ -1,14 +1,18 @@
 from datetime import datetime, timezone
 
 
-def format_utc_timestamp():
+def format_utc_timestamp(timestamp=None):
     """
     Generate a UTC timestamp in ISO format with Z suffix.
     
+    Args:
+        timestamp (float): Unix time to format, the current time if None.
+    
     Returns:
         str: UTC timestamp in format "YYYY-MM-DDTHH:MM:SSZ"
     
     Example:
         "2025-01-25T10:30:45Z"
     """
-    return datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
+    now = datetime.now(timezone.utc) if timestamp is None else datetime.fromtimestamp(timestamp, timezone.utc)
+    return now.replace(microsecond=0).isoformat().replace("+00:00", "Z")
@@ -0,0 +1,152 @@
+import os
+import threading
+
+
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.error = None
+
+
+class DiskLRUCache:
+    """
+    Directory-backed cache with a byte budget and LRU eviction.
+
+    Recency is tracked via the mtime of the cache files so it survives
+    restarts. Concurrent requests for the same key share a single build
+    (single-flight).
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, suffix: str = ""):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}{self.suffix}")
+
+    def get(self, key: str):
+        """
+        Return the path of the cached file (marking it as used), or None.
+        """
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def get_or_build(self, key: str, build):
+        """
+        Return the path for key. On a miss, build(tmp_path) runs exactly once;
+        concurrent callers wait for that result.
+        """
+        path = self.get(key)
+        if path:
+            return path
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            path = self.get(key)
+            if path:
+                return path
+            # Evicted again in the meantime - build it ourselves
+            return self.get_or_build(key, build)
+
+        path = self.path_for(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            build(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+        self.evict(keep=path)
+        return path
+
+    def begin(self, key: str):
+        """
+        Claim the build of key for a caller that writes the file itself, e.g.
+        while streaming it. Returns the temporary path to write to, or None if
+        another build of key is running. Must be followed by finish().
+        """
+        with self._lock:
+            if key in self._inflight:
+                return None
+            self._inflight[key] = _Flight()
+        path = self.path_for(key)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        except OSError:
+            self.finish(key, None, False)
+            return None
+        return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def finish(self, key: str, tmp_path: str, complete: bool):
+        """
+        Publish the file written after begin() if complete, otherwise discard
+        it. Callers waiting in get_or_build() then use it or build it themselves.
+        """
+        path = self.path_for(key)
+        try:
+            if complete:
+                os.replace(tmp_path, path)
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            with self._lock:
+                flight = self._inflight.pop(key, None)
+            if flight is not None:
+                flight.event.set()
+        if complete:
+            self.evict(keep=path)
+
+    def evict(self, keep: str = None):
+        """
+        Remove the least recently used files until the budget is met.
+        """
+        files = []
+        total = 0
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if not entry.is_file(follow_symlinks=False) or entry.name.endswith(".tmp"):
+                        continue
+                    stat = entry.stat(follow_symlinks=False)
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        except FileNotFoundError:
+            return
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
@@ -0,0 +1,71 @@
+import os
+import asyncio
+import functools
+import contextvars
+import concurrent.futures
+
+# Dedicated pools instead of Starlette's shared AnyIO threadpool: slow disks or
+# long downloads can only exhaust IO_WORKERS, never the threads that serve
+# /api/ping, login and the other sync endpoints
+IO_WORKERS = int(os.getenv("IO_WORKERS", 32))
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", os.cpu_count() or 2))
+STREAM_CHUNK_SIZE = 1024 * 1024  # 1MB chunks
+
+io_executor = concurrent.futures.ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="mntsrv-io")
+# zlib and Pillow release the GIL, so threads are enough for CPU-bound work
+# (bcrypt has its own pool, see password_service)
+cpu_executor = concurrent.futures.ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="mntsrv-cpu")
+
+
+async def run_in(executor, fn, *args, **kwargs):
+    """Run fn on executor, keeping the caller's context variables"""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(ctx.run, fn, *args, **kwargs))
+
+
+async def run_io(fn, *args, **kwargs):
+    return await run_in(io_executor, fn, *args, **kwargs)
+
+
+async def run_cpu(fn, *args, **kwargs):
+    return await run_in(cpu_executor, fn, *args, **kwargs)
+
+
+_DONE = object()
+
+
+async def iterate_in(executor, iterator):
+    """
+    Drive a sync iterator on executor, one item at a time. The next item is only
+    produced after the previous one has been sent, so a slow client throttles
+    the producer instead of letting chunks pile up in memory.
+    """
+    iterator = iter(iterator)
+    try:
+        while True:
+            item = await run_in(executor, next, iterator, _DONE)
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            await run_in(executor, close)
+
+
+async def aiter_file(file, start: int = 0, end: int = None, chunk_size: int = STREAM_CHUNK_SIZE):
+    """Read file[start:end] in chunks on the I/O pool (file: path or open binary file)"""
+    f = await run_io(open, file, "rb") if isinstance(file, str) else file
+    try:
+        if start:
+            await run_io(f.seek, start)
+        while end is None or start < end:
+            size = chunk_size if end is None else min(chunk_size, end - start)
+            data = await run_io(f.read, size)
+            if not data:
+                break
+            start += len(data)
+            yield data
+    finally:
+        await run_io(f.close)
@@ -0,0 +1,142 @@
+import os
+import gzip
+import json
+import hashlib
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+from backend.utils.timing import phase
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Listings must be revalidated on every use, but may be reused after a 304
+CACHE_CONTROL = "private, no-cache"
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 5))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 4))
+
+# ETag suffix per content coding, so each representation has its own strong ETag
+_ENCODING_SUFFIX = {"br": "-br", "gzip": "-gz"}
+
+# Column order of the compact listing format
+LISTING_COLUMNS = ["name", "is_dir", "mtime", "size", "has_children"]
+SEARCH_COLUMNS = ["name", "path", "is_dir"]
+CONTENT_SEARCH_COLUMNS = SEARCH_COLUMNS + ["size", "matches", "line", "snippet"]
+
+
+def dumps(payload) -> bytes:
+    """Serialise to JSON bytes, with orjson if installed"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def negotiate_encoding(request: Request):
+    """Pick br or gzip from Accept-Encoding (respecting q=0), or None"""
+    if request is None:
+        return None
+    header = request.headers.get("accept-encoding", "")
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = q
+    wildcard = accepted.get("*", 0.0)
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+def encode_json(request: Request, payload, headers: dict = None, etag: str = None) -> Response:
+    """
+    Serialise payload straight to a Response (bypassing jsonable_encoder) and
+    compress it with br/gzip if the client accepts it and the body is large enough.
+    """
+    headers = dict(headers or {})
+    with phase("serialize"):
+        body = dumps(payload)
+    encoding = negotiate_encoding(request)
+    if encoding and len(body) >= COMPRESS_MIN_SIZE:
+        with phase("compress"):
+            if encoding == "br":
+                body = brotli.compress(body, quality=BROTLI_QUALITY)
+            else:
+                body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        headers["Content-Encoding"] = encoding
+        if etag:
+            etag = etag[:-1] + _ENCODING_SUFFIX[encoding] + '"'
+    headers["Vary"] = "Accept-Encoding"
+    if etag:
+        headers["ETag"] = etag
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def compact_rows(payload: dict, key: str, columns) -> dict:
+    """
+    Replace the list of dicts in payload[key] with a column header plus rows
+    (array of arrays), which is considerably smaller for large listings.
+    """
+    compact = {k: v for k, v in payload.items() if k != key}
+    compact["columns"] = list(columns)
+    compact["rows"] = [[e.get(c) for c in columns] for e in payload[key]]
+    return compact
+
+
+def make_etag(*parts) -> str:
+    """
+    Strong ETag over the given parts (path, mtime, paging params, generation, ...).
+    """
+    h = hashlib.sha256("\0".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    return f'"{h[:32]}"'
+
+
+def etag_matches(request: Request, etag: str):
+    """Return the matching tag from If-None-Match (any content coding variant) or None"""
+    if request is None:
+        return None
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    if header.strip() == "*":
+        return etag
+    # If-None-Match uses the weak comparison, so W/"..." matches too
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    for candidate in [etag] + [etag[:-1] + suffix + '"' for suffix in _ENCODING_SUFFIX.values()]:
+        if candidate in tags:
+            return candidate
+    return None
+
+
+def conditional_json(request: Request, etag: str, build):
+    """
+    Answer 304 if the client already has etag, otherwise call build() and
+    return its result as JSON. build() is only invoked on a miss, so nothing
+    is loaded or serialised for unchanged listings.
+    """
+    headers = {"Cache-Control": CACHE_CONTROL}
+    matched = etag_matches(request, etag)
+    if matched:
+        return Response(status_code=304, headers={**headers, "ETag": matched, "Vary": "Accept-Encoding"})
+    return encode_json(request, build(), headers, etag=etag)
@@ -0,0 +1,245 @@
+import time
+import bisect
+import threading
+
+# Prometheus text exposition format, kept dependency-free on purpose
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+_lock = threading.Lock()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs.extend(f'{n}="{_escape(v)}"' for n, v in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        with _lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def samples(self):
+        with _lock:
+            return [(self.name, k, v) for k, v in self._values.items()]
+
+    def snapshot(self):
+        """JSON-serialisable state, see render_snapshots"""
+        return {
+            "name": self.name, "kind": self.kind, "help": self.help, "labels": list(self.label_names),
+            "samples": [[list(key), value] for _, key, value in self.samples()],
+        }
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Gauge set explicitly, or computed at scrape time by a callback returning {label tuple: value}"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels=(), callback=None):
+        super().__init__(name, help, labels)
+        self.callback = callback
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.callback is None:
+            return super().samples()
+        try:
+            values = self.callback()
+        except Exception as e:
+            print(f"Metric callback {self.name} failed: {e}")
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [(self.name, k if isinstance(k, tuple) else (k,), v) for k, v in values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def snapshot(self):
+        with _lock:
+            samples = [[list(k), [list(v[0]), v[1], v[2]]] for k, v in self._values.items()]
+        return {"name": self.name, "kind": self.kind, "help": self.help, "labels": list(self.label_names),
+                "buckets": list(self.buckets), "samples": samples}
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+def snapshot() -> list:
+    """State of all metrics of this process, JSON-serialisable"""
+    with _lock:
+        metrics = list(_registry)
+    return [metric.snapshot() for metric in metrics]
+
+
+def _render_samples(metric, extra):
+    lines = []
+    for key, value in metric["samples"]:
+        if metric["kind"] != "histogram":
+            lines.append(f"{metric['name']}{_format_labels(metric['labels'], key, extra)} {_format_value(value)}")
+            continue
+        counts, total, count = value
+        cumulative = 0
+        for bound, n in zip(metric["buckets"], counts):
+            cumulative += n
+            labels = _format_labels(metric["labels"], key, extra + [("le", _format_value(float(bound)))])
+            lines.append(f"{metric['name']}_bucket{labels} {cumulative}")
+        labels = _format_labels(metric["labels"], key, extra + [("le", "+Inf")])
+        lines.append(f"{metric['name']}_bucket{labels} {count}")
+        labels = _format_labels(metric["labels"], key, extra)
+        lines.append(f"{metric['name']}_sum{labels} {_format_value(total)}")
+        lines.append(f"{metric['name']}_count{labels} {count}")
+    return lines
+
+
+def render_snapshots(snapshots) -> str:
+    """
+    Render (worker id, snapshot()) pairs as one exposition; each sample gets
+    a worker label, so a scraper can sum over the processes of one server.
+    """
+    metrics = {}
+    for worker, metric_list in snapshots:
+        for metric in metric_list:
+            entry = metrics.setdefault(metric["name"], (metric, []))
+            entry[1].extend(_render_samples(metric, [("worker", worker)]))
+    lines = []
+    for metric, samples in metrics.values():
+        lines.append(f"# HELP {metric['name']} {metric['help']}")
+        lines.append(f"# TYPE {metric['name']} {metric['kind']}")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+def render_metrics() -> str:
+    """Metrics of this process only"""
+    lines = []
+    for metric in snapshot():
+        lines.append(f"# HELP {metric['name']} {metric['help']}")
+        lines.append(f"# TYPE {metric['name']} {metric['kind']}")
+        lines.extend(_render_samples(metric, []))
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency (until the response headers are sent)
+    and response body bytes per route template, so /api/share/{token} is one
+    series instead of one per token.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        state = {"status": 500, "route": None}
+
+        def route_label():
+            if state["route"] is None:
+                route = scope.get("route")
+                state["route"] = getattr(route, "path", None) or "unmatched"
+            return state["route"]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                REQUEST_LATENCY.observe(
+                    time.perf_counter() - start,
+                    method=scope["method"], route=route_label(), status=state["status"],
+                )
+            elif message["type"] == "http.response.body":
+                body = message.get("body", b"")
+                if body:
+                    RESPONSE_BYTES.inc(len(body), route=route_label())
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+REQUEST_LATENCY = Histogram(
+    "mntsrv_http_request_duration_seconds",
+    "Time until the response headers were sent, per route",
+    labels=("method", "route", "status"),
+)
+RESPONSE_BYTES = Counter(
+    "mntsrv_http_response_bytes_total",
+    "Response body bytes sent, per route",
+    labels=("route",),
+)
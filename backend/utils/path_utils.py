@@ -7,3 +7,22 @@ def is_safe_path(base, path):
     base = os.path.realpath(base)
     target = os.path.realpath(path)
     return os.path.commonpath([base, target]) == base
+
+# Interne Verwaltungsordner (Uploads, Papierkorb, ...) beginnen mit diesem Präfix
+INTERNAL_PREFIX = ".mntsrv-"
+
+def is_internal_name(name):
+    return name.startswith(INTERNAL_PREFIX)
+
+def has_internal_part(path):
+    """True if a component of path below SCAN_ROOT, as given or with symlinks resolved, is internal"""
+    for root, target in ((os.path.abspath(SCAN_ROOT), os.path.abspath(path)),
+                         (os.path.realpath(SCAN_ROOT), os.path.realpath(path))):
+        rel = os.path.relpath(target, root)
+        if any(is_internal_name(part) for part in rel.split(os.sep)):
+            return True
+    return False
+
+def is_public_path(base, path):
+    # Wie is_safe_path, aber Papierkorb, Upload-Teile usw. bleiben unerreichbar
+    return is_safe_path(base, path) and not has_internal_part(path)
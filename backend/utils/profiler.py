@@ -0,0 +1,88 @@
+import sys
+import time
+import threading
+
+PROFILE_MAX_SECONDS = 60
+
+_running = threading.Lock()
+
+
+def _stack(frame):
+    """Frames of a stack, outermost first, as (function, file, line)"""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def sample(seconds: float, interval: float = 0.01):
+    """
+    Sample the stacks of all threads (except the sampling one) every interval
+    seconds. Returns {thread name: {stack tuple: sample count}}.
+    Returns None if another profile is already running.
+    """
+    if not _running.acquire(blocking=False):
+        return None
+    try:
+        own = threading.get_ident()
+        samples = {}
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                counts = samples.setdefault(names.get(ident, f"thread-{ident}"), {})
+                stack = tuple(_stack(frame))
+                counts[stack] = counts.get(stack, 0) + 1
+            time.sleep(interval)
+        return samples
+    finally:
+        _running.release()
+
+
+def to_collapsed(samples) -> str:
+    """Brendan Gregg's collapsed stack format, readable by flamegraph.pl and speedscope"""
+    lines = []
+    for thread, counts in samples.items():
+        for stack, count in counts.items():
+            frames = ";".join(f"{name} ({filename}:{line})" for name, filename, line in stack)
+            lines.append(f"{thread};{frames} {count}")
+    return "\n".join(sorted(lines)) + "\n"
+
+
+def to_speedscope(samples, interval: float, name: str = "mntsrv") -> dict:
+    """speedscope file format with one sampled profile per thread"""
+    frames = []
+    frame_index = {}
+    profiles = []
+    for thread, counts in samples.items():
+        stacks, weights = [], []
+        for stack, count in counts.items():
+            indices = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                indices.append(frame_index[frame])
+            stacks.append(indices)
+            weights.append(count * interval)
+        profiles.append({
+            "type": "sampled",
+            "name": thread,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": stacks,
+            "weights": weights,
+        })
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": profiles,
+        "name": name,
+        "exporter": "mntsrv",
+    }
@@ -0,0 +1,106 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Requests faster than this are not logged (0 = log every request, -1 = never)
+REQUEST_LOG_MIN_MS = float(os.getenv("REQUEST_LOG_MIN_MS", 500))
+# Public share links need no login; their responses carry no Server-Timing,
+# which would tell anyone how the server spends its time
+SERVER_TIMING_EXCLUDE = ("/api/share/",)
+
+# Phase durations of the current request; run_in copies the context, so
+# work on the I/O and CPU pools records into the same dict
+_phases = contextvars.ContextVar("mntsrv_phases", default=None)
+_phases_lock = threading.Lock()
+
+
+def record(name: str, seconds: float):
+    phases = _phases.get()
+    if phases is None:
+        return
+    with _phases_lock:
+        total, count = phases.get(name, (0.0, 0))
+        phases[name] = (total + seconds, count + 1)
+
+
+@contextmanager
+def phase(name: str):
+    """Attribute the time spent in the block to phase name of the current request"""
+    if _phases.get() is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def _server_timing(phases, total):
+    # Phases can nest (e.g. scandir inside has_children), so they need not add up to total
+    parts = [f"{name};dur={seconds * 1000:.2f}" for name, (seconds, _) in sorted(phases.items())]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+class ServerTimingMiddleware:
+    """
+    Collects phase timings per request, adds them as Server-Timing header
+    (except below SERVER_TIMING_EXCLUDE) and prints a JSON log line for
+    requests slower than REQUEST_LOG_MIN_MS once the body has been sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        phases = {}
+        token = _phases.set(phases)
+        start = time.perf_counter()
+        state = {"status": None, "ttfb": None}
+        add_header = not scope["path"].startswith(SERVER_TIMING_EXCLUDE)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                state["ttfb"] = time.perf_counter() - start
+                if add_header:
+                    with _phases_lock:
+                        header = _server_timing(phases, state["ttfb"])
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", header.encode("latin-1"))
+                    ]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                self._log(scope, state, phases, time.perf_counter() - start)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _phases.reset(token)
+
+    @staticmethod
+    def _log(scope, state, phases, total):
+        if REQUEST_LOG_MIN_MS < 0 or total * 1000 < REQUEST_LOG_MIN_MS:
+            return
+        route = getattr(scope.get("route"), "path", None)
+        with _phases_lock:
+            phase_ms = {
+                name: {"ms": round(seconds * 1000, 2), "count": count}
+                for name, (seconds, count) in phases.items()
+            }
+        print(json.dumps({
+            "event": "request",
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": route,
+            "status": state["status"],
+            "ttfb_ms": round((state["ttfb"] or 0) * 1000, 2),
+            "total_ms": round(total * 1000, 2),
+            "phases": phase_ms,
+        }), flush=True)
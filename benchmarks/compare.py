@@ -0,0 +1,36 @@
+"""
+Compare the medians of two benchmark result files.
+
+    python -m benchmarks.compare baseline.json candidate.json
+"""
+import sys
+import json
+
+
+def _medians(results):
+    medians = {f"micro.{name}": stats["median"] for name, stats in results.get("micro", {}).items()}
+    for name, stats in results.get("e2e", {}).get("scenarios", {}).items():
+        medians[f"e2e.{name}"] = stats["median"]
+    return medians
+
+
+def main():
+    if len(sys.argv) != 3:
+        sys.exit("usage: python -m benchmarks.compare BASELINE.json CANDIDATE.json")
+    with open(sys.argv[1]) as f:
+        baseline = _medians(json.load(f))
+    with open(sys.argv[2]) as f:
+        candidate = _medians(json.load(f))
+
+    print(f"{'benchmark':40} {'baseline ms':>12} {'candidate ms':>12} {'change':>8}")
+    for name in sorted(baseline.keys() | candidate.keys()):
+        old, new = baseline.get(name), candidate.get(name)
+        if old is None or new is None:
+            print(f"{name:40} {'-' if old is None else f'{old * 1000:.3f}':>12} {'-' if new is None else f'{new * 1000:.3f}':>12}")
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        print(f"{name:40} {old * 1000:12.3f} {new * 1000:12.3f} {change:+7.1f}%")
+
+
+if __name__ == "__main__":
+    main()
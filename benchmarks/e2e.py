@@ -0,0 +1,67 @@
+"""
+End-to-end benchmark: concurrent clients against the FastAPI app, in-process
+over httpx's ASGI transport (no sockets, so it measures the app, not the network).
+"""
+import time
+import random
+import asyncio
+
+from benchmarks.micro import summarize
+
+
+async def _login(client):
+    from backend.services.auth_service import ADMIN_USER, ADMIN_PASSWORD
+    r = await client.post("/api/login", data={"username": ADMIN_USER, "password": ADMIN_PASSWORD})
+    r.raise_for_status()
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def _scenarios(dirs, queries):
+    return {
+        "list_folder": lambda rng: ("GET", "/api/folder", {"params": {"path": rng.choice(dirs)}}),
+        "list_folder_compact": lambda rng: (
+            "GET", "/api/folder", {"params": {"path": rng.choice(dirs), "format": "compact"}}
+        ),
+        "search": lambda rng: ("GET", "/api/search", {"params": {"q": rng.choice(queries)}}),
+        "scan_status": lambda rng: ("GET", "/api/scan_status", {}),
+    }
+
+
+async def run_e2e(dirs, queries, clients=8, requests_per_client=50, seed=42):
+    import httpx
+    from backend.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    scenarios = _scenarios(dirs, queries)
+    latencies = {name: [] for name in scenarios}
+    errors = {name: 0 for name in scenarios}
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        headers = await _login(client)
+
+        async def worker(n):
+            rng = random.Random(seed + n)
+            for _ in range(requests_per_client):
+                name = rng.choice(list(scenarios))
+                method, url, kwargs = scenarios[name](rng)
+                start = time.perf_counter()
+                r = await client.request(method, url, headers=headers, **kwargs)
+                latencies[name].append(time.perf_counter() - start)
+                if r.status_code >= 400:
+                    errors[name] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(clients)))
+        elapsed = time.perf_counter() - start
+
+    total = sum(len(v) for v in latencies.values())
+    return {
+        "clients": clients,
+        "requests": total,
+        "elapsed": elapsed,
+        "requests_per_sec": total / elapsed if elapsed else None,
+        "scenarios": {
+            name: {**summarize(samples), "errors": errors[name]}
+            for name, samples in latencies.items() if samples
+        },
+    }
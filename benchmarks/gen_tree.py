@@ -0,0 +1,103 @@
+"""
+Synthetic directory tree for benchmarks.
+
+Files are created sparse (ftruncate, no data written), so even trees with
+millions of multi-megabyte files cost little more than their inodes.
+
+    python -m benchmarks.gen_tree /tmp/bench-tree --depth 3 --fanout 10 --files 100
+"""
+import os
+import json
+import random
+import argparse
+
+EXTENSIONS = [".txt", ".jpg", ".mp4", ".pdf", ".mkv", ".zip", ".log", ".csv"]
+WORDS = [
+    "alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel",
+    "india", "juliet", "kilo", "lima", "mike", "november", "oscar", "papa",
+]
+# Internal name (.mntsrv-*) so scans and listings skip it
+MANIFEST = ".mntsrv-bench-tree.json"
+
+
+def _name(rng, i):
+    return f"{rng.choice(WORDS)}_{rng.choice(WORDS)}_{i:06d}"
+
+
+def generate_tree(root, depth=3, fanout=10, files=100, file_size=1024 * 1024, seed=42):
+    """
+    Create depth levels of fanout subfolders below root, each folder holding
+    files sparse files of file_size bytes. Existing trees with the same
+    parameters are reused. Returns the manifest (parameters and counts).
+    """
+    params = {"depth": depth, "fanout": fanout, "files": files, "file_size": file_size, "seed": seed}
+    manifest_path = os.path.join(root, MANIFEST)
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest["params"] == params:
+            return manifest
+    except (OSError, ValueError, KeyError):
+        pass
+
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+    num_dirs = num_files = 0
+    level = [root]
+    for current_depth in range(depth + 1):
+        next_level = []
+        for folder in level:
+            for i in range(files):
+                path = os.path.join(folder, _name(rng, i) + rng.choice(EXTENSIONS))
+                fd = os.open(path, os.O_CREAT | os.O_WRONLY, 0o644)
+                try:
+                    os.ftruncate(fd, file_size)
+                finally:
+                    os.close(fd)
+                num_files += 1
+            if current_depth < depth:
+                for i in range(fanout):
+                    sub = os.path.join(folder, f"dir_{_name(rng, i)}")
+                    os.makedirs(sub, exist_ok=True)
+                    next_level.append(sub)
+                    num_dirs += 1
+        level = next_level
+
+    manifest = {"params": params, "dirs": num_dirs + 1, "files": num_files}
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+def sample_dirs(root, count=20, seed=42):
+    """Relative paths of up to count folders of the tree (breadth first)"""
+    rng = random.Random(seed)
+    found = [""]
+    queue = [""]
+    while queue and len(found) < count * 10:
+        rel = queue.pop(0)
+        with os.scandir(os.path.join(root, rel)) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    sub = os.path.join(rel, entry.name) if rel else entry.name
+                    found.append(sub)
+                    queue.append(sub)
+    rng.shuffle(found)
+    return found[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic benchmark tree")
+    parser.add_argument("root")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--files", type=int, default=100, help="files per folder")
+    parser.add_argument("--file-size", type=int, default=1024 * 1024)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    manifest = generate_tree(args.root, args.depth, args.fanout, args.files, args.file_size, args.seed)
+    print(json.dumps(manifest))
+
+
+if __name__ == "__main__":
+    main()
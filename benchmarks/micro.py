@@ -0,0 +1,78 @@
+"""
+Micro-benchmarks of the scan, cache, search and listing functions.
+
+The backend reads SCAN_ROOT, CACHE_DIR etc. at import time, so import this
+module only after benchmarks.run has set up the environment.
+"""
+import os
+import time
+import shutil
+import statistics
+
+
+def summarize(samples):
+    """Latency statistics in seconds for a list of samples"""
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "min": ordered[0],
+        "median": statistics.median(ordered),
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": ordered[-1],
+        "mean": statistics.fmean(ordered),
+        "ops_per_sec": len(ordered) / sum(ordered) if sum(ordered) else None,
+    }
+
+
+def measure(fn, args_list, repeat=1, setup=None):
+    """Time fn(*args) for every args in args_list, repeat times; setup() runs untimed before each call"""
+    samples = []
+    for _ in range(repeat):
+        for args in args_list:
+            if setup:
+                setup()
+            start = time.perf_counter()
+            fn(*args)
+            samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def _clear_cache(cache_dir):
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.makedirs(cache_dir, exist_ok=True)
+
+
+def run_micro(root, dirs, queries, repeat=3):
+    from backend.services import dirscan_service
+    from backend.services.dirscan_service import scan_folder, scan_or_cache, invalidate_cache
+    from backend.services.scan_service import background_scan
+    from backend.services.search_service import search_files
+    from backend.main import folder_response
+
+    abs_dirs = [(os.path.join(root, d),) for d in dirs]
+    results = {}
+
+    # Full scan first: it fills the listing cache and writes the search index
+    _clear_cache(dirscan_service.CACHE_DIR)
+    start = time.perf_counter()
+    background_scan(root)
+    results["background_scan"] = summarize([time.perf_counter() - start])
+
+    results["scan_folder"] = measure(scan_folder, abs_dirs, repeat)
+    results["scan_or_cache_hit"] = measure(scan_or_cache, abs_dirs, repeat)
+    results["scan_or_cache_miss"] = measure(
+        scan_or_cache, abs_dirs, repeat, setup=lambda: _clear_cache(dirscan_service.CACHE_DIR)
+    )
+
+    for args in abs_dirs:
+        scan_folder(*args)
+    results["invalidate_cache"] = measure(invalidate_cache, abs_dirs[:5], 1)
+
+    results["search_files"] = measure(search_files, [(root, q) for q in queries], repeat)
+
+    for args in abs_dirs:
+        scan_or_cache(*args)
+    results["list_folder"] = measure(
+        folder_response, [(None, d, 0, 200, None) for d in dirs], repeat
+    )
+    return results
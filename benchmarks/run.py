@@ -0,0 +1,99 @@
+"""
+Run the benchmark suite and write the results as JSON.
+
+    python -m benchmarks.run --depth 3 --fanout 10 --files 100
+    python -m benchmarks.compare benchmarks/results/a.json benchmarks/results/b.json
+
+Cache, search index and scan status go to a scratch directory, so the
+benchmarks never touch the data of a real installation.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+
+from benchmarks.gen_tree import generate_tree, sample_dirs, WORDS
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(__file__), capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _configure_environment(root, scratch):
+    os.environ["SCAN_ROOT"] = root
+    os.environ["CACHE_DIR"] = os.path.join(scratch, "cache")
+    os.environ["SEARCH_INDEX_FILE"] = os.path.join(scratch, "search_index.json")
+    os.environ["SCAN_STATUS_FILE"] = os.path.join(scratch, "scan_status.json")
+    os.environ.setdefault("ARCHIVE_CACHE_MAX_BYTES", "0")
+    os.environ.setdefault("THUMB_PREGENERATE", "false")
+    os.makedirs(os.environ["CACHE_DIR"], exist_ok=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="mntsrv benchmark suite")
+    parser.add_argument("--root", default=os.path.join(tempfile.gettempdir(), "mntsrv-bench-tree"))
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--files", type=int, default=100, help="files per folder")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--sample-dirs", type=int, default=20)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=50, help="requests per client")
+    parser.add_argument("--skip-e2e", action="store_true")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<timestamp>.json)")
+    args = parser.parse_args()
+
+    root = os.path.abspath(args.root)
+    print(f"Generating tree in {root} ...", file=sys.stderr)
+    start = time.perf_counter()
+    manifest = generate_tree(root, args.depth, args.fanout, args.files)
+    print(f"  {manifest['dirs']} folders, {manifest['files']} files ({time.perf_counter() - start:.1f}s)", file=sys.stderr)
+
+    scratch = tempfile.mkdtemp(prefix="mntsrv-bench-")
+    _configure_environment(root, scratch)
+
+    from benchmarks.micro import run_micro
+    from benchmarks.e2e import run_e2e
+
+    dirs = sample_dirs(root, args.sample_dirs)
+    queries = WORDS[:4] + ["_000001", "no-such-name"]
+
+    print("Running micro-benchmarks ...", file=sys.stderr)
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "tree": manifest,
+            "args": vars(args),
+        },
+        "micro": run_micro(root, dirs, queries, args.repeat),
+    }
+    if not args.skip_e2e:
+        print("Running end-to-end benchmark ...", file=sys.stderr)
+        results["e2e"] = asyncio.run(run_e2e(dirs, queries, args.clients, args.requests))
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-import React, { useState } from "react";
+import React, { useState, useRef, useEffect } from "react";
 import { Form, FormControl, Button, ListGroup, InputGroup, Spinner } from "react-bootstrap";
 
 function SearchBar({ token, onNavigate, authFetch }) {
@@ -6,10 +6,45 @@ function SearchBar({ token, onNavigate, authFetch }) {
   const [results, setResults] = useState([]);
   const [showResults, setShowResults] = useState(false);
   const [loading, setLoading] = useState(false);
+  // Tab-specific id: the server drops our older suggest requests still running
+  const clientId = useRef(Math.random().toString(36).slice(2, 10));
+  const suggestAbort = useRef(null);
+
+  useEffect(() => () => suggestAbort.current && suggestAbort.current.abort(), []);
+
+  const fetchSuggestions = async (value) => {
+    if (suggestAbort.current) suggestAbort.current.abort();
+    if (!value) {
+      setResults([]);
+      return;
+    }
+    const controller = new AbortController();
+    suggestAbort.current = controller;
+    try {
+      const params = new URLSearchParams();
+      params.append("q", value);
+      params.append("client", clientId.current);
+      const res = await authFetch(`/api/search/suggest?${params.toString()}`, { signal: controller.signal });
+      // 204: superseded by a newer request
+      if (res.status === 204 || controller.signal.aborted) return;
+      if (!res.ok) throw new Error("Fehler bei der Suche");
+      const data = await res.json();
+      setResults(data.results || []);
+      setShowResults(true);
+    } catch {
+      if (!controller.signal.aborted) setResults([]);
+    }
+  };
+
+  const handleChange = (e) => {
+    setQuery(e.target.value);
+    fetchSuggestions(e.target.value);
+  };
 
   const handleSearch = async (e) => {
     e.preventDefault();
     if (!query || query.length < 2) return;
+    if (suggestAbort.current) suggestAbort.current.abort();
     setLoading(true);
     setShowResults(true);
     try {
@@ -41,8 +76,8 @@ function SearchBar({ token, onNavigate, authFetch }) {
             placeholder="Datei/Ordner suchen…"
             className="me-2"
             value={query}
-            onChange={(e) => setQuery(e.target.value)}
-            onFocus={() => query.length >= 2 && setShowResults(true)}
+            onChange={handleChange}
+            onFocus={() => query.length >= 1 && setShowResults(true)}
             minLength={2}
           />
           <Button type="submit" variant="outline-primary" disabled={loading || query.length < 2}>
@@ -22,7 +22,7 @@ function UserManagement({ authFetch }) {
 
   const roleDescriptions = {
     admin: "Full access + user management",
-    power: "Browse, download, share, delete, rename",
+    power: "Browse, download, share, delete, rename, upload",
     standard: "Browse, download, share",
     readonly: "Browse and download only"
   };
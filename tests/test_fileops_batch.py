@@ -0,0 +1,104 @@
+"""
+Batch operations must leave the search index and the listing cache matching
+the disk: later operations apply to what earlier ones in the same batch added
+or moved, and changes made by others while the batch runs are not lost.
+"""
+import os
+import time
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="mntsrv-test-")
+SCAN_ROOT = os.path.join(_tmp, "root")
+os.environ.update(
+    SCAN_ROOT=SCAN_ROOT,
+    CACHE_DIR=os.path.join(_tmp, "cache"),
+    STATE_DIR=os.path.join(_tmp, "state"),
+    SEARCH_INDEX_FILE=os.path.join(_tmp, "search_index.json"),
+    SCAN_STATUS_FILE=os.path.join(_tmp, "scan_status.json"),
+)
+
+from backend.services.scan_service import background_scan  # noqa: E402
+from backend.services import fileops_service  # noqa: E402
+from backend.services.fileops_service import batch_service  # noqa: E402
+from backend.services.dirscan_service import read_listing  # noqa: E402
+from backend.services.job_service import load_job, FINISHED  # noqa: E402
+from backend.services.search_service import index_items  # noqa: E402
+
+ADMIN = {"username": "admin", "role": "admin"}
+
+
+def _touch(rel):
+    path = os.path.join(SCAN_ROOT, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(rel)
+
+
+def _run_batch(operations):
+    job = batch_service(operations, ADMIN)
+    for _ in range(100):
+        record = load_job(job["id"], ADMIN)
+        if record["status"] in FINISHED:
+            return record
+        time.sleep(0.05)
+    raise AssertionError("batch job did not finish")
+
+
+def _indexed_paths():
+    return {os.path.relpath(os.path.join(parent, name), SCAN_ROOT) for parent, name, _, _ in index_items()}
+
+
+def _disk_paths():
+    paths = set()
+    for dirpath, dirnames, filenames in os.walk(SCAN_ROOT):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".mntsrv")]
+        for name in dirnames + filenames:
+            paths.add(os.path.relpath(os.path.join(dirpath, name), SCAN_ROOT))
+    return paths
+
+
+def test_chained_batch_keeps_index_in_sync():
+    _touch("docs/invoice_a.md")
+    _touch("docs/invoice_b.md")
+    _touch("photos/p1.jpg")
+    _touch("big/b1.bin")
+    background_scan(SCAN_ROOT)
+
+    record = _run_batch([
+        {"op": "move", "path": "docs/invoice_a.md", "dest": "photos"},
+        {"op": "rename", "path": "photos/invoice_a.md", "new_name": "invoice_c.md"},
+        {"op": "mkdir", "path": "docs/newdir_x"},
+        {"op": "move", "path": "docs/newdir_x", "dest": "big"},
+        {"op": "copy", "path": "docs/invoice_b.md", "dest": "big"},
+        {"op": "delete", "path": "big/invoice_b.md", "permanent": True},
+    ])
+
+    assert record["status"] == "completed"
+    assert record["error_count"] == 0
+    indexed = _indexed_paths()
+    assert "photos/invoice_c.md" in indexed
+    assert "big/newdir_x" in indexed
+    assert not {"photos/invoice_a.md", "docs/newdir_x", "big/invoice_b.md"} & indexed
+    # Top-level folders themselves are not part of the index
+    assert indexed == _disk_paths() - {"docs", "photos", "big"}
+
+
+def test_listing_keeps_files_created_during_batch(monkeypatch):
+    _touch("src/report.pdf")
+    _touch("shared/existing.txt")
+    background_scan(SCAN_ROOT)
+    read_listing(os.path.join(SCAN_ROOT, "shared"))
+
+    copy_tree = fileops_service.copy_tree
+
+    def copy_while_someone_else_writes(src, dst, job):
+        copy_tree(src, dst, job)
+        # e.g. an upload or an SMB client writing into the same folder
+        _touch("shared/from_elsewhere.txt")
+
+    monkeypatch.setattr(fileops_service, "copy_tree", copy_while_someone_else_writes)
+    record = _run_batch([{"op": "copy", "path": "src/report.pdf", "dest": "shared"}])
+
+    assert record["status"] == "completed"
+    _, entries, _ = read_listing(os.path.join(SCAN_ROOT, "shared"))
+    assert {e["name"] for e in entries} == {"existing.txt", "report.pdf", "from_elsewhere.txt"}